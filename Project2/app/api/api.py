@@ -7,6 +7,7 @@ from app.api import languages
 from app.api import logs
 from app.api import data
 from app.api import plagiarism
+from app.api import metrics
 
 api_router = APIRouter()
 
@@ -20,4 +21,5 @@ api_router.include_router(logs.router, prefix="/logs", tags=["Log Management"])
 api_router.include_router(data.reset_router, prefix="/reset", tags=["Data Management"])
 api_router.include_router(data.import_router, prefix="/import", tags=["Data Management"])
 api_router.include_router(data.export_router, prefix="/export", tags=["Data Management"])
-api_router.include_router(plagiarism.router, prefix="/plagiarism", tags=["Plagiarism Task Management"])
\ No newline at end of file
+api_router.include_router(plagiarism.router, prefix="/plagiarism", tags=["Plagiarism Task Management"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["Monitoring"])
\ No newline at end of file
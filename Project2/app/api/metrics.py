@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.judger import metrics
+
+router = APIRouter()
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    评测指标, Prometheus文本格式, 汇总所有评测进程
+    权限: 无(供监控系统抓取)
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
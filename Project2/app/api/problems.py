@@ -1,5 +1,7 @@
+import uuid
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, Request, UploadFile, File
-from typing import List
+from typing import List, Optional
 from sqlalchemy.orm import Session
 
 from app import db
@@ -7,14 +9,31 @@ from app.db.database import get_db
 from app.db.models import UserModel
 from app.schemas.response import ResponseModel
 from app.schemas.problem import (
-    ProblemInfoResponse, ProblemBriefResponse, ProblemIDResponse, ProblemLogVisibilityResponse,
-    ProblemAddPayload, ProblemSetLogVisibilityPayload, ProblemSetJudgeModePayload
+    ProblemInfoResponse, ProblemBriefResponse, ProblemIDResponse, ProblemLogVisibilityResponse, ProblemJudgePolicyResponse,
+    ProblemRejudgeResponse, ProblemRejudgeProgressResponse,
+    ProblemAddPayload, ProblemSetLogVisibilityPayload, ProblemSetJudgeModePayload, ProblemSetJudgePolicyPayload,
+    ProblemRejudgePayload
 )
 from app.api.utils.permission import require_login, require_admin
 from app.api.utils.exception import APIException
+from app.judger.compare import valid_mode
 
 router = APIRouter()
 
+JUDGE_POLICIES = {"full", "stop_on_first_failure"}
+SPJ_PROTOCOLS = {"exec", "stream"}
+SUBMISSION_STATUSES = {"pending", "success", "error"}
+
+def _valid_judge_mode(judge_mode:str) -> bool:
+    """spj或内置比对模式(见app.judger.compare, 如 float:1e-4)"""
+    return judge_mode == "spj" or valid_mode(judge_mode)
+
+def _utc(value:Optional[datetime]) -> Optional[datetime]:
+    """与数据库中的提交时间一致, 转为不带时区的UTC时间"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
 @router.get("/", response_model=ResponseModel[List[ProblemBriefResponse]])
 async def get_problems_list(db_login:UserModel=Depends(require_login), db_session:Session=Depends(get_db)):
     """
@@ -37,7 +56,10 @@ async def add_problem(payload:ProblemAddPayload, db_login:UserModel=Depends(requ
     if exist:
         raise APIException(status_code=409, msg="id 已存在")
 
-    if payload.judge_mode is not None and payload.judge_mode not in {"standard", "strict", "spj"}:
+    if payload.judge_mode is not None and not _valid_judge_mode(payload.judge_mode):
+        raise APIException(status_code=400, msg="参数错误")
+
+    if payload.judge_policy not in JUDGE_POLICIES or payload.spj_protocol not in SPJ_PROTOCOLS:
         raise APIException(status_code=400, msg="参数错误")
 
     db_problem = db.db_problem.add_problem(db=db_session, problem=payload)
@@ -91,19 +113,93 @@ async def set_judge_mode(problem_id:str, payload:ProblemSetJudgeModePayload, db_
     参数: problem_id, judge_mode
     权限: 管理员
     """
+    if not _valid_judge_mode(payload.judge_mode):
+        raise APIException(status_code=400, msg="参数错误")
+
     db_problem = db.db_problem.set_problem_judge_mode(db=db_session, problem_id=problem_id, judge_mode=payload.judge_mode)
     if db_problem is None:
         raise APIException(status_code=404, msg="题目不存在")
     
     return {"msg": "judege mode updated", "data": db_problem}
 
+@router.put("/{problem_id}/judge_policy", response_model=ResponseModel[ProblemJudgePolicyResponse])
+async def set_judge_policy(problem_id:str, payload:ProblemSetJudgePolicyPayload, db_admin=Depends(require_admin), db_session=Depends(get_db)):
+    """
+    设置评测方式
+    参数: problem_id, judge_policy
+    权限: 管理员
+    """
+    if payload.judge_policy not in JUDGE_POLICIES:
+        raise APIException(status_code=400, msg="参数错误")
+
+    db_problem = db.db_problem.set_problem_judge_policy(db=db_session, problem_id=problem_id, judge_policy=payload.judge_policy)
+    if db_problem is None:
+        raise APIException(status_code=404, msg="题目不存在")
+    
+    return {"msg": "judge policy updated", "data": db_problem}
+
+@router.post("/{problem_id}/rejudge", response_model=ResponseModel[ProblemRejudgeResponse])
+async def rejudge_problem(problem_id:str, payload:ProblemRejudgePayload, db_admin=Depends(require_admin), db_session=Depends(get_db)):
+    """
+    批量重测题目的提交, 以低于正常提交的优先级排队, 同时运行数受限
+    参数: problem_id, status, language_name, submitted_after, submitted_before (均可选)
+    权限: 管理员
+    """
+    from app.judger.config import REJUDGE_PRIORITY
+
+    db_problem = db.db_problem.get_problem(db=db_session, problem_id=problem_id)
+    if db_problem is None:
+        raise APIException(status_code=404, msg="题目不存在")
+
+    if payload.status is not None and payload.status not in SUBMISSION_STATUSES:
+        raise APIException(status_code=400, msg="参数错误")
+
+    language_id = None
+    if payload.language_name is not None:
+        db_language = db.db_language.get_language_by_name(db=db_session, name=payload.language_name)
+        if db_language is None:
+            raise APIException(status_code=404, msg="语言不存在")
+        language_id = db_language.id
+
+    batch_id = uuid.uuid4().hex
+    total = db.db_submission.rejudge_problem(
+        db=db_session, _problem_id=db_problem.id, batch_id=batch_id, priority=REJUDGE_PRIORITY,
+        status=payload.status, language_id=language_id,
+        submitted_after=_utc(payload.submitted_after), submitted_before=_utc(payload.submitted_before),
+    )
+    return {"msg": "rejudge started", "data": {"problem_id": problem_id, "batch_id": batch_id, "total": total}}
+
+@router.get("/{problem_id}/rejudge/{batch_id}", response_model=ResponseModel[ProblemRejudgeProgressResponse])
+async def get_rejudge_progress(problem_id:str, batch_id:str, db_admin=Depends(require_admin), db_session=Depends(get_db)):
+    """
+    查询批量重测进度
+    参数: problem_id, batch_id
+    权限: 管理员
+    """
+    db_problem = db.db_problem.get_problem(db=db_session, problem_id=problem_id)
+    if db_problem is None:
+        raise APIException(status_code=404, msg="题目不存在")
+
+    progress = db.db_judge_job.batch_progress(db=db_session, batch_id=batch_id, _problem_id=db_problem.id)
+    total = sum(progress.values())
+    if total == 0:
+        raise APIException(status_code=404, msg="重测任务不存在")
+
+    return {"msg": "success", "data": {"problem_id": problem_id, "batch_id": batch_id, "total": total, **progress}}
+
 @router.post("/{problem_id}/spj", response_model=ResponseModel[ProblemIDResponse])
-async def upload_spj(problem_id:str, file:UploadFile=File(...), db_admin=Depends(require_admin), db_session=Depends(get_db)):
+async def upload_spj(
+    problem_id:str, file:UploadFile=File(...), protocol:str="exec",
+    db_admin=Depends(require_admin), db_session=Depends(get_db),
+):
     """
     上传 SPJ 脚本
-    参数: file
+    参数: file, protocol(查询参数, exec或stream, 见ProblemBase.spj_protocol)
     权限: 管理员
     """
+    if protocol not in SPJ_PROTOCOLS:
+        raise APIException(status_code=400, msg="参数错误")
+
     code = await file.read()
     file_ext = None
     if file.filename.endswith(".cpp"):
@@ -113,7 +209,7 @@ async def upload_spj(problem_id:str, file:UploadFile=File(...), db_admin=Depends
 
     db_language = db.db_language.get_language_by_file_ext(db=db_session, file_ext=file_ext)
     
-    db_problem = db.db_problem.add_spj(db=db_session, problem_id=problem_id, language_id=db_language.id, code=code)
+    db_problem = db.db_problem.add_spj(db=db_session, problem_id=problem_id, language_id=db_language.id, code=code, protocol=protocol)
     if db_problem is None:
         raise APIException(status_code=404, msg="题目不存在")
     
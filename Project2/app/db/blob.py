@@ -0,0 +1,116 @@
+import os
+import mmap
+import zlib
+import shutil
+import hashlib
+import tempfile
+from typing import BinaryIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from app.db.database import BLOB_DIR
+
+"""
+内容寻址的压缩blob存储: 测试数据, 样例与测例输出按sha256(原始内容)存放在 BLOB_DIR/ab/cdef...
+数据库中只保存哈希与原始大小; 安装zstandard时以zstd压缩, 否则以zlib压缩, 读取时按文件头识别
+相同内容只存一份, 写入先写临时文件再原子替换, 多进程并发写入同一内容是安全的
+"""
+os.makedirs(BLOB_DIR, exist_ok=True)
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+CHUNK_SIZE = 1 << 20
+
+def digest(data:bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def path(key:str) -> str:
+    return os.path.join(BLOB_DIR, key[:2], key[2:])
+
+def _compress(data:bytes) -> bytes:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+def put(data:bytes) -> str:
+    """保存内容, 返回哈希; 已存在则不重复写入"""
+    key = digest(data)
+    blob_path = path(key)
+    if os.path.exists(blob_path):
+        return key
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_compress(data))
+        os.replace(tmp_path, blob_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return key
+
+def put_text(text:str) -> str:
+    return put(text.encode("utf-8"))
+
+def _reader(compressed) -> BinaryIO:
+    """按文件头选择解压方式, 返回流式读取解压内容的对象"""
+    if compressed[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd-compressed but zstandard is not installed.")
+        return zstandard.ZstdDecompressor().stream_reader(compressed)
+    return _ZlibReader(compressed)
+
+class _ZlibReader:
+    """zlib流式解压, 接口与zstandard的stream_reader一致"""
+    def __init__(self, compressed):
+        self.compressed = memoryview(compressed)
+        self.offset = 0
+        self.decompressor = zlib.decompressobj()
+
+    def read(self, size:int=-1) -> bytes:
+        if size < 0:
+            data = self.decompressor.decompress(self.compressed[self.offset:]) + self.decompressor.flush()
+            self.offset = len(self.compressed)
+            return data
+        chunks = []
+        while size > 0 and not self.decompressor.eof:
+            data = self.decompressor.unconsumed_tail
+            if not data:
+                data = self.compressed[self.offset:self.offset + CHUNK_SIZE]
+                self.offset += len(data)
+                if not data:
+                    break
+            chunk = self.decompressor.decompress(data, size)
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def close(self):
+        self.compressed.release()
+
+def get(key:str) -> bytes:
+    """读取完整内容"""
+    with open(path(key), "rb") as f:
+        compressed = f.read()
+    reader = _reader(compressed)
+    try:
+        return reader.read()
+    finally:
+        reader.close()
+
+def get_text(key:str) -> str:
+    return get(key).decode("utf-8")
+
+def copy_to(key:str, target:str):
+    """将内容解压写入文件: 压缩文件以mmap映射, 分块解压, 不整体读入内存"""
+    with open(path(key), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as compressed:
+        reader = _reader(compressed)
+        try:
+            with open(target, "wb") as out:
+                shutil.copyfileobj(reader, out, CHUNK_SIZE)
+        finally:
+            reader.close()
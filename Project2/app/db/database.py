@@ -9,6 +9,9 @@ def _fk_pragma_on_connect(dbapi_con, con_record):
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test_db.db"
 
+"""blob存储目录: 测试数据, 样例与测例输出的内容, 数据库中只保存哈希; 与数据库文件放在一起备份, 不可随评测临时目录清理"""
+BLOB_DIR = "./blobs"
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
@@ -4,6 +4,7 @@ from app.db.models import UserModel, ProblemModel, SubmissionModel, SampleModel,
 from app.schemas.data import DataImport
 from app.api.utils.data import seed_ini_data
 from app.db.database import SessionLocal, Base, engine
+from app.db.db_problem import compute_data_version
 
 def reset():
     """系统重置, 清空数据库, 注入初始数据"""
@@ -35,6 +36,7 @@ def set_data(db:Session, data:DataImport):
             db.merge(db_user)
 
         # 导入题目数据
+        stale_versions = []
         for problem in data.problems:
             problem_data = problem.model_dump()
             samples_data = problem_data.pop("samples", [])
@@ -51,11 +53,22 @@ def set_data(db:Session, data:DataImport):
             db_problem.samples = [SampleModel(**sample_data) for sample_data in samples_data]
             db_problem.testcases = [CaseModel(**testcase_data) for testcase_data in testcases_data]
 
+            # 测例变化时更新数据版本, 旧版本的落盘数据待提交后清理
+            data_version = compute_data_version(testcases_data)
+            if db_problem.data_version and db_problem.data_version != data_version:
+                stale_versions.append(db_problem.data_version)
+            db_problem.data_version = data_version
+
             if exist is None:
                 db.add(db_problem)
 
         db.commit()
 
+        from app.judger.testdata import remove_version
+        for data_version in stale_versions:
+            if db.query(ProblemModel).filter(ProblemModel.data_version == data_version).first() is None:
+                remove_version(data_version)
+
         # 导入提交数据
         for submission in data.submissions:
             submission_data = submission.model_dump()
@@ -70,6 +83,7 @@ def set_data(db:Session, data:DataImport):
             
             db_submission = SubmissionModel(user_id=submission.user_id, _problem_id=db_problem.id, language_id=db_language.id, **submission_data)
             db_submission.test_case_results = [TestCaseResultModel(**test_case_result_data) for test_case_result_data in test_case_results_data]
+            db_submission.cases_done = db_submission.cases_total = len(test_case_results_data)
 
             db.merge(db_submission)
         
@@ -0,0 +1,151 @@
+from typing import Optional, List, Dict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update, insert, select, func, or_
+from sqlalchemy.orm import Session, aliased
+from app.db.models import JudgeJobModel, JudgeJobStatusCategory, SubmissionModel
+
+MAX_ATTEMPTS = 3
+
+def _now() -> datetime:
+    """与func.now()一致的UTC时间"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def enqueue(db:Session, submission_id:int, priority:int=0, commit:bool=True):
+    """添加评测任务, 同一提交已在排队时只提升优先级"""
+    db_job = db.query(JudgeJobModel).filter(
+        JudgeJobModel.submission_id == submission_id,
+        JudgeJobModel.state == JudgeJobStatusCategory.QUEUED,
+    ).first()
+
+    if db_job:
+        db_job.priority = max(db_job.priority, priority)
+    else:
+        db_job = JudgeJobModel(submission_id=submission_id, priority=priority)
+        db.add(db_job)
+
+    if commit:
+        db.commit()
+        db.refresh(db_job)
+    return db_job
+
+def enqueue_many(db:Session, submission_ids:List[int], priority:int, batch_id:str):
+    """批量添加评测任务并标记批次; 已在排队的提交只标记批次, 保留原优先级"""
+    queued = set()
+    for start in range(0, len(submission_ids), 500):
+        chunk = submission_ids[start:start + 500]
+        queued.update(submission_id for (submission_id,) in db.query(JudgeJobModel.submission_id).filter(
+            JudgeJobModel.submission_id.in_(chunk),
+            JudgeJobModel.state == JudgeJobStatusCategory.QUEUED,
+        ).all())
+        db.execute(
+            update(JudgeJobModel)
+            .where(JudgeJobModel.submission_id.in_(chunk), JudgeJobModel.state == JudgeJobStatusCategory.QUEUED)
+            .values(batch_id=batch_id)
+        )
+
+    rows = [
+        {"submission_id": submission_id, "priority": priority, "batch_id": batch_id}
+        for submission_id in submission_ids if submission_id not in queued
+    ]
+    if rows:
+        db.execute(insert(JudgeJobModel), rows)
+
+def batch_progress(db:Session, batch_id:str, _problem_id:Optional[int]=None) -> Dict[str, int]:
+    """批次中各状态的任务数; 指定_problem_id时只统计该题目提交的任务"""
+    progress = {state.value: 0 for state in JudgeJobStatusCategory}
+    query = db.query(JudgeJobModel.state, func.count(JudgeJobModel.id)).filter(JudgeJobModel.batch_id == batch_id)
+    if _problem_id is not None:
+        query = query.join(SubmissionModel, SubmissionModel.id == JudgeJobModel.submission_id).filter(
+            SubmissionModel._problem_id == _problem_id
+        )
+    rows = query.group_by(JudgeJobModel.state).all()
+    for state, count in rows:
+        progress[state.value] = count
+    return progress
+
+def reclaim_expired(db:Session) -> List[JudgeJobModel]:
+    """租约过期的任务(守护进程崩溃等)重新排队, 超过重试次数则标记失败, 返回失败的任务"""
+    now = _now()
+    expired = db.query(JudgeJobModel).filter(
+        JudgeJobModel.state == JudgeJobStatusCategory.RUNNING,
+        JudgeJobModel.lease_until < now,
+    ).all()
+    failed = []
+    for db_job in expired:
+        if db_job.attempts >= MAX_ATTEMPTS:
+            db_job.state = JudgeJobStatusCategory.FAILED
+            db_job.finished_at = now
+            db_job.err_msg = "Lease expired too many times."
+            failed.append(db_job)
+        else:
+            db_job.state = JudgeJobStatusCategory.QUEUED
+            db_job.worker = None
+    db.commit()
+    return failed
+
+def claim(db:Session, worker:str, lease_seconds:float, background_limit:Optional[int]=None) -> Optional[JudgeJobModel]:
+    """领取优先级最高的排队任务, 以条件更新保证多个守护进程不会重复领取
+    background_limit: 优先级为负的后台任务(批量重测)全局同时运行数的上限, 达到上限时只领取正常任务;
+    运行数在领取的条件更新中统计, 多个守护进程同时领取也不会超过上限"""
+    query = db.query(JudgeJobModel.id).filter(JudgeJobModel.state == JudgeJobStatusCategory.QUEUED)
+    conditions = [JudgeJobModel.state == JudgeJobStatusCategory.QUEUED]
+    if background_limit is not None:
+        running = aliased(JudgeJobModel)
+        background_running = select(func.count(running.id)).where(
+            running.state == JudgeJobStatusCategory.RUNNING, running.priority < 0
+        ).scalar_subquery()
+        # 预先排除后台任务只是为了少做无效的更新, 以更新中的条件为准
+        if db.execute(select(background_running)).scalar() >= background_limit:
+            query = query.filter(JudgeJobModel.priority >= 0)
+        conditions.append(or_(JudgeJobModel.priority >= 0, background_running < background_limit))
+    candidates = query.order_by(JudgeJobModel.priority.desc(), JudgeJobModel.id).limit(8).all()
+
+    for (job_id,) in candidates:
+        now = _now()
+        result = db.execute(
+            update(JudgeJobModel)
+            .where(JudgeJobModel.id == job_id, *conditions)
+            .values(
+                state=JudgeJobStatusCategory.RUNNING, worker=worker,
+                attempts=JudgeJobModel.attempts + 1,
+                heartbeat_at=now, lease_until=now + timedelta(seconds=lease_seconds),
+            )
+        )
+        db.commit()
+        if result.rowcount == 1:
+            return db.get(JudgeJobModel, job_id)
+    return None
+
+def heartbeat(db:Session, job_id:int, lease_seconds:float):
+    """续约"""
+    now = _now()
+    db.execute(
+        update(JudgeJobModel)
+        .where(JudgeJobModel.id == job_id, JudgeJobModel.state == JudgeJobStatusCategory.RUNNING)
+        .values(heartbeat_at=now, lease_until=now + timedelta(seconds=lease_seconds))
+    )
+    db.commit()
+
+def finish(db:Session, job_id:int, success:bool, err_msg:str=""):
+    """结束任务, 失败且未超过重试次数时重新排队"""
+    db_job = db.get(JudgeJobModel, job_id)
+    if db_job is None:
+        return None
+
+    if success:
+        db_job.state = JudgeJobStatusCategory.DONE
+    elif db_job.attempts < MAX_ATTEMPTS:
+        db_job.state = JudgeJobStatusCategory.QUEUED
+        db_job.worker = None
+    else:
+        db_job.state = JudgeJobStatusCategory.FAILED
+
+    if db_job.state != JudgeJobStatusCategory.QUEUED:
+        db_job.finished_at = _now()
+    db_job.err_msg = err_msg
+    db.commit()
+    return db_job
+
+def count_jobs(db:Session, state:JudgeJobStatusCategory) -> int:
+    """按状态统计任务数"""
+    return db.query(JudgeJobModel).filter(JudgeJobModel.state == state).count()
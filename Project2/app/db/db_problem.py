@@ -1,7 +1,25 @@
+import hashlib
+from typing import List, Dict
+from sqlalchemy import func, case
 from sqlalchemy.orm import Session
-from app.db.models import ProblemModel, CaseModel, SampleModel
+from app.db.models import ProblemModel, CaseModel, SampleModel, TestCaseResultModel, StatusCategory
 from app.schemas.problem import ProblemAddPayload
 
+def _invalidate_spj(_problem_id:int):
+    """清除题目的spj编译缓存"""
+    from app.judger.cache import invalidate_spj
+    invalidate_spj(_problem_id)
+
+def compute_data_version(testcases:List[Dict[str, str]]) -> str:
+    """测试数据版本: 按顺序对全部测例的输入输出做sha256"""
+    h = hashlib.sha256()
+    for case in testcases:
+        for part in (case["input"], case["output"]):
+            data = part.encode("utf-8")
+            h.update(len(data).to_bytes(8, "little"))
+            h.update(data)
+    return h.hexdigest()
+
 def get_problem(db:Session, problem_id:str):
     """按照problem_id查询题目"""
     return db.query(ProblemModel).filter(ProblemModel.problem_id == problem_id).first()
@@ -24,6 +42,7 @@ def add_problem(db:Session, problem:ProblemAddPayload):
     
     db_problem = ProblemModel(**problem_data)
     db_problem.testcases = [CaseModel(**case) for case in testcases_data]
+    db_problem.data_version = compute_data_version(testcases_data)
     db_problem.samples = [SampleModel(**sample) for sample in samples_data]
     
     db.add(db_problem)
@@ -37,6 +56,7 @@ def delete_problem(db:Session, problem_id:str):
     if db_problem:
         db.delete(db_problem)
         db.commit()
+        _invalidate_spj(db_problem.id)
         return db_problem
     return None
 
@@ -60,18 +80,46 @@ def set_problem_judge_mode(db:Session, problem_id:str, judge_mode:str):
             db_problem.spj_language_id = None
         db.commit()
         db.refresh(db_problem)
+        _invalidate_spj(db_problem.id)
+        return db_problem
+    return None
+
+def set_problem_judge_policy(db:Session, problem_id:str, judge_policy:str):
+    """设置题目评测方式"""
+    db_problem = db.query(ProblemModel).filter(ProblemModel.problem_id == problem_id).first()
+    if db_problem:
+        db_problem.judge_policy = judge_policy
+        db.commit()
+        db.refresh(db_problem)
         return db_problem
     return None
 
-def add_spj(db:Session, problem_id:str, language_id:int, code:str):
+def get_case_failure_rates(db:Session, _problem_id:int) -> Dict[int, float]:
+    """各测例的历史失败率, 只统计实际评测过的结果"""
+    rows = db.query(
+        TestCaseResultModel.case_id,
+        func.count(TestCaseResultModel.id),
+        func.sum(case((TestCaseResultModel.result == StatusCategory.AC, 0), else_=1)),
+    ).join(CaseModel, CaseModel.id == TestCaseResultModel.case_id).filter(
+        CaseModel._problem_id == _problem_id,
+        TestCaseResultModel.result.notin_([
+            StatusCategory.SKIPPED, StatusCategory.PENDING, StatusCategory.JUDGING,
+            StatusCategory.COMPILING, StatusCategory.CE, StatusCategory.UNK,
+        ]),
+    ).group_by(TestCaseResultModel.case_id).all()
+    return {case_id: failed / total for case_id, total, failed in rows if total}
+
+def add_spj(db:Session, problem_id:str, language_id:int, code:str, protocol:str="exec"):
     """增加spj脚本"""
     db_problem = db.query(ProblemModel).filter(ProblemModel.problem_id == problem_id).first()
     if db_problem:
         db_problem.judge_mode = "spj"
         db_problem.spj_code = code
+        db_problem.spj_protocol = protocol
         db_problem.spj_language_id = language_id
         db.commit()
         db.refresh(db_problem)
+        _invalidate_spj(db_problem.id)
         return db_problem
     return None
 
@@ -82,7 +130,9 @@ def delete_spj(db:Session, problem_id:str):
         db_problem.judge_mode = "standard"
         db_problem.spj_code = None
         db_problem.spj_language_id = None
+        db_problem.spj_protocol = "exec"
         db.commit()
         db.refresh(db_problem)
+        _invalidate_spj(db_problem.id)
         return db_problem
     return None
\ No newline at end of file
@@ -1,6 +1,88 @@
+import hashlib
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
-from app.db.models import SubmissionModel, SubmissionStatusCategory, ProblemModel
+from app.db.models import (
+    SubmissionModel, SubmissionStatusCategory, ProblemModel, LanguageModel, UserModel, TestCaseResultModel, StatusCategory
+)
 from app.schemas.submission import SubmissionAddPayload
+from app.db.db_judge_job import enqueue, enqueue_many
+from app.db.db_problem import compute_data_version
+
+def verdict_key(code:str, language:LanguageModel, problem:ProblemModel) -> str:
+    """评测结果缓存键: sha256(题目, 源码, 语言命令, 测试数据版本, 实际限制, 评测方式与spj)
+    测试数据, 限制或评测方式变化后键随之变化, 旧结果不再命中"""
+    data_version = problem.data_version or compute_data_version(
+        [{"input": case.input, "output": case.output} for case in problem.testcases]
+    )
+    spj_language = problem.spj_language
+    parts = (
+        str(problem.id), code,
+        language.compile_cmd or "", language.run_cmd,
+        data_version,
+        repr(problem.time_limit or language.time_limit), repr(problem.memory_limit or language.memory_limit),
+        problem.judge_mode, problem.judge_policy,
+        problem.spj_code or "", problem.spj_protocol or "exec",
+        (spj_language.compile_cmd or "") if spj_language else "", spj_language.run_cmd if spj_language else "",
+    )
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def find_cached_verdict(db:Session, key:str) -> Optional[SubmissionModel]:
+    """最近一次以相同缓存键完整评测的提交; 含系统错误的结果不会写入缓存键"""
+    return db.query(SubmissionModel).filter(
+        SubmissionModel.verdict_key == key
+    ).order_by(SubmissionModel.id.desc()).first()
+
+def set_status(db:Session, db_submission:SubmissionModel, status:SubmissionStatusCategory):
+    """修改提交状态并维护用户解决题数: 用户在该题上第一个SUCCESS的提交计入, 最后一个SUCCESS的提交被重测时扣除
+    复用评测结果与重测都不会重复计数"""
+    was_solved = db_submission.status == SubmissionStatusCategory.SUCCESS
+    solved = status == SubmissionStatusCategory.SUCCESS
+    db_submission.status = status
+    if was_solved == solved:
+        return
+    solved_elsewhere = db.query(SubmissionModel.id).filter(
+        SubmissionModel.user_id == db_submission.user_id,
+        SubmissionModel._problem_id == db_submission._problem_id,
+        SubmissionModel.id != db_submission.id,
+        SubmissionModel.status == SubmissionStatusCategory.SUCCESS,
+    ).first() is not None
+    db_user = db.get(UserModel, db_submission.user_id)
+    if db_user is not None and not solved_elsewhere:
+        db_user.resolve_count = db_user.resolve_count + 1 if solved else max(0, db_user.resolve_count - 1)
+
+def _clone_verdict(db:Session, db_submission:SubmissionModel, source:SubmissionModel):
+    """复制已有提交的评测结果; 测例按序号对应到题目当前的测例"""
+    testcases = db_submission.problem.testcases
+    db_submission.test_case_results = [
+        TestCaseResultModel(
+            test_case_result_id=result.test_case_result_id, result=result.result,
+            time=result.time, memory=result.memory, err_msg=result.err_msg,
+            output=result.output, output_hash=result.output_hash, output_size=result.output_size,
+            case_id=testcases[result.test_case_result_id - 1].id,
+        ) for result in source.test_case_results
+    ]
+    for column in ("score", "counts", "cases_done", "cases_total", "time", "memory", "verdict_key"):
+        setattr(db_submission, column, getattr(source, column))
+    set_status(db, db_submission, source.status)
+
+def _record_compile_error(db:Session, db_submission:SubmissionModel, err_msg:str, key:Optional[str]):
+    """提交时即可确定的编译错误: 与评测中的CE一致, 每个测例记为CE"""
+    set_status(db, db_submission, SubmissionStatusCategory.ERROR)
+    db_submission.test_case_results = [
+        TestCaseResultModel(
+            test_case_result_id=i + 1, result=StatusCategory.CE, time=0.0, memory=0,
+            output="", err_msg=err_msg, case_id=case.id,
+        ) for i, case in enumerate(db_submission.problem.testcases)
+    ]
+    db_submission.score = 0
+    db_submission.cases_done = db_submission.cases_total = len(db_submission.test_case_results)
+    db_submission.verdict_key = key
 
 def add_submission(db:Session, submission:SubmissionAddPayload, _problem_id:int, language_id:int, user_id:int):
     """添加评测"""
@@ -12,17 +94,35 @@ def add_submission(db:Session, submission:SubmissionAddPayload, _problem_id:int,
     db_submission = SubmissionModel(user_id=user_id, _problem_id=_problem_id, language_id=language_id, **submission_data)
     
     db.add(db_submission)
+    db.flush()
+    
+    # 相同的代码与评测条件已有结果时直接复用; 语法错误直接判为CE; 否则加入评测队列
+    from app.judger import metrics, syntax
+    from app.judger.config import VERDICT_CACHE_ENABLED, SYNTAX_CHECK_ENABLED, SYNTAX_CHECK_LANGUAGES
+    source = None
+    key = None
+    if VERDICT_CACHE_ENABLED:
+        key = verdict_key(db_submission.code, db_submission.language, db_submission.problem)
+        source = find_cached_verdict(db=db, key=key)
+        metrics.inc("cache_hits_total" if source else "cache_misses_total", cache="verdict")
+    tree, syntax_error = None, None
+    if SYNTAX_CHECK_ENABLED and db_submission.language.name in SYNTAX_CHECK_LANGUAGES:
+        tree, syntax_error = syntax.check_python(db_submission.code)
+        result = "error" if syntax_error else "ok" if tree is not None else "skipped"
+        metrics.inc("syntax_checks_total", language=db_submission.language.name, result=result)
+    if source is not None:
+        _clone_verdict(db, db_submission, source)
+    elif syntax_error is not None:
+        _record_compile_error(db, db_submission, syntax_error, key)
+    else:
+        enqueue(db=db, submission_id=db_submission.id, commit=False)
     db.commit()
     db.refresh(db_submission)
-    
-    # 进行评测
-    from app.judger.judge import eval
-    eval(db_submission.id)
 
-    # 构建pdg
-    if language_id == 2:
+    # 构建pdg, 复用语法检查得到的语法树; 有语法错误的代码无法构建
+    if language_id == 2 and syntax_error is None:
         from app.plagiarism.interface import build
-        build(db_submission.id)
+        build(db_submission.id, tree=tree)
 
     return db_submission
 
@@ -63,16 +163,73 @@ def reset_submission(db:Session, submission_id:int):
     """重新评测submission"""
     db_submission = db.query(SubmissionModel).filter(SubmissionModel.id == submission_id).first()
     if db_submission:
-        db_submission.status = SubmissionStatusCategory.PENDING
+        set_status(db, db_submission, SubmissionStatusCategory.PENDING)
         db_submission.test_case_results = []
         db_submission.time = 0.0
         db_submission.memory = 0
         db_submission.counts = 0
+        db_submission.score = 0
+        db_submission.cases_done = 0
+        db_submission.cases_total = 0
+        db_submission.verdict_key = None
 
-        from app.judger.judge import eval
-        eval(db_submission.id)
-        
+        # 加入评测队列, 不经过评测结果缓存
+        enqueue(db=db, submission_id=db_submission.id, commit=False)
         db.commit()
         db.refresh(db_submission)
         return db_submission
-    return None
\ No newline at end of file
+    return None
+
+def rejudge_problem(
+    db:Session, _problem_id:int, batch_id:str, priority:int,
+    status:Optional[str]=None, language_id:Optional[int]=None,
+    submitted_after:Optional[datetime]=None, submitted_before:Optional[datetime]=None,
+) -> int:
+    """按条件批量重测题目的提交, 以后台优先级排队; 旧结果保留到重新评测开始时, 返回提交数"""
+    query = db.query(SubmissionModel.id).filter(SubmissionModel._problem_id == _problem_id)
+    if status:
+        query = query.filter(SubmissionModel.status == SubmissionStatusCategory(status))
+    if language_id is not None:
+        query = query.filter(SubmissionModel.language_id == language_id)
+    if submitted_after is not None:
+        query = query.filter(SubmissionModel.created_at >= submitted_after)
+    if submitted_before is not None:
+        query = query.filter(SubmissionModel.created_at < submitted_before)
+    submission_ids = [submission_id for (submission_id,) in query.order_by(SubmissionModel.id).all()]
+
+    # 重测的提交在完成前不作为评测结果缓存的来源
+    for start in range(0, len(submission_ids), 500):
+        db.execute(
+            update(SubmissionModel)
+            .where(SubmissionModel.id.in_(submission_ids[start:start + 500]))
+            .values(verdict_key=None)
+        )
+    enqueue_many(db=db, submission_ids=submission_ids, priority=priority, batch_id=batch_id)
+    db.commit()
+    return len(submission_ids)
+
+def start_progress(db:Session, submission_id:int, cases_total:int):
+    """开始评测: 清除上次(包括中断的)评测写入的结果, 重置进度"""
+    db.query(TestCaseResultModel).filter(
+        TestCaseResultModel.submission_id == submission_id
+    ).delete(synchronize_session=False)
+    db.execute(
+        update(SubmissionModel)
+        .where(SubmissionModel.id == submission_id)
+        .values(score=0, counts=10*cases_total, cases_done=0, cases_total=cases_total, verdict_key=None)
+    )
+    db.commit()
+
+def add_case_results(db:Session, submission_id:int, results:List[Dict[str, Any]], points:int):
+    """批量写入一批测例结果, 同时累加得分与已完成测例数"""
+    if not results:
+        return
+    # 各行的键需一致; 未运行或运行出错的测例没有输出哈希
+    rows = [{"submission_id": submission_id, "output_hash": None, "output_size": 0, **result} for result in results]
+    db.execute(insert(TestCaseResultModel), rows)
+    db.execute(
+        update(SubmissionModel)
+        .where(SubmissionModel.id == submission_id)
+        .values(score=SubmissionModel.score + points, cases_done=SubmissionModel.cases_done + len(results))
+    )
+    db.commit()
@@ -5,6 +5,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.ext.hybrid import hybrid_property
 
 from app.db.database import Base
+from app.db import blob
 
 """Enums"""
 class StatusCategory(enum.Enum):
@@ -14,11 +15,13 @@ class StatusCategory(enum.Enum):
     RE = "RE"
     TLE = "TLE"
     MLE = "MLE"
+    OLE = "OLE"
     CE = "CE"
     JUDGING = "judging"
     PENDING = "pending"
     COMPILING = "compiling"
     UNK = "UNK"
+    SKIPPED = "skipped"
 
 class SubmissionStatusCategory(enum.Enum):
     """题目状态"""
@@ -26,6 +29,36 @@ class SubmissionStatusCategory(enum.Enum):
     SUCCESS = "success"
     ERROR = "error"
 
+class JudgeJobStatusCategory(enum.Enum):
+    """评测任务状态"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+def blob_text(name:str) -> property:
+    """存放在blob存储中的文本字段: 数据库只保存 <name>_hash 与 <name>_size, 内容在首次访问时读取"""
+    hash_column, size_column = f"{name}_hash", f"{name}_size"
+
+    def getter(self) -> str:
+        key = getattr(self, hash_column)
+        cached = self.__dict__.get(f"_{name}_text")
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        text = blob.get_text(key) if key else ""
+        self.__dict__[f"_{name}_text"] = (key, text)
+        return text
+
+    def setter(self, value:Optional[str]):
+        value = value or ""
+        data = value.encode("utf-8")
+        key = blob.put(data)
+        setattr(self, hash_column, key)
+        setattr(self, size_column, len(data))
+        self.__dict__[f"_{name}_text"] = (key, value)
+
+    return property(getter, setter)
+
 """Models"""
 class UserModel(Base):
     """用户模型"""
@@ -48,8 +81,12 @@ class SampleModel(Base):
     __tablename__ = "samples"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    input = Column(Text, nullable=False)
-    output = Column(Text, nullable=False)
+    input_hash = Column(String(64), nullable=False)
+    input_size = Column(Integer, default=0, nullable=False)
+    output_hash = Column(String(64), nullable=False)
+    output_size = Column(Integer, default=0, nullable=False)
+    input = blob_text("input")
+    output = blob_text("output")
 
     # ForeignKey
     _problem_id = Column(Integer, ForeignKey("problems.id", ondelete="CASCADE"), index=True, nullable=False)
@@ -62,8 +99,12 @@ class CaseModel(Base):
     __tablename__ = "cases"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    input = Column(Text, nullable=False)
-    output = Column(Text, nullable=False)
+    input_hash = Column(String(64), nullable=False)
+    input_size = Column(Integer, default=0, nullable=False)
+    output_hash = Column(String(64), nullable=False)
+    output_size = Column(Integer, default=0, nullable=False)
+    input = blob_text("input")
+    output = blob_text("output")
 
     # ForeignKey
     _problem_id = Column(Integer, ForeignKey("problems.id", ondelete="CASCADE"), index=True, nullable=False)
@@ -92,10 +133,13 @@ class ProblemModel(Base):
     author = Column(String(255), nullable=True)
     difficulty = Column(String(50), nullable=True)
     log_visibility = Column(Boolean, default=False, nullable=False)
+    data_version = Column(String(64), nullable=True)
 
     # SPJ
     judge_mode = Column(String(50), default="standard", nullable=False)
+    judge_policy = Column(String(50), default="full", nullable=False)
     spj_code = Column(Text, nullable=True)
+    spj_protocol = Column(String(50), default="exec", nullable=False)
     spj_language_id = Column(Integer, ForeignKey("languages.id"), nullable=True)
     spj_language = relationship("LanguageModel", back_populates="problem")
 
@@ -138,7 +182,10 @@ class TestCaseResultModel(Base):
     result = Column(Enum(StatusCategory), default=StatusCategory.PENDING, nullable=False)
     time = Column(Float, default=0.0, nullable=False)
     memory = Column(Integer, default=0, nullable=False)
+    # 输出预览(前OUTPUT_PREVIEW字节)与完整输出的sha256, 大小
     output = Column(Text, default="", nullable=False)
+    output_hash = Column(String(64), nullable=True)
+    output_size = Column(Integer, default=0, nullable=False)
     err_msg = Column(Text, default="", nullable=False)
 
     # ForeignKey
@@ -158,6 +205,10 @@ class SubmissionModel(Base):
     status = Column(Enum(SubmissionStatusCategory), default=SubmissionStatusCategory.PENDING, index=True, nullable=False)
     score = Column(Integer, default=0, nullable=False)
     counts = Column(Integer, default=0, nullable=False)
+    cases_done = Column(Integer, default=0, nullable=False)
+    cases_total = Column(Integer, default=0, nullable=False)
+    verdict_key = Column(String(64), index=True, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), index=True, nullable=False)
     time = Column(Float, default=0.0, nullable=False)
     memory = Column(Integer, default=0, nullable=False)
     pdg = Column(JSON, nullable=True)
@@ -173,6 +224,7 @@ class SubmissionModel(Base):
     language = relationship("LanguageModel", back_populates="submissions")
     test_case_results = relationship("TestCaseResultModel", back_populates="submission", cascade="all, delete-orphan")
     plagiarism_task = relationship("PlagiarismTaskModel", back_populates="submission", uselist=False, cascade="all, delete-orphan")
+    judge_jobs = relationship("JudgeJobModel", back_populates="submission", cascade="all, delete-orphan")
 
     @hybrid_property
     def problem_id(self) -> str | None:
@@ -186,6 +238,28 @@ class SubmissionModel(Base):
             return self.language.name
         return None
 
+class JudgeJobModel(Base):
+    """评测任务模型"""
+    __tablename__ = "judge_jobs"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    state = Column(Enum(JudgeJobStatusCategory), default=JudgeJobStatusCategory.QUEUED, index=True, nullable=False)
+    priority = Column(Integer, default=0, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    worker = Column(String(255), nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    err_msg = Column(Text, default="", nullable=False)
+    batch_id = Column(String(32), index=True, nullable=True)
+
+    # ForeignKey
+    submission_id = Column(Integer, ForeignKey("submissions.id"), index=True, nullable=False)
+
+    # RelationShips
+    submission = relationship("SubmissionModel", back_populates="judge_jobs")
+
 class LogModel(Base):
     """题目模型"""
     __tablename__ = "logs"
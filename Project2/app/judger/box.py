@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+from typing import Dict
+
+from app.judger.config import WORKDIR_BASE, RUNNER_DIR
+
+"""
+沙箱可见目录: 评测容器不挂载评测根目录, 只读挂载自己的box目录与runner
+运行前把本次需要的文件(提交的程序文件, 测例输入, spj及其参数)以硬链接放入box, 用完清空;
+其他提交的文件, 测试数据中的答案与缓存都不在容器内可见
+box旁的输出目录可写挂载于OUTPUT_MOUNT, 属于评测端用户且权限为0700, 容器内只有root(runner)凭DAC_OVERRIDE可访问, 用于把测例的完整输出交给评测端
+"""
+BOX_BASE = os.path.join(WORKDIR_BASE, "_box")
+BOX_MOUNT = "/box"
+RUNNER_MOUNT = "/runner"
+OUTPUT_MOUNT = "/out"
+os.makedirs(BOX_BASE, exist_ok=True)
+
+class Box:
+    """一个box目录, root为本机路径, out为对应的输出目录"""
+    def __init__(self, root:str, mount:str=BOX_MOUNT):
+        self.root = root
+        self.mount = mount
+        self.out = f"{root}.out"
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(self.out, exist_ok=True)
+        # 容器内测例以nobody运行, 需要能读取box中的文件, 但不能读写输出目录
+        os.chmod(root, 0o755)
+        os.chmod(self.out, 0o700)
+
+    @classmethod
+    def temporary(cls) -> "Box":
+        """单独创建的容器使用的一次性box, 用完调用destroy"""
+        return cls(tempfile.mkdtemp(dir=BOX_BASE, prefix="tmp-"))
+
+    def add(self, host_path:str, name:str=None) -> str:
+        """放入一个文件(同名则替换), 返回其在沙箱内的路径; 跨文件系统时退化为复制"""
+        name = name or os.path.basename(host_path)
+        target = os.path.join(self.root, name)
+        if os.path.lexists(target):
+            os.remove(target)
+        try:
+            os.link(host_path, target)
+        except OSError:
+            shutil.copy2(host_path, target)
+        return f"{self.mount}/{name}"
+
+    def add_dir(self, host_dir:str):
+        """放入目录下的所有文件(不含子目录)"""
+        for entry in os.scandir(host_dir):
+            if entry.is_file(follow_symlinks=False):
+                self.add(entry.path)
+
+    def write(self, name:str, data:bytes) -> str:
+        target = os.path.join(self.root, name)
+        if os.path.lexists(target):
+            os.remove(target)
+        with open(target, "wb") as f:
+            f.write(data)
+        return f"{self.mount}/{name}"
+
+    def clear(self):
+        for directory in (self.root, self.out):
+            for entry in os.scandir(directory):
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+
+    def destroy(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.out, ignore_errors=True)
+
+    def volumes(self) -> Dict[str, Dict[str, str]]:
+        """容器的全部挂载: box与runner只读, 输出目录可写"""
+        return {
+            self.root: {'bind': self.mount, 'mode': 'ro'},
+            RUNNER_DIR: {'bind': RUNNER_MOUNT, 'mode': 'ro'},
+            self.out: {'bind': OUTPUT_MOUNT, 'mode': 'rw'},
+        }
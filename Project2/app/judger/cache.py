@@ -0,0 +1,146 @@
+import os
+import time
+import shutil
+import fcntl
+import hashlib
+import tempfile
+import docker
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from app.judger import metrics
+from app.judger.config import client, CACHE_BASE, COMPILE_CACHE_MAX_BYTES, SPJ_CACHE_MAX_BYTES
+
+"""评测产物缓存: 以内容哈希为键的本地目录, 按总大小LRU淘汰"""
+
+class ArtifactCache:
+    """每个键对应一个目录, 写入时先写临时目录再原子重命名, 命中时更新mtime作为LRU依据"""
+    def __init__(self, name:str, max_bytes:int):
+        self.name = name
+        self.root = os.path.join(CACHE_BASE, name)
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def _entry(self, key:str) -> str:
+        return os.path.join(self.root, key)
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, ".lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, key:str) -> Optional[str]:
+        """命中返回条目目录, 未命中返回None"""
+        entry = self._entry(key)
+        if not os.path.isdir(entry):
+            metrics.count("cache_misses_total", cache=self.name)
+            return None
+        os.utime(entry)
+        metrics.count("cache_hits_total", cache=self.name)
+        return entry
+
+    def put(self, key:str, files:Dict[str, bytes], executable:bool=False) -> str:
+        """写入条目, 已存在时保留原条目"""
+        entry = self._entry(key)
+        tmp_dir = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        for filename, content in files.items():
+            path = os.path.join(tmp_dir, filename)
+            with open(path, "wb") as f:
+                f.write(content)
+            if executable:
+                os.chmod(path, 0o755)
+        os.chmod(tmp_dir, 0o755)
+        try:
+            os.rename(tmp_dir, entry)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+        return entry
+
+    def _size(self, entry:str) -> int:
+        return sum(
+            os.path.getsize(os.path.join(entry, filename)) for filename in os.listdir(entry)
+        )
+
+    def evict(self):
+        """总大小超过上限时, 按最近使用时间从旧到新删除"""
+        with self._locked():
+            entries = []
+            total = 0
+            for key in os.listdir(self.root):
+                entry = self._entry(key)
+                if key.startswith(".") or not os.path.isdir(entry):
+                    continue
+                size = self._size(entry)
+                entries.append((os.path.getmtime(entry), size, entry))
+                total += size
+
+            entries.sort()
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                metrics.inc("cache_evictions_total", cache=self.name)
+
+    def invalidate(self, prefix:str):
+        """删除键以prefix开头的所有条目"""
+        with self._locked():
+            for key in os.listdir(self.root):
+                if key.startswith(prefix):
+                    shutil.rmtree(self._entry(key), ignore_errors=True)
+                    metrics.inc("cache_invalidations_total", cache=self.name)
+
+    def stats(self) -> Dict[str, int]:
+        """条目数与总大小"""
+        count, total = 0, 0
+        for key in os.listdir(self.root):
+            entry = self._entry(key)
+            if key.startswith(".") or not os.path.isdir(entry):
+                continue
+            count += 1
+            total += self._size(entry)
+        return {"entries": count, "bytes": total}
+
+"""编译缓存"""
+compile_cache = ArtifactCache("compile", COMPILE_CACHE_MAX_BYTES)
+
+COMPILE_OUTPUT = "main"
+COMPILE_ERROR = "ce.txt"
+
+_IMAGE_DIGESTS:Dict[str, str] = {}
+
+def image_digest(image:str) -> str:
+    """镜像id, 镜像更新后编译缓存自然失效"""
+    if image not in _IMAGE_DIGESTS:
+        try:
+            _IMAGE_DIGESTS[image] = client.images.get(image).id
+        except docker.errors.ImageNotFound:
+            return image
+    return _IMAGE_DIGESTS[image]
+
+def compile_key(code:str, compile_cmd:str, environment:str) -> str:
+    """sha256(源码 + 编译命令 + 编译环境), 编译环境由执行后端给出(docker为镜像id)"""
+    h = hashlib.sha256()
+    for part in (code, compile_cmd, environment):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+"""SPJ缓存: 每道题的checker只编译一次, 键为 题目id-sha256(spj代码 + spj语言)"""
+spj_cache = ArtifactCache("spj", SPJ_CACHE_MAX_BYTES)
+
+def spj_key(problem_id:int, spj_code, spj_language_name:str) -> str:
+    h = hashlib.sha256()
+    h.update(spj_code.encode("utf-8") if isinstance(spj_code, str) else spj_code)
+    h.update(b"\0")
+    h.update(spj_language_name.encode("utf-8"))
+    return f"{problem_id}-{h.hexdigest()}"
+
+def invalidate_spj(problem_id:int):
+    """题目的spj脚本或评测模式变化时清除其缓存"""
+    spj_cache.invalidate(f"{problem_id}-")
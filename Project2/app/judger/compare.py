@@ -0,0 +1,236 @@
+import re
+import math
+from collections import Counter
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple, Any
+
+"""
+流式答案比对: 按块读取用户输出与标准答案, 内存占用与输出大小无关(token模式下另需容纳最长的单个token)
+standard: 忽略整个输出末尾的空白, 与 rstrip() 后比较一致
+strict: 逐字节完全一致
+whitespace: 按空白切分为token比较, 忽略空白的种类与数量
+float: 同whitespace, 两边都是有限的十进制数(可带指数)的token允许绝对或相对误差, inf/nan/1_000等写法须逐字节相同; float:1e-4 形式可指定误差
+nocase: 同whitespace, token不区分大小写(YES/no类题目)
+unordered: 行的多重集合相同, 忽略行尾空白与空行, 行的顺序任意
+multiset: token的多重集合相同, 顺序任意
+顺序相关的模式发现第一处不同即停止, 返回用户输出中的行号, 列号(从1开始)
+unordered与multiset需统计全部内容, 内存与输出大小成正比(输出大小受OUTPUT_LIMIT限制), 返回第一个多出或缺少的行/token
+"""
+CHUNK_SIZE = 64 * 1024
+FLOAT_EPS = 1e-6
+MODES = ("standard", "strict", "whitespace", "float", "nocase", "unordered", "multiset")
+
+_TOKEN = re.compile(rb"\S+")
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_WHITESPACE = b" \t\n\r\x0b\x0c"
+
+class _Position:
+    """跟踪已读取内容的行号与列号"""
+    def __init__(self):
+        self.line = 1
+        self.column = 1
+
+    def advance(self, data:bytes):
+        newlines = data.count(b"\n")
+        if newlines:
+            self.line += newlines
+            self.column = len(data) - data.rfind(b"\n")
+        else:
+            self.column += len(data)
+
+def _read(f:BinaryIO, size:int) -> bytes:
+    """读满size字节, 直到EOF"""
+    data = f.read(size)
+    while data and len(data) < size:
+        more = f.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+def _only_whitespace(head:bytes, f:BinaryIO) -> bool:
+    """head与f的剩余内容是否只有空白"""
+    if head.strip(_WHITESPACE):
+        return False
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            return True
+        if chunk.strip(_WHITESPACE):
+            return False
+
+def _preview(data:bytes, limit:int=32) -> str:
+    """差异处的片段"""
+    return data[:limit].decode("utf-8", errors="replace")
+
+def _diff(position:_Position, expected:bytes, got:bytes) -> Dict[str, Any]:
+    return {"line": position.line, "column": position.column, "expected": _preview(expected), "got": _preview(got)}
+
+def _compare_bytes(user:BinaryIO, answer:BinaryIO, ignore_trailing:bool) -> Optional[Dict[str, Any]]:
+    """逐块比较字节; ignore_trailing时, 若第一处不同之后两边都只剩空白则视为相同"""
+    position = _Position()
+    while True:
+        got = _read(user, CHUNK_SIZE)
+        expected = _read(answer, CHUNK_SIZE)
+        if got == expected:
+            if not got:
+                return None
+            position.advance(got)
+            continue
+
+        index = 0
+        for index, (a, b) in enumerate(zip(got, expected)):
+            if a != b:
+                break
+        else:
+            index = min(len(got), len(expected))
+
+        if ignore_trailing and _only_whitespace(got[index:], user) and _only_whitespace(expected[index:], answer):
+            return None
+        position.advance(got[:index])
+        return _diff(position, expected[index:], got[index:])
+
+def _last_whitespace(data:bytes) -> int:
+    """data中最后一个空白字节的下标, 没有时为-1"""
+    return max(data.rfind(byte) for byte in _WHITESPACE)
+
+def _tokens(f:BinaryIO) -> Iterator[Tuple[Optional[bytes], int, int]]:
+    """逐个产生token及其行号, 列号, 跨块的token会被拼接; 最后产生一个None表示EOF"""
+    position = _Position()
+    buffer = bytearray()
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        buffer += chunk
+        end = len(buffer)
+        if chunk:
+            # 末尾的token可能还未读完, 留到下一块; 上一块留下的部分不含空白, 只需在新读入的块中反向查找
+            split = _last_whitespace(chunk)
+            if split < 0:
+                continue
+            end -= len(chunk) - split - 1
+        offset = 0
+        for match in _TOKEN.finditer(buffer, 0, end):
+            position.advance(buffer[offset:match.start()])
+            yield match.group(), position.line, position.column
+            offset = match.start()
+        position.advance(buffer[offset:end])
+        del buffer[:end]
+        if not chunk:
+            yield None, position.line, position.column
+            return
+
+def _float_equal(got:bytes, expected:bytes, eps:float) -> bool:
+    """两边都是十进制数且转换后有限时按误差比较; 逐字节相同的情况由调用方处理"""
+    if not (_NUMBER.fullmatch(got) and _NUMBER.fullmatch(expected)):
+        return False
+    a, b = float(got), float(expected)
+    if not (math.isfinite(a) and math.isfinite(b)):
+        return False
+    return abs(a - b) <= eps * max(1.0, abs(b))
+
+def _token_equal(got:Optional[bytes], expected:Optional[bytes], eps:Optional[float], nocase:bool) -> bool:
+    if got == expected:
+        return True
+    if got is None or expected is None:
+        return False
+    if nocase:
+        return got.lower() == expected.lower()
+    return eps is not None and _float_equal(got, expected, eps)
+
+def _compare_tokens(user:BinaryIO, answer:BinaryIO, eps:Optional[float], nocase:bool=False) -> Optional[Dict[str, Any]]:
+    """逐token比较, eps不为None时数字token按误差比较, nocase时不区分大小写"""
+    got_tokens = _tokens(user)
+    expected_tokens = _tokens(answer)
+    while True:
+        got, line, column = next(got_tokens)
+        expected, _, _ = next(expected_tokens)
+        if got is None and expected is None:
+            return None
+        if not _token_equal(got, expected, eps, nocase):
+            return {
+                "line": line, "column": column,
+                "expected": "<EOF>" if expected is None else _preview(expected),
+                "got": "<EOF>" if got is None else _preview(got),
+            }
+
+def _lines(f:BinaryIO) -> Iterator[bytes]:
+    """逐行产生去掉行尾空白的非空行, 跨块的行会被拼接"""
+    buffer = bytearray()
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        buffer += chunk
+        end = len(buffer)
+        if chunk:
+            # 末尾的行可能还未读完, 留到下一块; 同_tokens, 只在新读入的块中查找换行
+            split = chunk.rfind(b"\n")
+            if split < 0:
+                continue
+            end -= len(chunk) - split - 1
+        lines = bytes(buffer[:end]).split(b"\n")
+        del buffer[:end]
+        for line in lines:
+            line = line.rstrip(_WHITESPACE)
+            if line:
+                yield line
+        if not chunk:
+            return
+
+def _compare_counts(got:Counter, expected:Counter, unit:str) -> Optional[Dict[str, Any]]:
+    """多重集合比较, 不同时给出第一个缺少或多出的元素"""
+    if got == expected:
+        return None
+    for item, count in expected.items():
+        if got[item] < count:
+            return {"message": f"Missing {unit} {_preview(item)!r} ({got[item]} of {count})."}
+    for item, count in got.items():
+        if expected[item] < count:
+            return {"message": f"Unexpected {unit} {_preview(item)!r} ({count} given, {expected[item]} expected)."}
+    return None
+
+def parse_mode(judge_mode:str) -> Tuple[str, Optional[float]]:
+    """解析评测模式, float:<eps> 给出误差; 不是内置模式时抛出ValueError"""
+    mode, _, argument = judge_mode.partition(":")
+    if mode not in MODES:
+        raise ValueError(f"Unknown judge mode {judge_mode!r}.")
+    if not argument:
+        return mode, None
+    if mode != "float":
+        raise ValueError(f"Judge mode {mode!r} takes no argument.")
+    eps = float(argument)
+    if not (eps >= 0 and math.isfinite(eps)):
+        raise ValueError(f"Invalid float tolerance {argument!r}.")
+    return mode, eps
+
+def valid_mode(judge_mode:str) -> bool:
+    try:
+        parse_mode(judge_mode)
+    except ValueError:
+        return False
+    return True
+
+def compare(user:BinaryIO, answer:BinaryIO, mode:str="standard", eps:float=FLOAT_EPS) -> Optional[Dict[str, Any]]:
+    """比较用户输出与标准答案(二进制文件对象), 相同返回None, 否则返回第一处不同的位置与片段(或说明)
+    mode为题目的judge_mode, 其中的误差优先于eps"""
+    mode, mode_eps = parse_mode(mode)
+    if mode == "strict":
+        return _compare_bytes(user, answer, ignore_trailing=False)
+    if mode == "whitespace":
+        return _compare_tokens(user, answer, eps=None)
+    if mode == "float":
+        return _compare_tokens(user, answer, eps=eps if mode_eps is None else mode_eps)
+    if mode == "nocase":
+        return _compare_tokens(user, answer, eps=None, nocase=True)
+    if mode == "unordered":
+        return _compare_counts(Counter(_lines(user)), Counter(_lines(answer)), "line")
+    if mode == "multiset":
+        return _compare_counts(
+            Counter(token for token, _, _ in _tokens(user) if token is not None),
+            Counter(token for token, _, _ in _tokens(answer) if token is not None),
+            "token",
+        )
+    return _compare_bytes(user, answer, ignore_trailing=True)
+
+def describe(diff:Dict[str, Any]) -> str:
+    """差异的文字说明, 写入err_msg"""
+    if "message" in diff:
+        return f"Wrong answer: {diff['message']}"
+    return f"Wrong answer at line {diff['line']}, column {diff['column']}: expected {diff['expected']!r}, got {diff['got']!r}."
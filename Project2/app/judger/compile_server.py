@@ -0,0 +1,258 @@
+"""
+容器内编译服务: 只依赖标准库, 挂载进常驻编译容器后以root运行
+用法: python3 compile_server.py <socket路径>
+每个连接处理一个任务: 请求为一行json, 形如 {"cmd": "g++ -std=c++14 main.cpp -o main", "files": {"main.cpp": 120}, "timeout": 30, "memory_limit": 512}
+随后依次为files中各源文件的内容(按给出的字节数); 响应为一行json {"status": 0, "timed_out": false, "diagnostics": "", "size": n, "pch": true, "ccache": true, "elapsed": 0.3},
+随后为n字节的编译产物(编译失败时n为0)
+每个任务以独占的uid在/jobs下仅自己可访问的目录中编译(TMPDIR也指向该目录), 任务之间不能读取彼此的源文件与中间文件, 超时杀死整个进程组
+按编译选项(命令去掉源文件与-o)为bits/stdc++.h构建一次预编译头, 以-I指向其所在目录, 之后相同选项的编译直接使用;
+构建期间相同选项的其他任务不等待, 直接不用预编译头编译; 编译时限从预编译头就绪后开始计算
+安装了ccache时每个源文件先经ccache编译为目标文件再链接, 相同源码不再重复编译(ccache不缓存链接);
+缓存目录由各任务经共同的组(nogroup)读写
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import signal
+import hashlib
+import resource
+import tempfile
+import threading
+import subprocess
+import socketserver
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+NOBODY = 65534
+JOB_DIR = "/jobs"
+JOB_UID_BASE = 20000
+JOB_UID_COUNT = 256
+CCACHE_MODE = 0o2770
+PCH_DIR = "/pch"
+PCH_HEADER = "bits/stdc++.h"
+PCH_TIMEOUT = 120
+COMPILERS = ("g++", "c++")
+SOURCE_SUFFIXES = (".cpp", ".cc", ".cxx")
+DIAGNOSTICS_LIMIT = 64 * 1024
+
+# 编译选项的哈希 -> 预编译头目录, 构建失败为None
+_pch_dirs:Dict[str, Optional[str]] = {}
+_pch_locks:Dict[str, threading.Lock] = {}
+_lock = threading.Lock()
+# 空闲的任务uid
+_free_uids = list(range(JOB_UID_BASE, JOB_UID_BASE + JOB_UID_COUNT))
+_uid_released = threading.Condition(_lock)
+
+def plan(argv:List[str]) -> Optional[Tuple[List[str], List[str], str]]:
+    """拆分编译并链接的g++命令为 编译选项, 源文件, 输出文件; 其他形式的命令返回None"""
+    if not argv or os.path.basename(argv[0]) not in COMPILERS:
+        return None
+    flags, sources, output = [], [], None
+    args = iter(argv[1:])
+    for arg in args:
+        if arg == "-o":
+            output = next(args, None)
+        elif arg in ("-c", "-S", "-E") or arg.startswith("-o"):
+            return None
+        elif arg.endswith(SOURCE_SUFFIXES) and not arg.startswith("-"):
+            sources.append(arg)
+        else:
+            flags.append(arg)
+    if not sources or not output or any(os.path.basename(name) != name for name in sources + [output]):
+        return None
+    return flags, sources, output
+
+def _build_pch(compiler:str, flags:List[str], directory:str) -> Optional[str]:
+    """找到编译器实际使用的头文件, 复制到directory下并以相同选项预编译, 两步共用PCH_TIMEOUT; 失败返回None"""
+    deadline = time.monotonic() + PCH_TIMEOUT
+    try:
+        result = subprocess.run(
+            [compiler, *flags, "-x", "c++", "-E", "-"],
+            input=f"#include <{PCH_HEADER}>\n".encode(), capture_output=True, timeout=PCH_TIMEOUT,
+        )
+        if result.returncode != 0:
+            return None
+        # 预处理输出的行标记中第一个以该头文件结尾的路径
+        header = None
+        for line in result.stdout.decode("utf-8", errors="ignore").splitlines():
+            if line.startswith("# 1 \"") and line.split("\"")[1].endswith("/" + PCH_HEADER):
+                header = line.split("\"")[1]
+                break
+        if header is None:
+            return None
+
+        target = os.path.join(directory, PCH_HEADER)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy(header, target)
+        result = subprocess.run(
+            [compiler, *flags, "-x", "c++-header", target, "-o", target + ".gch"],
+            capture_output=True, timeout=max(0.0, deadline - time.monotonic()),
+        )
+        if result.returncode != 0:
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+        return directory
+    except (OSError, subprocess.TimeoutExpired):
+        shutil.rmtree(directory, ignore_errors=True)
+        return None
+
+def _pch(compiler:str, flags:List[str]) -> Optional[str]:
+    """相同编译选项的预编译头只构建一次; 其他任务正在构建时不等待, 返回None(本次不使用预编译头)"""
+    key = hashlib.sha256("\0".join([compiler, *flags]).encode()).hexdigest()[:16]
+    with _lock:
+        if key in _pch_dirs:
+            return _pch_dirs[key]
+        lock = _pch_locks.setdefault(key, threading.Lock())
+    if not lock.acquire(blocking=False):
+        return None
+    try:
+        if key not in _pch_dirs:
+            _pch_dirs[key] = _build_pch(compiler, flags, os.path.join(PCH_DIR, key))
+        return _pch_dirs[key]
+    finally:
+        lock.release()
+
+@contextmanager
+def _job_uid():
+    """租用一个任务uid, 全部占用时等待"""
+    with _uid_released:
+        while not _free_uids:
+            _uid_released.wait()
+        uid = _free_uids.pop()
+    try:
+        yield uid
+    finally:
+        with _uid_released:
+            _free_uids.append(uid)
+            _uid_released.notify()
+
+def _demote(memory_limit:int, uid:int):
+    """子进程: 新会话, 限制地址空间, 以root运行时降权为任务uid(组为nogroup, 用于读写ccache)"""
+    os.setsid()
+    if memory_limit:
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if os.getuid() == 0:
+        os.setgroups([])
+        os.setgid(NOBODY)
+        os.setuid(uid)
+
+def _run(argv:List[str], cwd:str, deadline:float, memory_limit:int, uid:int) -> Tuple[Optional[int], bytes]:
+    """运行一步编译, 返回 退出码(超时为None), stdout与stderr的合并输出"""
+    proc = subprocess.Popen(
+        argv, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        env=dict(os.environ, TMPDIR=cwd), preexec_fn=lambda: _demote(memory_limit, uid),
+    )
+    try:
+        output, _ = proc.communicate(timeout=max(0.0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        proc.communicate()
+        return None, b""
+    return proc.returncode, output
+
+def compile_job(request:dict, files:Dict[str, bytes]) -> Tuple[dict, bytes]:
+    """以独占的uid在私有目录中编译, 返回响应与编译产物"""
+    start = time.monotonic()
+    response = {"status": 1, "timed_out": False, "diagnostics": "", "size": 0, "pch": False, "ccache": False, "elapsed": 0.0}
+    argv = shlex.split(request["cmd"])
+    parsed = plan(argv)
+    if parsed is None or any(os.path.basename(name) != name or name.startswith(".") for name in files):
+        response["diagnostics"] = "Unsupported compile request."
+        return response, b""
+    compiler, (flags, sources, output) = argv[0], parsed
+    memory_limit = request.get("memory_limit", 0)
+
+    pch = _pch(compiler, flags)
+    # 预编译头的构建可能长达PCH_TIMEOUT, 不计入编译时限
+    deadline = time.monotonic() + request.get("timeout", 30)
+    include = ["-I", pch] if pch else []
+    ccache = shutil.which("ccache")
+    if ccache:
+        objects = [f".obj{i}.o" for i in range(len(sources))]
+        steps = [
+            [ccache, compiler, *include, *flags, "-fpch-preprocess", "-c", source, "-o", obj]
+            for source, obj in zip(sources, objects)
+        ]
+        steps.append([compiler, *flags, *objects, "-o", output])
+    else:
+        steps = [[compiler, *include, *flags, *sources, "-o", output]]
+
+    with _job_uid() as uid:
+        # mkdtemp创建的目录为0700, 交给任务uid后其他任务无法进入
+        work_dir = tempfile.mkdtemp(dir=JOB_DIR, prefix="compile-")
+        try:
+            for name, data in files.items():
+                with open(os.path.join(work_dir, name), "wb") as f:
+                    f.write(data)
+            if os.getuid() == 0:
+                for name in [".", *files]:
+                    os.chown(os.path.join(work_dir, name), uid, NOBODY)
+
+            diagnostics = []
+            status = 0
+            for step in steps:
+                status, step_output = _run(step, work_dir, deadline, memory_limit, uid)
+                diagnostics.append(step_output)
+                if status != 0:
+                    break
+            response.update(
+                status=status, timed_out=status is None, pch=pch is not None, ccache=ccache is not None,
+                diagnostics=b"".join(diagnostics)[:DIAGNOSTICS_LIMIT].decode("utf-8", errors="ignore"),
+            )
+            artifact = b""
+            if status == 0 and os.path.exists(os.path.join(work_dir, output)):
+                with open(os.path.join(work_dir, output), "rb") as f:
+                    artifact = f.read()
+            response.update(size=len(artifact), elapsed=time.monotonic() - start)
+            return response, artifact
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        files = {name: self.rfile.read(size) for name, size in request["files"].items()}
+        response, artifact = compile_job(request, files)
+        self.wfile.write(json.dumps(response).encode() + b"\n" + artifact)
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def main():
+    socket_path = sys.argv[1]
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    os.makedirs(PCH_DIR, exist_ok=True)
+    # 任务目录的父目录不可列出
+    os.makedirs(JOB_DIR, exist_ok=True)
+    os.chmod(JOB_DIR, 0o711)
+    # 编译以各任务uid运行, ccache目录(docker卷)对nogroup组可写, 新文件继承该组(CCACHE_UMASK由容器环境给出)
+    ccache_dir = os.environ.get("CCACHE_DIR")
+    if ccache_dir and os.getuid() == 0:
+        os.makedirs(ccache_dir, exist_ok=True)
+        if os.stat(ccache_dir).st_mode & 0o7777 != CCACHE_MODE:
+            # 旧版本的缓存属于单一用户, 清空后重建
+            for entry in os.scandir(ccache_dir):
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+            os.chown(ccache_dir, 0, NOBODY)
+            os.chmod(ccache_dir, CCACHE_MODE)
+    with Server(socket_path, Handler) as server:
+        # socket所在目录仅评测用户可访问
+        os.chmod(socket_path, 0o666)
+        server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import shlex
+import fcntl
+import socket
+import shutil
+import hashlib
+import docker
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from app.judger import compile_server, metrics
+from app.judger.cache import image_digest
+from app.judger.config import (
+    client, DOCKER_IMAGE, COMPILE_SERVER_DIR, COMPILE_SERVER_MEMORY, COMPILE_SERVER_START_TIMEOUT,
+    COMPILE_TIMEOUT, CCACHE_VOLUME, CCACHE_MAX_SIZE,
+)
+
+"""
+编译服务客户端: 每种语言一个常驻编译容器, 运行compile_server.py, 经COMPILE_SERVER_DIR下的unix socket接收编译任务
+源文件随请求发送, 编译产物随响应返回并写入评测目录, 编译容器不挂载评测目录
+容器以label发现, 标签中记录镜像id与服务脚本的哈希, 任一变化时重建; 多个评测进程通过锁文件互斥启动容器
+"""
+COMPILE_LABEL = "oj.compile"
+VERSION_LABEL = "oj.compile.version"
+SERVER_MOUNT = "/compile"
+
+# socket目录仅评测用户可访问(容器内root不受目录权限限制)
+os.makedirs(COMPILE_SERVER_DIR, mode=0o700, exist_ok=True)
+shutil.copy(compile_server.__file__, os.path.join(COMPILE_SERVER_DIR, "compile_server.py"))
+
+# 本进程已确认为当前版本的编译容器: 语言 -> 版本
+_verified:Dict[str, str] = {}
+
+class CompileServerError(RuntimeError):
+    """编译服务不可用或不支持该编译命令, 由调用方回退为普通编译"""
+
+def _socket_path(language_name:str) -> str:
+    return os.path.join(COMPILE_SERVER_DIR, f"{language_name}.sock")
+
+def _version(language_name:str) -> str:
+    with open(compile_server.__file__, "rb") as f:
+        script = f.read()
+    return hashlib.sha256(image_digest(DOCKER_IMAGE[language_name]).encode() + script).hexdigest()[:16]
+
+@contextmanager
+def _lock(language_name:str):
+    with open(os.path.join(COMPILE_SERVER_DIR, f"{language_name}.lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _connect(language_name:str) -> Optional[socket.socket]:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(_socket_path(language_name))
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+def _start(language_name:str, version:str) -> socket.socket:
+    """删除旧的编译容器, 启动新容器并等待socket可连接; 预编译头在首次编译时构建"""
+    for container in client.containers.list(all=True, filters={"label": f"{COMPILE_LABEL}={language_name}"}):
+        try:
+            container.remove(force=True)
+        except docker.errors.NotFound:
+            pass
+    if os.path.exists(_socket_path(language_name)):
+        os.unlink(_socket_path(language_name))
+
+    with metrics.timed("docker_op_seconds", op="compile_server_start", language=language_name):
+        client.containers.run(
+            image=DOCKER_IMAGE[language_name],
+            command=f"python3 {SERVER_MOUNT}/compile_server.py {SERVER_MOUNT}/{language_name}.sock",
+            labels={COMPILE_LABEL: language_name, VERSION_LABEL: version},
+            volumes={
+                COMPILE_SERVER_DIR: {'bind': SERVER_MOUNT, 'mode': 'rw'},
+                CCACHE_VOLUME: {'bind': '/ccache', 'mode': 'rw'},
+            },
+            environment={
+                "CCACHE_DIR": "/ccache",
+                "CCACHE_MAXSIZE": CCACHE_MAX_SIZE,
+                "CCACHE_SLOPPINESS": "pch_defines,time_macros",
+                "CCACHE_UMASK": "007",
+            },
+            network_disabled=True,
+            cap_drop=["ALL"],
+            cap_add=["SETUID", "SETGID", "CHOWN", "DAC_OVERRIDE", "KILL"],
+            pids_limit=256,
+            mem_limit=f"{COMPILE_SERVER_MEMORY}m",
+            user='root',
+            detach=True,
+        )
+    metrics.inc("compile_server_started_total", language=language_name)
+
+    deadline = time.time() + COMPILE_SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        sock = _connect(language_name)
+        if sock is not None:
+            return sock
+        time.sleep(0.05)
+    raise CompileServerError(f"{language_name} compile server did not start in {COMPILE_SERVER_START_TIMEOUT}s")
+
+def _ensure(language_name:str) -> socket.socket:
+    """连接编译服务; 容器不存在, 版本过期或无响应时重建"""
+    version = _version(language_name)
+    if _verified.get(language_name) == version:
+        sock = _connect(language_name)
+        if sock is not None:
+            return sock
+
+    try:
+        with _lock(language_name):
+            containers = client.containers.list(filters={"label": f"{COMPILE_LABEL}={language_name}"})
+            sock = None
+            if containers and all(c.labels.get(VERSION_LABEL) == version for c in containers):
+                sock = _connect(language_name)
+            if sock is None:
+                sock = _start(language_name, version)
+    except docker.errors.APIError as e:
+        raise CompileServerError(str(e))
+    _verified[language_name] = version
+    return sock
+
+def compile(work_dir:str, language_name:str, compile_cmd:str, memory_limit:int) -> Tuple[Optional[int], str]:
+    """在编译服务中编译, 产物写入评测目录; 返回 退出码(超时为None), 编译器输出"""
+    parsed = compile_server.plan(shlex.split(compile_cmd))
+    if parsed is None:
+        raise CompileServerError(f"Unsupported compile command: {compile_cmd}")
+    _, sources, output = parsed
+    files = {}
+    for name in sources:
+        with open(os.path.join(work_dir, name), "rb") as f:
+            files[name] = f.read()
+
+    request = {
+        "cmd": compile_cmd, "files": {name: len(data) for name, data in files.items()},
+        "timeout": COMPILE_TIMEOUT, "memory_limit": memory_limit,
+    }
+    sock = _ensure(language_name)
+    try:
+        # 首次使用某组编译选项时需要先构建预编译头
+        sock.settimeout(COMPILE_TIMEOUT + compile_server.PCH_TIMEOUT)
+        sock.sendall(json.dumps(request).encode() + b"\n" + b"".join(files.values()))
+        with sock.makefile("rb") as f:
+            response = json.loads(f.readline())
+            artifact = f.read(response["size"])
+    except (OSError, ValueError, KeyError) as e:
+        raise CompileServerError(f"{language_name} compile server failed: {e}")
+    finally:
+        sock.close()
+    if len(artifact) != response["size"]:
+        raise CompileServerError(f"{language_name} compile server returned a truncated artifact")
+
+    metrics.count(
+        "compile_server_jobs_total", language=language_name,
+        pch=str(response["pch"]).lower(), ccache=str(response["ccache"]).lower(),
+    )
+    if response["status"] == 0 and artifact:
+        target = os.path.join(work_dir, output)
+        with open(target + ".tmp", "wb") as f:
+            f.write(artifact)
+        os.chmod(target + ".tmp", 0o755)
+        os.replace(target + ".tmp", target)
+    return (None if response["timed_out"] else response["status"]), response["diagnostics"]
@@ -0,0 +1,114 @@
+import docker
+import os
+
+"""参数设置"""
+client = docker.from_env(timeout=10)
+
+DOCKER_IMAGE = {
+    "cpp": "gcc-judge:latest",
+    "python": "python-judge:latest"
+}
+
+WORKDIR_BASE = os.path.expanduser("~/tmp/pa2-oj-2024010860")
+os.makedirs(WORKDIR_BASE, exist_ok=True)
+
+"""容器池设置"""
+POOL_ENABLED = True
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 8
+POOL_MAX_RUNS = 200
+POOL_LEASE_TIMEOUT = 30.0
+
+"""执行后端: 每种语言使用docker或local(本机子进程, 仅用于可信部署与CI)
+local后端以root运行时测例会降权为nobody, 此时WORKDIR_BASE需要对nobody可访问"""
+SANDBOX_BACKEND = {
+    "cpp": "docker",
+    "python": "docker",
+}
+LOCAL_ISOLATE_NETWORK = True
+LOCAL_COMPILE_TIMEOUT = 30
+
+"""批量评测设置: 一次提交的所有测例由容器内runner依次运行"""
+BATCH_ENABLED = True
+RUNNER_DIR = os.path.join(WORKDIR_BASE, "_runner")
+RUNNER_MEMORY = 32
+
+"""时间限制: runner的看门狗在CPU时间超过时间限制, 或墙钟时间超过 时间限制*WALL_LIMIT_FACTOR 时立即杀死测例进程组"""
+WALL_LIMIT_FACTOR = 2.0
+
+"""输出限制(字节): stdout超过OUTPUT_LIMIT判为OLE(由文件大小上限保证); 未超限的完整输出交给评测端流式比对后删除,
+测例结果只保存前OUTPUT_PREVIEW字节的预览与完整输出的sha256; stderr最多保留STDERR_LIMIT字节"""
+OUTPUT_LIMIT = 16 * 1024 * 1024
+OUTPUT_PREVIEW = 1024
+STDERR_LIMIT = 64 * 1024
+
+"""Python预加载: 批量评测 python main.py 形式的程序时, runner先导入白名单中的模块, 每个测例fork运行脚本
+解释器启动与模块导入不计入用时; 预加载模块占用的内存计入容器上限的额外部分"""
+PYTHON_ZYGOTE_ENABLED = True
+PYTHON_ZYGOTE_PRELOAD = ["numpy", "pandas"]
+PYTHON_ZYGOTE_MEMORY = 128
+
+"""异步编排: 未启用批量评测时, docker后端的测例由一个事件循环并发驱动(每个测例单独创建容器),
+通过少量keep-alive连接直接访问Docker Engine API, 代替每个测例一个进程与一次新连接"""
+ASYNC_ORCHESTRATOR_ENABLED = True
+_docker_host = os.environ.get("DOCKER_HOST", "")
+DOCKER_SOCKET = _docker_host[len("unix://"):] if _docker_host.startswith("unix://") else "/var/run/docker.sock"
+ENGINE_CONNECTIONS = 8
+ENGINE_REQUEST_TIMEOUT = 30.0
+
+"""编译服务: COMPILE_SERVER_LANGUAGES中的语言由一个常驻编译容器编译, 经COMPILE_SERVER_DIR下的unix socket提交任务
+容器内按编译选项为bits/stdc++.h预编译头文件, 并以ccache缓存目标文件(缓存目录为docker卷CCACHE_VOLUME); 服务不可用时回退为单独创建容器编译"""
+COMPILE_SERVER_ENABLED = True
+COMPILE_SERVER_LANGUAGES = ["cpp"]
+COMPILE_SERVER_DIR = os.path.join(WORKDIR_BASE, "_compile")
+COMPILE_SERVER_MEMORY = 2048
+COMPILE_SERVER_START_TIMEOUT = 30.0
+COMPILE_TIMEOUT = 30
+CCACHE_VOLUME = "oj-ccache"
+CCACHE_MAX_SIZE = "2G"
+
+"""提交时语法检查: SYNTAX_CHECK_LANGUAGES中的Python语言在提交时先解析, 语法错误直接判为CE, 不进入评测队列
+检查在API进程中进行, 超过SYNTAX_CHECK_MAX_BYTES的代码不检查(解析的时间与内存随代码大小增长), 交给评测; PYTHON_FEATURE_VERSION为评测镜像中的Python版本"""
+SYNTAX_CHECK_ENABLED = True
+SYNTAX_CHECK_LANGUAGES = ["python"]
+SYNTAX_CHECK_MAX_BYTES = 64 * 1024
+PYTHON_FEATURE_VERSION = (3, 10)
+
+"""评测守护进程设置: 提交在WORKER_CONCURRENCY个常驻评测进程中依次评测, 每个进程评测WORKER_MAX_JOBS_PER_PROCESS个提交后替换"""
+WORKER_CONCURRENCY = 2
+WORKER_MAX_JOBS_PER_PROCESS = 200
+WORKER_POLL_INTERVAL = 0.5
+JOB_LEASE_SECONDS = 60
+CASE_WORKERS = 4
+
+"""stop_on_first_failure题目: 按历史失败率从高到低运行测例, 使错误提交尽早结束"""
+FAIL_FAST_REORDER = True
+
+"""全局并发控制: 整机同时运行的评测容器/编译任务数, 以及单个用户/题目可占用的份额"""
+GOVERNOR_CONTAINER_SLOTS = os.cpu_count() or 4
+GOVERNOR_COMPILE_SLOTS = max(1, GOVERNOR_CONTAINER_SLOTS // 2)
+GOVERNOR_USER_SHARE = 0.5
+GOVERNOR_PROBLEM_SHARE = 0.75
+GOVERNOR_TIMEOUT = 600.0
+
+"""缓存设置"""
+CACHE_BASE = os.path.join(WORKDIR_BASE, "_cache")
+COMPILE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+SPJ_CACHE_MAX_BYTES = 128 * 1024 * 1024
+DATA_BASE = os.path.join(WORKDIR_BASE, "_data")
+ANSWER_BASE = os.path.join(WORKDIR_BASE, "_answers")
+
+"""批量重测: 以低于正常提交的优先级排队, 全局同时运行的批量重测任务数受限, 为新提交留出评测名额"""
+REJUDGE_PRIORITY = -10
+REJUDGE_CONCURRENCY = max(1, WORKER_CONCURRENCY // 2)
+
+"""spj: exec协议每个测例运行一次spj, stream协议每个提交启动一个常驻spj进程逐行评测; SPJ_TIMEOUT为单个测例的评测时间上限"""
+SPJ_TIMEOUT = 10.0
+SPJ_MEMORY = 256
+
+"""评测结果缓存: 相同代码, 语言命令, 测试数据版本, 限制与评测方式的提交直接复用已有结果; 管理员重测不经过缓存"""
+VERDICT_CACHE_ENABLED = True
+
+"""测例结果分批写入数据库"""
+RESULT_BATCH_SIZE = 8
+RESULT_FLUSH_INTERVAL = 0.5
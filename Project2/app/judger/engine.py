@@ -0,0 +1,184 @@
+import json
+import asyncio
+from urllib.parse import urlencode, quote
+from typing import Dict, Any, List, Optional, Tuple
+
+"""
+Docker Engine API的最小异步客户端: 直接在unix socket上收发HTTP/1.1, 仅依赖标准库
+少量keep-alive连接组成连接池, 普通请求复用这些连接; 连接数同时限制了对docker守护进程的并发请求数
+wait这类长轮询请求持续整个测例的运行时间, 各自使用单独的连接, 不占用连接池, 其并发数由调用方的容器名额限制
+连接池属于创建它的事件循环, 每次asyncio.run内新建
+"""
+
+class EngineError(RuntimeError):
+    """Engine API返回错误状态码"""
+    def __init__(self, status:int, message:str):
+        super().__init__(f"Docker Engine API {status}: {message}")
+        self.status = status
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+def demux(data:bytes, stream:int=1) -> bytes:
+    """拆分非tty容器日志的多路复用帧(8字节头: 流类型, 3字节填充, 4字节大端长度), 返回指定流(1为stdout, 2为stderr)"""
+    chunks = []
+    offset = 0
+    while offset + 8 <= len(data):
+        size = int.from_bytes(data[offset + 4:offset + 8], "big")
+        if data[offset] == stream:
+            chunks.append(data[offset + 8:offset + 8 + size])
+        offset += 8 + size
+    return b"".join(chunks)
+
+class Engine:
+    """连接池: 空闲连接放回列表复用, 出错或超时的连接直接关闭"""
+    def __init__(self, socket_path:str, size:int, timeout:float):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._idle:List[Connection] = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    async def _connection(self) -> Tuple[Connection, bool]:
+        """取一个空闲连接, 没有则新建; 返回连接与是否复用"""
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return (reader, writer), True
+            writer.close()
+        return await asyncio.open_unix_connection(self.socket_path), False
+
+    async def _read_response(self, reader:asyncio.StreamReader) -> Tuple[int, bytes, bool]:
+        """读取一个响应, 返回 状态码, 响应体, 连接能否复用"""
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Docker daemon closed the connection.")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # 跳过trailer直到空行
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif status in (204, 304) or 100 <= status < 200:
+            body = b""
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, body, keep_alive
+
+    async def _exchange(self, connection:Connection, request:bytes) -> Tuple[int, bytes, bool]:
+        reader, writer = connection
+        writer.write(request)
+        await writer.drain()
+        return await self._read_response(reader)
+
+    async def _pooled(self, request:bytes, timeout:Optional[float]) -> Tuple[int, bytes]:
+        """在连接池的连接上发送请求, 调用方持有连接名额"""
+        connection, reused = await self._connection()
+        try:
+            try:
+                status, data, keep_alive = await asyncio.wait_for(
+                    self._exchange(connection, request), timeout or self.timeout
+                )
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                # 复用的连接可能已被守护进程关闭, 换新连接重试一次
+                connection[1].close()
+                connection = await asyncio.open_unix_connection(self.socket_path)
+                status, data, keep_alive = await asyncio.wait_for(
+                    self._exchange(connection, request), timeout or self.timeout
+                )
+        except BaseException:
+            # 超时或取消时响应可能读了一半, 连接不能再用
+            connection[1].close()
+            raise
+        if keep_alive:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+        return status, data
+
+    async def request(
+        self, method:str, path:str, params:Optional[Dict[str, Any]]=None,
+        body:Optional[Dict[str, Any]]=None, timeout:Optional[float]=None, long_poll:bool=False,
+    ) -> Tuple[int, bytes]:
+        """发送请求, 返回状态码与响应体; 4xx/5xx抛出EngineError; long_poll时在单独的新连接上发送, 用完关闭"""
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        payload = json.dumps(body).encode() if body is not None else b""
+        request = (
+            f"{method} {path} HTTP/1.1\r\nHost: docker\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+        ).encode() + payload
+
+        if long_poll:
+            connection = await asyncio.open_unix_connection(self.socket_path)
+            try:
+                status, data, _ = await asyncio.wait_for(self._exchange(connection, request), timeout or self.timeout)
+            finally:
+                connection[1].close()
+        else:
+            async with self._slots:
+                status, data = await self._pooled(request, timeout)
+
+        if status >= 400:
+            try:
+                message = json.loads(data).get("message", "")
+            except ValueError:
+                message = data.decode("utf-8", errors="ignore")
+            raise EngineError(status, message)
+        return status, data
+
+    async def create(self, config:Dict[str, Any]) -> str:
+        _, data = await self.request("POST", "/containers/create", body=config)
+        return json.loads(data)["Id"]
+
+    async def start(self, container_id:str):
+        await self.request("POST", f"/containers/{quote(container_id)}/start")
+
+    async def wait(self, container_id:str, timeout:float) -> int:
+        """等待容器退出, 返回退出码; 超时抛出asyncio.TimeoutError"""
+        _, data = await self.request("POST", f"/containers/{quote(container_id)}/wait", timeout=timeout, long_poll=True)
+        return json.loads(data).get("StatusCode", -1)
+
+    async def logs(self, container_id:str, stdout:bool=True, stderr:bool=False) -> bytes:
+        _, data = await self.request(
+            "GET", f"/containers/{quote(container_id)}/logs",
+            params={"stdout": int(stdout), "stderr": int(stderr)},
+        )
+        return demux(data, 1 if stdout else 2)
+
+    async def remove(self, container_id:str):
+        try:
+            await self.request("DELETE", f"/containers/{quote(container_id)}", params={"force": 1})
+        except EngineError as e:
+            if e.status != 404:
+                raise
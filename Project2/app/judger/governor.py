@@ -0,0 +1,120 @@
+import os
+import time
+import fcntl
+import random
+import asyncio
+from contextlib import contextmanager, asynccontextmanager, ExitStack
+from typing import Optional, List
+
+from app.judger import metrics
+from app.judger.config import (
+    WORKDIR_BASE, GOVERNOR_CONTAINER_SLOTS, GOVERNOR_COMPILE_SLOTS,
+    GOVERNOR_USER_SHARE, GOVERNOR_PROBLEM_SHARE, GOVERNOR_TIMEOUT,
+)
+
+"""
+全局并发控制: 每个名额对应一个锁文件, 持有flock即占用名额, 进程退出时由内核自动释放
+除全局名额外, 同一用户和同一题目只能占用部分名额, 避免单个用户的大量重判挤占所有评测资源
+"""
+LOCK_DIR = os.path.join(WORKDIR_BASE, "_governor")
+os.makedirs(LOCK_DIR, exist_ok=True)
+
+SLOTS = {
+    "container": GOVERNOR_CONTAINER_SLOTS,
+    "compile": GOVERNOR_COMPILE_SLOTS,
+}
+
+class GovernorTimeout(RuntimeError):
+    """等待名额超时"""
+
+def _try_one(prefix:str, count:int):
+    """尝试占用prefix下count个名额中的任意一个, 返回持有锁的文件或None"""
+    for i in random.sample(range(count), count):
+        f = open(os.path.join(LOCK_DIR, f"{prefix}-{i}.lock"), "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return f
+        except BlockingIOError:
+            f.close()
+    return None
+
+def _try_acquire(kind:str, user_id:Optional[int], problem_id:Optional[int]) -> Optional[List]:
+    """按 用户 -> 题目 -> 全局 的顺序尝试占用, 任一失败则全部释放"""
+    total = SLOTS[kind]
+    groups = []
+    if user_id is not None:
+        groups.append((f"{kind}-user-{user_id}", max(1, int(total * GOVERNOR_USER_SHARE))))
+    if problem_id is not None:
+        groups.append((f"{kind}-problem-{problem_id}", max(1, int(total * GOVERNOR_PROBLEM_SHARE))))
+    groups.append((kind, total))
+
+    held = []
+    for prefix, count in groups:
+        f = _try_one(prefix, count)
+        if f is None:
+            _release(held)
+            return None
+        held.append(f)
+    return held
+
+def _release(held:List):
+    for f in held:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+@contextmanager
+def slot(kind:str, user_id:Optional[int]=None, problem_id:Optional[int]=None):
+    """占用一个评测容器(container)或编译(compile)名额, 退出时释放; 等待时间计入指标"""
+    start = time.time()
+    held = _try_acquire(kind, user_id, problem_id)
+    backoff = 0.01
+    while held is None:
+        if time.time() - start > GOVERNOR_TIMEOUT:
+            raise GovernorTimeout(f"No {kind} slot available in {GOVERNOR_TIMEOUT}s")
+        time.sleep(backoff * (1 + random.random()))
+        backoff = min(backoff * 2, 0.2)
+        held = _try_acquire(kind, user_id, problem_id)
+
+    metrics.count("governor_acquired_total", kind=kind)
+    metrics.count("governor_wait_seconds_total", time.time() - start, kind=kind)
+    try:
+        yield
+    finally:
+        _release(held)
+
+@asynccontextmanager
+async def aslot(kind:str, user_id:Optional[int]=None, problem_id:Optional[int]=None):
+    """slot的协程版本, 等待名额时让出事件循环"""
+    start = time.time()
+    held = _try_acquire(kind, user_id, problem_id)
+    backoff = 0.01
+    while held is None:
+        if time.time() - start > GOVERNOR_TIMEOUT:
+            raise GovernorTimeout(f"No {kind} slot available in {GOVERNOR_TIMEOUT}s")
+        await asyncio.sleep(backoff * (1 + random.random()))
+        backoff = min(backoff * 2, 0.2)
+        held = _try_acquire(kind, user_id, problem_id)
+
+    metrics.count("governor_acquired_total", kind=kind)
+    metrics.count("governor_wait_seconds_total", time.time() - start, kind=kind)
+    try:
+        yield
+    finally:
+        _release(held)
+
+def usage() -> dict:
+    """各类全局名额的占用情况"""
+    result = {}
+    for kind, total in SLOTS.items():
+        with ExitStack() as stack:
+            free = 0
+            for i in range(total):
+                f = stack.enter_context(open(os.path.join(LOCK_DIR, f"{kind}-{i}.lock"), "w"))
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                    free += 1
+                except BlockingIOError:
+                    pass
+        result[kind] = {"total": total, "busy": total - free}
+    return result
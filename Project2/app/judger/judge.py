@@ -1,38 +1,45 @@
 import docker
 import os
+import time
+import shlex
 import shutil
-import multiprocessing
+import asyncio
+import tempfile
 from concurrent.futures import ProcessPoolExecutor, as_completed
-from typing import Dict, Any, Optional
-from requests.exceptions import ReadTimeout
+from typing import Dict, Any, Optional, List, Iterator, Tuple
 
+from app.db import db_judge_job, db_problem as db_problem_crud, db_submission as db_submission_crud
 from app.db.database import SessionLocal
 from app.db.models import (
-    SubmissionModel, StatusCategory, SubmissionStatusCategory, TestCaseResultModel, LanguageModel, ProblemModel, UserModel
+    SubmissionModel, StatusCategory, SubmissionStatusCategory, TestCaseResultModel, LanguageModel, ProblemModel
 )
-
-"""参数设置"""
-client = docker.from_env(timeout=10)
-
-DOCKER_IMAGE = {
-    "cpp": "gcc-judge:latest",
-    "python": "python-judge:latest"
-}
-
-WORKDIR_BASE = os.path.expanduser("~/tmp/pa2-oj-2024010860")
-os.makedirs(WORKDIR_BASE, exist_ok=True)
+from app.judger.config import (
+    WORKDIR_BASE, BATCH_ENABLED, CASE_WORKERS, FAIL_FAST_REORDER, RESULT_BATCH_SIZE, RESULT_FLUSH_INTERVAL,
+    PYTHON_ZYGOTE_ENABLED, PYTHON_ZYGOTE_PRELOAD, WALL_LIMIT_FACTOR,
+    ASYNC_ORCHESTRATOR_ENABLED, DOCKER_SOCKET, ENGINE_CONNECTIONS, ENGINE_REQUEST_TIMEOUT, SPJ_TIMEOUT,
+    SYNTAX_CHECK_ENABLED, SYNTAX_CHECK_LANGUAGES,
+)
+from app.judger.sandbox import get_sandbox, CompileError, Checker, OUTPUT_OPTIONS
+from app.judger import metrics, syntax
+from app.judger.governor import slot, aslot
+from app.judger.engine import Engine
+from app.judger.testdata import materialize, case_files
+from app.judger.compare import compare, describe
+from app.judger.cache import compile_cache, compile_key, COMPILE_OUTPUT, COMPILE_ERROR, spj_cache, spj_key
 
 STATUS_PRECEDENCE = {
     StatusCategory.AC: 0,
-    StatusCategory.WA: 1,
-    StatusCategory.RE: 2,
-    StatusCategory.TLE: 3,
-    StatusCategory.MLE: 4,
-    StatusCategory.CE: 5,
-    StatusCategory.JUDGING: 6,
-    StatusCategory.COMPILING: 7,
-    StatusCategory.PENDING: 8,
-    StatusCategory.UNK: 9,
+    StatusCategory.SKIPPED: 1,
+    StatusCategory.WA: 2,
+    StatusCategory.RE: 3,
+    StatusCategory.TLE: 4,
+    StatusCategory.MLE: 5,
+    StatusCategory.OLE: 6,
+    StatusCategory.CE: 7,
+    StatusCategory.JUDGING: 8,
+    StatusCategory.COMPILING: 9,
+    StatusCategory.PENDING: 10,
+    StatusCategory.UNK: 11,
 }
 
 STATUS_DICT = {
@@ -41,186 +48,164 @@ STATUS_DICT = {
     "RE": StatusCategory.RE,
     "TLE": StatusCategory.TLE,
     "MLE": StatusCategory.MLE,
+    "OLE": StatusCategory.OLE,
     "CE": StatusCategory.CE,
     "JUDGING": StatusCategory.JUDGING,
     "COMPILING": StatusCategory.COMPILING,
     "PENDING": StatusCategory.PENDING,
     "UNK": StatusCategory.UNK,
+    "SKIPPED": StatusCategory.SKIPPED,
 }
 
-def _prepare_spj(work_dir:str,problem:ProblemModel, memory_limit:int) -> Optional[str]:
-    """准备数据, 编译spj脚本"""
+SKIPPED_MSG = "Skipped after an earlier case failed."
+
+# 评测目录下存放spj的子目录, 只放入checker的box
+SPJ_DIR = "_spj"
+
+def _skipped(test_case_result_id:int, case_id:int) -> Dict[str, Any]:
+    """stop_on_first_failure下未运行的测例"""
+    return {
+        "test_case_result_id": test_case_result_id, "result": "SKIPPED",
+        "time": 0, "memory": 0, "output": "",
+        "err_msg": SKIPPED_MSG, "case_id": case_id, "score": 0
+    }
+
+def _points(result:Dict[str, Any]) -> int:
+    """测例得分: spj给出的分数, 否则AC得10分"""
+    if result.get("score") is not None:
+        return result["score"]
+    return 10 if result["result"] == "AC" else 0
+
+class _ResultWriter:
+    """测例结果分批写入数据库, 攒够RESULT_BATCH_SIZE条或距上次写入超过RESULT_FLUSH_INTERVAL秒时写一次"""
+    def __init__(self, db, submission_id:int, language_name:str):
+        self.db = db
+        self.submission_id = submission_id
+        self.language_name = language_name
+        self.results = []
+        self.pending = []
+        self.last_flush = time.monotonic()
+
+    def add(self, result:Dict[str, Any]):
+        self.results.append(result)
+        self.pending.append(result)
+        metrics.count("judge_cases_total", language=self.language_name, verdict=result["result"])
+        if len(self.pending) >= RESULT_BATCH_SIZE or time.monotonic() - self.last_flush >= RESULT_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        rows = [{k: v for k, v in result.items() if k != "score"} for result in self.pending]
+        points = sum(_points(result) for result in self.pending)
+        with metrics.timed("judge_phase_seconds", phase="db_write", language=self.language_name):
+            db_submission_crud.add_case_results(db=self.db, submission_id=self.submission_id, results=rows, points=points)
+        self.pending = []
+        self.last_flush = time.monotonic()
+
+def _case_order(db, problem:ProblemModel) -> List[int]:
+    """测例运行顺序(下标): stop_on_first_failure时按历史失败率从高到低, 其余保持原顺序"""
+    order = list(range(len(problem.testcases)))
+    if problem.judge_policy == "stop_on_first_failure" and FAIL_FAST_REORDER:
+        rates = db_problem_crud.get_case_failure_rates(db=db, _problem_id=problem.id)
+        order.sort(key=lambda i: -rates.get(problem.testcases[i].id, 0.0))
+    return order
+
+def _prepare_spj(work_dir:str,problem:ProblemModel, memory_limit:int, user_id:Optional[int]=None) -> Optional[str]:
+    """准备spj: 编译产物按题目缓存, 链接到评测目录的SPJ_DIR子目录(不会放入选手程序的box), 返回相对该目录的spj run cmd"""
     spj_lang = problem.spj_language
     spj_lang_name = spj_lang.name
     spj_src_filename = f"spj{spj_lang.file_ext or ''}"
-    
-    # 写入spj脚本
-    spj_code_path = os.path.join(work_dir, spj_src_filename)
-    with open(spj_code_path, "wb") as f:
-        f.write(problem.spj_code)
 
-    # 编译spj脚本, 返回spj的run cmd
+    key = spj_key(problem.id, problem.spj_code, spj_lang_name)
+    entry = spj_cache.get(key)
+    if entry is None:
+        entry = _build_spj(problem, spj_src_filename, memory_limit, user_id, key)
+    spj_dir = os.path.join(work_dir, SPJ_DIR)
+    os.makedirs(spj_dir, exist_ok=True)
+    for filename in os.listdir(entry):
+        os.link(os.path.join(entry, filename), os.path.join(spj_dir, filename))
+
     if spj_lang.compile_cmd:
-        spj_compile_cmd = spj_lang.compile_cmd.replace("main.cpp", spj_src_filename).replace("main", "spj")
-        try:
-            client.containers.run(
-                image=DOCKER_IMAGE[spj_lang_name],
-                command=spj_compile_cmd,
-                volumes={work_dir: {'bind': '/app', 'mode': 'rw'}},
-                working_dir='/app',
-                network_disabled=True,
-                user='root',
-                mem_limit=f"{memory_limit * 2}m",
-                auto_remove=True,
-            )
-            if not os.path.exists(os.path.join(work_dir, "spj")):
-                raise RuntimeError("SPJ compilation did not produce an executable.")
-            return "./spj"
-        except docker.errors.ContainerError as e:
-            err_msg = e.stderr.decode('utf-8', errors='ignore') if e.stderr else str(e)
-            raise RuntimeError(f"SPJ Compilation Error: {err_msg}")
+        return "./spj"
     else:
-        spj_run_cmd = spj_lang.run_cmd.replace("main.py", spj_src_filename)
-        return spj_run_cmd
+        return spj_lang.run_cmd.replace("main.py", spj_src_filename)
 
-def _run_spj(
-    work_dir:str, spj_run_cmd:str, spj_language_name:str,
-    input_file:str, user_output_file:str, answer_file:str
+def _build_spj(
+    problem:ProblemModel, spj_src_filename:str, memory_limit:int,
+    user_id:Optional[int], key:str,
 ) -> str:
-    """运行spj任务"""
-    container = None
+    """写入spj脚本, 需要时在单独的临时目录中编译, 结果存入spj缓存"""
+    spj_lang = problem.spj_language
+    spj_code = problem.spj_code.encode("utf-8") if isinstance(problem.spj_code, str) else problem.spj_code
+    if not spj_lang.compile_cmd:
+        return spj_cache.put(key, {spj_src_filename: spj_code})
+
+    work_dir = tempfile.mkdtemp(dir=WORKDIR_BASE, prefix="_spj-")
     try:
-        # 创建docker评测
-        spj_command = f"{spj_run_cmd} {input_file} {user_output_file} {answer_file}"
-        container = client.containers.run(
-            image=DOCKER_IMAGE[spj_language_name],
-            command=spj_command,
-            volumes={work_dir: {'bind': '/app', 'mode': 'rw'}},
-            working_dir='/app',
-            network_disabled=True,
-            user='nobody',
-            detach=True
-        )
-        
-        # 结果解析
-        result_info = container.wait(timeout=2)
-        status_code = result_info.get('StatusCode', -1)
+        # 写入spj脚本
+        spj_code_path = os.path.join(work_dir, spj_src_filename)
+        with open(spj_code_path, "wb") as f:
+            f.write(spj_code)
 
-        if status_code == 0 or status_code == 1:
-            return 10
-        else:
-            return None
-    except Exception as e:
-        return None
+        # 编译spj脚本
+        spj_compile_cmd = spj_lang.compile_cmd.replace("main.cpp", spj_src_filename).replace("main", "spj")
+        try:
+            with slot("compile", user_id=user_id, problem_id=problem.id):
+                get_sandbox(spj_lang.name).compile(work_dir, spj_lang.name, spj_compile_cmd, memory_limit)
+        except CompileError as e:
+            raise RuntimeError(f"SPJ Compilation Error: {e}")
+
+        spj_path = os.path.join(work_dir, "spj")
+        if not os.path.exists(spj_path):
+            raise RuntimeError("SPJ compilation did not produce an executable.")
+        with open(spj_path, "rb") as f:
+            return spj_cache.put(key, {"spj": f.read()}, executable=True)
     finally:
-        if container:
-            try:
-                container.remove(force=True)
-            except:
-                pass
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def _open_checker(work_dir:str, spj_run_cmd:Optional[str], spj_language_name:Optional[str], spj_protocol:str) -> Optional[Checker]:
+    """stream协议的spj: 常驻checker, 首次评测时才启动; 其余情况返回None"""
+    if spj_protocol != "stream" or not spj_run_cmd or not spj_language_name:
+        return None
+    return get_sandbox(spj_language_name).open_checker(
+        os.path.join(work_dir, SPJ_DIR), spj_run_cmd, spj_language_name, SPJ_TIMEOUT
+    )
+
+def _run_spj(
+    work_dir:str, spj_run_cmd:str, spj_language_name:str,
+    input_file:str, user_output_file:str, answer_file:str, checker:Optional[Checker]=None,
+) -> Tuple[Optional[int], str]:
+    """运行spj任务, 三个文件均为本机路径, 由沙箱放入spj可见的目录; 返回得分与spj给出的说明
+    有常驻checker时经管道评测, 否则每个测例运行一次spj, 以退出码判定"""
+    if checker is not None:
+        return checker.check(input_file, user_output_file, answer_file)
+    status_code = get_sandbox(spj_language_name).run_checker(
+        os.path.join(work_dir, SPJ_DIR), spj_run_cmd, [input_file, user_output_file, answer_file],
+        spj_language_name, timeout=SPJ_TIMEOUT,
+    )
+    return (10 if status_code in (0, 1) else None), ""
 
 def _run_single(
     test_case_result_id:int, case_id:int, 
     work_dir:str, 
     run_cmd:str, language_name:str,
-    test_case_input:str, test_case_output:str, time_limit:float, memory_limit:int,
+    input_file:str, answer_file:str, time_limit:float, memory_limit:int,
     judge_mode:str, spj_run_cmd:str, spj_language_name:str,
+    user_id:Optional[int]=None, problem_id:Optional[int]=None, spj_protocol:str="exec",
 ) -> Dict[str, Any]:
-    """运行测例"""
-
-    # 写入测例输入
-    input_filename = f"{test_case_result_id}.in"
-    input_path = os.path.join(work_dir, input_filename)
-    with open(input_path, "w") as f:
-        f.write(test_case_input)
-
-    run_command = f"sh -c \"/usr/bin/time -f 'TIME:%U %S' {run_cmd} < {input_filename}\""
-    
-    container = None
+    """运行测例, input_file, answer_file为本机路径; 进程池中无法共用常驻checker, 每个测例单独启动"""
+    checker = _open_checker(work_dir, spj_run_cmd, spj_language_name, spj_protocol)
     try:
-        # 创建docker, 进行评测
-        container = client.containers.run(
-            image=DOCKER_IMAGE.get(language_name),
-            command=run_command,
-            volumes={work_dir: {'bind': '/app', 'mode': 'ro'}},
-            working_dir='/app',
-            mem_limit=f"{memory_limit}m",
-            memswap_limit=f"{memory_limit}m",
-            network_disabled=True,
-            user='nobody',
-            detach=True
+        sandbox = get_sandbox(language_name)
+        with slot("container", user_id=user_id, problem_id=problem_id):
+            with metrics.timed("judge_phase_seconds", phase="run", language=language_name):
+                record = sandbox.run_case(
+                    work_dir, run_cmd, language_name, input_file, time_limit, memory_limit
+                )
+        return _record_result(
+            test_case_result_id, case_id, work_dir, record,
+            input_file, answer_file, time_limit, memory_limit,
+            judge_mode, spj_run_cmd, spj_language_name, language_name, checker,
         )
-
-        # 结果解析
-        result_info = container.wait(timeout=time_limit*1.2)
-        status_code = result_info.get('StatusCode', -1)
-
-        stdout = container.logs(stdout=True, stderr=False).decode('utf-8', errors='ignore')
-        stderr = container.logs(stdout=False, stderr=True).decode('utf-8', errors='ignore')
-        memory_used = container.stats(stream=False).get("memory_stats", {}).get("max_usage", 0) / (1024*1024)
-
-        # 时间占用解析
-        time_parts = []
-        user_stderr = []
-        for line in stderr.splitlines():
-            if line.startswith("TIME:"):
-                time_parts.extend(line.split(":")[-1].strip().split())
-            else:
-                user_stderr.append(line)
-
-        time_used = sum(float(t) for t in time_parts)
-        err_msg = "\n".join(user_stderr) if time_parts else stderr
-
-        # 结果处理
-        result_status = "AC"
-        score = None
-        if time_used > time_limit:
-            result_status = "TLE"
-        elif memory_used > memory_limit or status_code == 137:
-            result_status = "MLE"
-        elif status_code != 0:
-            result_status = "RE"
-        else:
-            if judge_mode == "standard":
-                if stdout.rstrip() != test_case_output.rstrip():
-                    result_status = "WA"
-            elif judge_mode == "strict":
-                if stdout != test_case_output:
-                    result_status = "WA"
-            elif judge_mode == "spj":
-                # 执行spj评测
-                if spj_run_cmd and spj_language_name:
-                    user_out_file = f"{test_case_result_id}.user.out"
-                    ans_file = f"{test_case_result_id}.ans"
-                    with open(os.path.join(work_dir, user_out_file), "w") as f: f.write(stdout)
-                    with open(os.path.join(work_dir, ans_file), "w") as f: f.write(test_case_output)
-                    
-                    # 结果解析
-                    score = _run_spj(work_dir, spj_run_cmd, spj_language_name, input_filename, user_out_file, ans_file)
-                    try:
-                        if score == 10:
-                            result_status = "AC"
-                        elif 0 <= score <10:
-                            result_status = "WA"
-                        else:
-                            result_status = "UNK"
-                    except:
-                        result_status = "UNK"
-                else:
-                    if stdout.rstrip() != test_case_output.rstrip():
-                        result_status = "WA"
-
-        return {
-            "test_case_result_id": test_case_result_id, "result": result_status,
-            "time": time_used, "memory": memory_used, "output": stdout,
-            "err_msg": err_msg, "case_id": case_id, "score": score,
-        }
-    except ReadTimeout:
-        return {
-            "test_case_result_id": test_case_result_id, "result": "TLE",
-            "time": time_limit, "memory": 0, "output": "", 
-            "err_msg": "Container wait timed out.", "case_id": case_id, "score": 0
-        }
     except Exception as e:
         return {
             "test_case_result_id": test_case_result_id, "result": "UNK",
@@ -228,19 +213,295 @@ def _run_single(
             "err_msg": f"Runner Error: {str(e)}", "case_id": case_id, "score": 0
         }
     finally:
-        if container:
+        if checker is not None:
+            checker.close()
+        # 在进程池的子进程中运行, 结束前写入指标
+        metrics.flush()
+
+def _record_result(
+    test_case_result_id:int, case_id:int, work_dir:str, record:Dict[str, Any],
+    input_file:str, answer_file:str, time_limit:float, memory_limit:int,
+    judge_mode:str, spj_run_cmd:str, spj_language_name:str, language_name:str="",
+    checker:Optional[Checker]=None,
+) -> Dict[str, Any]:
+    """将沙箱返回的运行记录转为测例结果, 之后删除记录中的完整输出文件"""
+    try:
+        return _record_verdict(
+            test_case_result_id, case_id, work_dir, record,
+            input_file, answer_file, time_limit, memory_limit,
+            judge_mode, spj_run_cmd, spj_language_name, language_name, checker,
+        )
+    finally:
+        if record.get("output_file"):
+            os.remove(record["output_file"])
+
+def _record_verdict(
+    test_case_result_id:int, case_id:int, work_dir:str, record:Dict[str, Any],
+    input_file:str, answer_file:str, time_limit:float, memory_limit:int,
+    judge_mode:str, spj_run_cmd:str, spj_language_name:str, language_name:str,
+    checker:Optional[Checker],
+) -> Dict[str, Any]:
+    if "error" in record:
+        return {
+            "test_case_result_id": test_case_result_id, "result": "UNK",
+            "time": 0, "memory": 0, "output": "",
+            "err_msg": f"Runner Error: {record['error']}", "case_id": case_id, "score": 0
+        }
+    if record["timed_out"]:
+        # 看门狗杀死时记录实际消耗的CPU时间; 墙钟超时(如sleep)的CPU时间可能小于限制
+        limit = record.get("limit") or "wall"
+        metrics.count("judge_watchdog_kills_total", language=language_name, limit=limit)
+        return {
+            "test_case_result_id": test_case_result_id, "result": "TLE",
+            "time": record["time"], "memory": record["memory"], "output": "",
+            "err_msg": "CPU time limit exceeded." if limit == "cpu" else "Wall clock limit exceeded.",
+            "case_id": case_id, "score": 0
+        }
+    if record.get("output_exceeded"):
+        return {
+            "test_case_result_id": test_case_result_id, "result": "OLE",
+            "time": record["time"], "memory": record["memory"], "output": record["stdout"],
+            "output_hash": record["output_hash"], "output_size": record["output_size"],
+            "err_msg": f"Output limit exceeded ({record['output_size']} bytes).", "case_id": case_id, "score": 0
+        }
+    start = time.perf_counter()
+    result = _judge_case(
+        test_case_result_id, case_id, work_dir,
+        record["status_code"], record["stdout"], record.get("output_file"), record["stderr"], record["time"], record["memory"],
+        input_file, answer_file, time_limit, memory_limit,
+        judge_mode, spj_run_cmd, spj_language_name, checker,
+    )
+    metrics.observe(
+        "judge_phase_seconds", time.perf_counter() - start,
+        phase="check", language=language_name, verdict=result["result"],
+    )
+    # 只保存输出预览, 完整输出以哈希与大小标识
+    result.update(
+        output=result["output"][:OUTPUT_OPTIONS["output_preview"]],
+        output_hash=record.get("output_hash"), output_size=record.get("output_size", 0),
+    )
+    return result
+
+def _judge_case(
+    test_case_result_id:int, case_id:int, work_dir:str,
+    status_code:int, stdout:str, output_file:str, err_msg:str, time_used:float, memory_used:float,
+    input_file:str, answer_file:str, time_limit:float, memory_limit:int,
+    judge_mode:str, spj_run_cmd:str, spj_language_name:str, checker:Optional[Checker]=None,
+) -> Dict[str, Any]:
+    """根据运行结果判定测例状态; stdout为输出预览, output_file为完整输出, 与答案文件一起流式比对, 不整体读入"""
+    # 结果处理
+    result_status = "AC"
+    score = None
+    if time_used > time_limit:
+        result_status = "TLE"
+    elif memory_used > memory_limit or status_code == 137:
+        result_status = "MLE"
+    elif status_code != 0:
+        result_status = "RE"
+    else:
+        if judge_mode == "spj" and spj_run_cmd and spj_language_name:
+            # 执行spj评测, 用户输出即完整输出文件
+            score, spj_message = _run_spj(
+                work_dir, spj_run_cmd, spj_language_name,
+                input_file, output_file, answer_file, checker,
+            )
+            if spj_message:
+                err_msg = f"{spj_message}\n{err_msg}" if err_msg else spj_message
             try:
-                container.remove(force=True)
-            except docker.errors.NotFound:
-                pass
+                if score == 10:
+                    result_status = "AC"
+                elif 0 <= score <10:
+                    result_status = "WA"
+                else:
+                    result_status = "UNK"
+            except:
+                result_status = "UNK"
+        else:
+            # 流式比对, spj缺失时按standard处理
+            with open(output_file, "rb") as user, open(answer_file, "rb") as answer:
+                diff = compare(user, answer, "standard" if judge_mode == "spj" else judge_mode)
+            if diff is not None:
+                result_status = "WA"
+                err_msg = f"{describe(diff)}\n{err_msg}" if err_msg else describe(diff)
+
+    return {
+        "test_case_result_id": test_case_result_id, "result": result_status,
+        "time": time_used, "memory": memory_used, "output": stdout,
+        "err_msg": err_msg, "case_id": case_id, "score": score,
+    }
+
+def _zygote(run_cmd:str) -> Optional[Dict[str, Any]]:
+    """python xxx.py 形式的运行命令可由runner预加载模块后fork运行"""
+    if not PYTHON_ZYGOTE_ENABLED:
+        return None
+    argv = shlex.split(run_cmd)
+    if len(argv) == 2 and os.path.basename(argv[0]).startswith("python") and argv[1].endswith(".py"):
+        return {"script": argv[1], "preload": PYTHON_ZYGOTE_PRELOAD}
+    return None
+
+def _stream_runner(
+    work_dir:str, language_name:str, manifest:Dict[str, Any], memory_limit:int,
+    user_id:Optional[int]=None, problem_id:Optional[int]=None,
+) -> Iterator[Dict[str, Any]]:
+    """启动runner, 流式返回每个测例的结果记录; 整个批次占用一个全局容器名额
+    记录每个测例的运行时间, 以及相邻两条记录的间隔中不属于运行的部分: 第一条为沙箱启动, 其余为单测例开销"""
+    with slot("container", user_id=user_id, problem_id=problem_id):
+        start = last = time.perf_counter()
+        for record in get_sandbox(language_name).run_batch(work_dir, language_name, manifest, memory_limit):
+            now = time.perf_counter()
+            wall = record.get("wall", 0.0)
+            metrics.observe("judge_phase_seconds", wall, phase="run", language=language_name)
+            metrics.observe(
+                "judge_phase_seconds", max(0.0, now - last - wall),
+                phase="sandbox_start" if last == start else "case_overhead", language=language_name,
+            )
+            last = now
+            yield record
+
+def _run_batch(
+    work_dir:str, run_cmd:str, language_name:str, data_dir:str, answer_dir:str, case_ids:List[int],
+    time_limit:float, memory_limit:int,
+    judge_mode:str, spj_run_cmd:str, spj_language_name:str,
+    user_id:Optional[int]=None, problem_id:Optional[int]=None,
+    order:Optional[List[int]]=None, stop_on_failure:bool=False, checker:Optional[Checker]=None,
+) -> Iterator[Dict[str, Any]]:
+    """单容器批量评测: 写入manifest, 由runner按order逐个运行测试数据目录中的输入, 边接收边判定, 逐个产生结果"""
+    manifest = {
+        "cmd": run_cmd, "time_limit": time_limit, "memory_limit": memory_limit,
+        "wall_limit": time_limit * WALL_LIMIT_FACTOR, "stop_on_failure": stop_on_failure, "cases": [],
+        **OUTPUT_OPTIONS,
+    }
+    zygote = _zygote(run_cmd)
+    if zygote is not None:
+        manifest["zygote"] = zygote
+    outputs = {}
+    for i in (order if order is not None else range(len(case_ids))):
+        input_filename, answer_filename = case_files(i + 1)
+        input_file = os.path.join(data_dir, input_filename)
+        manifest["cases"].append({"id": i + 1, "input": input_file})
+        outputs[i + 1] = (case_ids[i], input_file, os.path.join(answer_dir, answer_filename))
+
+    results = {}
+    try:
+        records = _stream_runner(work_dir, language_name, manifest, memory_limit, user_id, problem_id)
+        for record in records:
+            test_case_result_id = record["id"]
+            case_id, input_file, answer_file = outputs[test_case_result_id]
+            results[test_case_result_id] = _record_result(
+                test_case_result_id, case_id, work_dir, record,
+                input_file, answer_file, time_limit, memory_limit,
+                judge_mode, spj_run_cmd, spj_language_name, language_name, checker,
+            )
+            yield results[test_case_result_id]
+            if stop_on_failure and results[test_case_result_id]["result"] != "AC":
+                records.close()
+                break
+        err_msg = "Runner exited before reporting this case."
+    except Exception as e:
+        err_msg = f"Runner Error: {str(e)}"
+
+    # 提前终止时未运行的测例记为SKIPPED, runner异常退出时记为UNK
+    stopped = stop_on_failure and any(r["result"] != "AC" for r in results.values())
+    for test_case_result_id, (case_id, _, _) in outputs.items():
+        if test_case_result_id in results:
+            continue
+        if stopped:
+            yield _skipped(test_case_result_id, case_id)
+        else:
+            yield {
+                "test_case_result_id": test_case_result_id, "result": "UNK",
+                "time": 0, "memory": 0, "output": "",
+                "err_msg": err_msg, "case_id": case_id, "score": 0
+            }
+
+async def _run_async(
+    writer:_ResultWriter, work_dir:str, run_cmd:str, language_name:str,
+    data_dir:str, answer_dir:str, case_ids:List[int], time_limit:float, memory_limit:int,
+    judge_mode:str, spj_run_cmd:Optional[str], spj_language_name:Optional[str],
+    user_id:Optional[int], problem_id:Optional[int], order:List[int], stop_on_failure:bool,
+    checker:Optional[Checker]=None,
+):
+    """异步编排: 每个测例是一个协程, 实际同时运行的容器数由全局容器名额限制, docker请求经连接池发送; 判定在线程中进行"""
+    sandbox = get_sandbox(language_name)
+
+    async def run(i:int) -> Dict[str, Any]:
+        input_file = os.path.join(data_dir, case_files(i + 1)[0])
+        answer_file = os.path.join(answer_dir, case_files(i + 1)[1])
+        try:
+            async with aslot("container", user_id=user_id, problem_id=problem_id):
+                with metrics.timed("judge_phase_seconds", phase="run", language=language_name):
+                    record = await sandbox.run_case_async(
+                        engine, work_dir, run_cmd, language_name, input_file, time_limit, memory_limit
+                    )
+            return await asyncio.to_thread(
+                _record_result, i + 1, case_ids[i], work_dir, record,
+                input_file, answer_file, time_limit, memory_limit,
+                judge_mode, spj_run_cmd, spj_language_name, language_name, checker,
+            )
+        except Exception as e:
+            return {
+                "test_case_result_id": i + 1, "result": "UNK",
+                "time": 0, "memory": 0, "output": "",
+                "err_msg": f"Runner Error: {str(e)}", "case_id": case_ids[i], "score": 0
+            }
+
+    async with Engine(DOCKER_SOCKET, ENGINE_CONNECTIONS, ENGINE_REQUEST_TIMEOUT) as engine:
+        tasks = {asyncio.ensure_future(run(i)): (i + 1, case_ids[i]) for i in order}
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                writer.add(result)
+                if stop_on_failure and result["result"] != "AC" and pending:
+                    # 取消其余测例, 已创建的容器在协程退出时删除
+                    for other in pending:
+                        other.cancel()
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    for other in pending:
+                        writer.add(_skipped(*tasks[other]) if other.cancelled() else other.result())
+                    pending = set()
+
+def _compile(work_dir:str, db_submission:SubmissionModel, db_language:LanguageModel, memory_limit:int) -> Optional[str]:
+    """编译用户代码, 成功返回None, 失败返回错误信息; 相同源码与编译环境直接复用缓存的产物"""
+    sandbox = get_sandbox(db_language.name)
+    key = compile_key(db_submission.code, db_language.compile_cmd, sandbox.environment(db_language.name, db_language.compile_cmd))
+    entry = compile_cache.get(key)
+    if entry is not None:
+        error_path = os.path.join(entry, COMPILE_ERROR)
+        if os.path.exists(error_path):
+            with open(error_path, encoding="utf-8") as f:
+                return f.read()
+        shutil.copy2(os.path.join(entry, COMPILE_OUTPUT), os.path.join(work_dir, "main"))
+        return None
+
+    try:
+        # 在沙箱中编译
+        with slot("compile", user_id=db_submission.user_id, problem_id=db_submission._problem_id):
+            sandbox.compile(work_dir, db_language.name, db_language.compile_cmd, memory_limit)
+
+        # 编译失败
+        if not os.path.exists(os.path.join(work_dir, "main")):
+            return "Compiler did not produce an executable."
+        with open(os.path.join(work_dir, "main"), "rb") as f:
+            compile_cache.put(key, {COMPILE_OUTPUT: f.read()}, executable=True)
+        return None
+    except CompileError as e:
+        # 编译器报错是确定性的, 同样缓存
+        print(e)
+        error_message = str(e)
+        compile_cache.put(key, {COMPILE_ERROR: error_message.encode("utf-8")})
+        return error_message
 
 def _collect(submission_id:int):
     """获取信息, 编译程序"""
 
     # 创建评测目录, 获取数据库Session
+    start = time.perf_counter()
     work_dir = os.path.join(WORKDIR_BASE, str(submission_id))
     os.makedirs(work_dir, exist_ok=True)
     db = SessionLocal()
+    checker = None
 
     try:
         """信息获取"""
@@ -253,80 +514,135 @@ def _collect(submission_id:int):
 
         time_limit = db_problem.time_limit or db_language.time_limit
         memory_limit = db_problem.memory_limit or db_language.memory_limit
+        # 按开始评测时的条件计算缓存键, 评测完成后写入, 之后相同的提交可直接复用结果
+        key = db_submission_crud.verdict_key(db_submission.code, db_language, db_problem)
 
-        db_submission.counts = 10*len(db_problem.testcases)
-        db_submission.status = SubmissionStatusCategory.PENDING
+        db_submission_crud.start_progress(db=db, submission_id=submission_id, cases_total=len(db_problem.testcases))
+        db_submission_crud.set_status(db, db_submission, SubmissionStatusCategory.PENDING)
         db.commit()
 
         """编译"""
+        # 重测等未经提交时检查的Python代码, 语法错误同样判为CE
+        if SYNTAX_CHECK_ENABLED and db_language.name in SYNTAX_CHECK_LANGUAGES:
+            _, syntax_error = syntax.check_python(db_submission.code)
+            if syntax_error is not None:
+                _error(submission_id, StatusCategory.CE, work_dir, err_msg=syntax_error, verdict_key=key)
+                return
+
         code_path = os.path.join(work_dir, "main" + (db_language.file_ext or ""))
         with open(code_path, "w") as f:
             f.write(db_submission.code)
 
         if db_language.compile_cmd:
-            try:
-                # 创建docker, 进行编译
-                client.containers.run(
-                    image=DOCKER_IMAGE.get(db_language.name),
-                    command=db_language.compile_cmd,
-                    volumes={work_dir: {'bind': '/app', 'mode': 'rw'}},
-                    working_dir='/app',
-                    network_disabled=True,
-                    user='root',
-                    mem_limit=f"{memory_limit * 2}m",
-                    auto_remove=True,
-                )
-
-                # 编译失败
-                if not os.path.exists(os.path.join(work_dir, "main")):
-                    _error(submission_id, StatusCategory.CE, work_dir, "Compiler did not produce an executable.")
-                    return
-            except docker.errors.ContainerError as e:
-                print(e)
-                error_message = e.stderr.decode('utf-8', errors='ignore') if e.stderr else str(e)
-                _error(submission_id, StatusCategory.CE, work_dir, err_msg=error_message)
+            with metrics.timed("judge_phase_seconds", phase="compile", language=db_language.name):
+                error_message = _compile(work_dir, db_submission, db_language, memory_limit)
+            if error_message is not None:
+                _error(submission_id, StatusCategory.CE, work_dir, err_msg=error_message, verdict_key=key)
                 return
 
         """编译spj脚本, 准备spj信息"""
         if db_problem.judge_mode == 'spj':
             try:
-                spj_run_cmd = _prepare_spj(work_dir, db_problem, memory_limit)
+                spj_run_cmd = _prepare_spj(work_dir, db_problem, memory_limit, user_id=db_submission.user_id)
             except (ValueError, RuntimeError, docker.errors.DockerException) as e:
                 _error(submission_id, StatusCategory.UNK, work_dir, f"System Error: SPJ setup failed. {e}")
                 return
         else:
             spj_run_cmd = None
 
+        # 批量与异步评测在本进程内判定, stream协议的spj整个提交共用一个常驻进程
+        checker = _open_checker(work_dir, spj_run_cmd, db_problem.spj_language_name, db_problem.spj_protocol)
+
         db_submission.status = SubmissionStatusCategory.PENDING
         db.commit()
-        
-        test_case_results = []
 
-        """创建进程池, 进行评测"""
-        with ProcessPoolExecutor() as executor:
-            futures = {
-                executor.submit(
-                    _run_single,
-                    test_case_result_id=i + 1,
-                    case_id=case.id,
-                    work_dir=work_dir,
-                    run_cmd=db_language.run_cmd,
-                    language_name=db_language.name,
-                    test_case_input=case.input,
-                    test_case_output=case.output,
-                    time_limit=time_limit,
-                    memory_limit=memory_limit,
-                    judge_mode=db_problem.judge_mode,
-                    spj_run_cmd=spj_run_cmd,
-                    spj_language_name=db_problem.spj_language_name,
-                ): case for i, case in enumerate(db_problem.testcases)
-            }
-            
-            # 收集返回数据
-            for future in as_completed(futures):
-                test_case_results.append(future.result())
-
-        test_case_results.sort(key=lambda r: r['test_case_result_id'])
+        """测试数据落盘(同一数据版本只写一次)"""
+        data_dir, answer_dir = materialize(db, db_problem)
+        case_ids = [case.id for case in db_problem.testcases]
+        stop_on_failure = db_problem.judge_policy == "stop_on_first_failure"
+        order = _case_order(db, db_problem)
+        
+        writer = _ResultWriter(db, submission_id, db_language.name)
+
+        if BATCH_ENABLED:
+            """单容器批量评测"""
+            for result in _run_batch(
+                work_dir=work_dir,
+                run_cmd=db_language.run_cmd,
+                language_name=db_language.name,
+                data_dir=data_dir,
+                answer_dir=answer_dir,
+                case_ids=case_ids,
+                time_limit=time_limit,
+                memory_limit=memory_limit,
+                judge_mode=db_problem.judge_mode,
+                spj_run_cmd=spj_run_cmd,
+                spj_language_name=db_problem.spj_language_name,
+                user_id=db_submission.user_id,
+                problem_id=db_problem.id,
+                order=order,
+                stop_on_failure=stop_on_failure,
+                checker=checker,
+            ):
+                writer.add(result)
+        elif ASYNC_ORCHESTRATOR_ENABLED and get_sandbox(db_language.name).name == "docker":
+            """单进程异步评测"""
+            asyncio.run(_run_async(
+                writer=writer,
+                work_dir=work_dir,
+                run_cmd=db_language.run_cmd,
+                language_name=db_language.name,
+                data_dir=data_dir,
+                answer_dir=answer_dir,
+                case_ids=case_ids,
+                time_limit=time_limit,
+                memory_limit=memory_limit,
+                judge_mode=db_problem.judge_mode,
+                spj_run_cmd=spj_run_cmd,
+                spj_language_name=db_problem.spj_language_name,
+                user_id=db_submission.user_id,
+                problem_id=db_problem.id,
+                order=order,
+                stop_on_failure=stop_on_failure,
+                checker=checker,
+            ))
+        else:
+            """创建进程池, 进行评测"""
+            with ProcessPoolExecutor(max_workers=CASE_WORKERS) as executor:
+                futures = {
+                    executor.submit(
+                        _run_single,
+                        test_case_result_id=i + 1,
+                        case_id=case_ids[i],
+                        work_dir=work_dir,
+                        run_cmd=db_language.run_cmd,
+                        language_name=db_language.name,
+                        input_file=os.path.join(data_dir, case_files(i + 1)[0]),
+                        answer_file=os.path.join(answer_dir, case_files(i + 1)[1]),
+                        time_limit=time_limit,
+                        memory_limit=memory_limit,
+                        judge_mode=db_problem.judge_mode,
+                        spj_run_cmd=spj_run_cmd,
+                        spj_language_name=db_problem.spj_language_name,
+                        user_id=db_submission.user_id,
+                        problem_id=db_problem.id,
+                        spj_protocol=db_problem.spj_protocol,
+                    ): (i + 1, case_ids[i]) for i in order
+                }
+                
+                # 收集返回数据; stop_on_first_failure时首个失败后取消尚未开始的测例
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        writer.add(_skipped(*futures[future]))
+                        continue
+                    result = future.result()
+                    writer.add(result)
+                    if stop_on_failure and result["result"] != "AC":
+                        for pending in futures:
+                            pending.cancel()
+
+        writer.flush()
+        test_case_results = sorted(writer.results, key=lambda r: r['test_case_result_id'])
         
         final_status_category = StatusCategory.AC
         max_time = 0.0
@@ -343,48 +659,44 @@ def _collect(submission_id:int):
             if STATUS_PRECEDENCE.get(current_res_category, 99) > STATUS_PRECEDENCE.get(final_status_category, 99):
                 final_status_category = current_res_category
             
-            score = res.pop("score", None)
-            if score is not None:
-                total_score += score
-            elif current_res_category == StatusCategory.AC:
-                total_score += 10
+            total_score += _points(res)
         
-        """提交评测结果"""
-        db_submission.status = SubmissionStatusCategory.SUCCESS if (
+        """提交评测结果, 同时修改用户解决题数"""
+        db_submission_crud.set_status(db, db_submission, SubmissionStatusCategory.SUCCESS if (
             final_status_category == StatusCategory.AC
             or final_status_category == StatusCategory.WA
-        ) else SubmissionStatusCategory.ERROR
+        ) else SubmissionStatusCategory.ERROR)
         db_submission.time = max_time
         db_submission.memory = max_memory
         db_submission.score = total_score
+        # 含系统错误的结果不可复用
+        if all(res["result"] != "UNK" for res in test_case_results):
+            db_submission.verdict_key = key
 
-        print([res for res in test_case_results])
-        print(max_time, max_memory, final_status_category, total_score, db_submission.counts)
-        
-        """修改用户解决题数"""
-        if db_submission.status == SubmissionStatusCategory.SUCCESS:
-            db_user = db.get(UserModel, db_submission.user_id)
-            db_user.resolve_count += 1
-
-        db_submission.test_case_results = [
-            TestCaseResultModel(submission_id=submission_id, **result) for result in test_case_results
-        ]
-        db.commit()
+
+        with metrics.timed("judge_phase_seconds", phase="db_write", language=db_language.name):
+            db.commit()
+        verdict = final_status_category.value
+        metrics.count("judge_submissions_total", language=db_language.name, verdict=verdict)
+        metrics.observe("judge_phase_seconds", time.perf_counter() - start, phase="total", language=db_language.name, verdict=verdict)
 
     except Exception as e:
         _error(submission_id, StatusCategory.UNK, work_dir, err_msg=f"Main orchestrator failed: {str(e)}")
     finally:
+        if checker is not None:
+            checker.close()
         db.close()
+        metrics.flush()
         if os.path.exists(work_dir):
             shutil.rmtree(work_dir)
 
-def _error(submission_id:int, result:StatusCategory, work_dir:str, err_msg:str=""):
-    """更新错误状态"""
+def _error(submission_id:int, result:StatusCategory, work_dir:str, err_msg:str="", verdict_key:Optional[str]=None):
+    """更新错误状态; 确定性的错误(编译错误)可传入verdict_key供缓存复用"""
     db = SessionLocal()
     try:
         db_submission = db.get(SubmissionModel, submission_id)
         if db_submission:
-            db_submission.status = SubmissionStatusCategory.ERROR
+            db_submission_crud.set_status(db, db_submission, SubmissionStatusCategory.ERROR)
             db_submission.test_case_results = [
                 TestCaseResultModel(
                     submission_id=submission_id,
@@ -397,13 +709,22 @@ def _error(submission_id:int, result:StatusCategory, work_dir:str, err_msg:str="
                     case_id=case.id,
                 ) for i, case in enumerate(db_submission.problem.testcases)
             ]
+            db_submission.score = 0
+            db_submission.cases_done = db_submission.cases_total = len(db_submission.test_case_results)
+            db_submission.verdict_key = verdict_key
             db.commit()
+            language_name = db_submission.language.name if db_submission.language else ""
+            metrics.count("judge_submissions_total", language=language_name, verdict=result.value)
     finally:
         db.close()
+        metrics.flush()
         if os.path.exists(work_dir):
             shutil.rmtree(work_dir)
 
-def eval(submission_id: int):
-    """启动评测"""
-    process = multiprocessing.Process(target=_collect, args=(submission_id,))
-    process.start()
\ No newline at end of file
+def eval(submission_id:int, priority:int=0):
+    """提交评测任务, 由评测守护进程(app.judger.worker)领取执行"""
+    db = SessionLocal()
+    try:
+        db_judge_job.enqueue(db=db, submission_id=submission_id, priority=priority)
+    finally:
+        db.close()
@@ -0,0 +1,164 @@
+import os
+import re
+import json
+import time
+import fcntl
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple
+
+from app.judger.config import WORKDIR_BASE
+
+"""评测指标: 评测分布在多个进程中, 计数统一写入加锁的json文件, 由 /api/metrics 以Prometheus文本格式导出"""
+METRICS_PATH = os.path.join(WORKDIR_BASE, "_metrics.json")
+
+# 直方图的桶上界(秒), 最后还有一个+Inf桶
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 进程内尚未写入文件的观测值与计数, 由flush()批量合并, 避免每次观测都加锁读写文件
+_pending:Dict[str, List[float]] = {}
+_pending_counts:Dict[str, float] = {}
+
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+@contextmanager
+def _locked(write:bool=True):
+    """独占指标文件, 读出后交给调用方修改, 退出时写回"""
+    with open(METRICS_PATH + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            data = {"counters": {}, "gauges": {}, "histograms": {}}
+            if os.path.exists(METRICS_PATH):
+                with open(METRICS_PATH) as f:
+                    try:
+                        data.update(json.load(f))
+                    except ValueError:
+                        pass
+            yield data
+            if not write:
+                return
+            tmp_path = METRICS_PATH + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, METRICS_PATH)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _key(name:str, labels:Dict[str, Any]) -> str:
+    """指标名 + 标签, 形如 name{a="1",b="2"}"""
+    if not labels:
+        return name
+    label_str = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+def inc(name:str, amount:float=1, **labels):
+    """计数器累加"""
+    key = _key(name, labels)
+    with _locked() as data:
+        data["counters"][key] = data["counters"].get(key, 0) + amount
+
+def count(name:str, amount:float=1, **labels):
+    """计数器累加, 与observe一样先缓存在进程内, 用于评测热路径"""
+    key = _key(name, labels)
+    _pending_counts[key] = _pending_counts.get(key, 0) + amount
+
+def set_gauge(name:str, value:float, **labels):
+    """设置瞬时值"""
+    with _locked() as data:
+        data["gauges"][_key(name, labels)] = value
+
+def observe(name:str, value:float, **labels):
+    """记录一次观测值(通常为耗时), 先缓存在进程内"""
+    _pending.setdefault(_key(name, labels), []).append(value)
+
+@contextmanager
+def timed(name:str, **labels):
+    """记录代码块的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def flush():
+    """将进程内缓存的观测值与计数合并进共享指标文件"""
+    global _pending, _pending_counts
+    if not _pending and not _pending_counts:
+        return
+    pending, _pending = _pending, {}
+    pending_counts, _pending_counts = _pending_counts, {}
+    with _locked() as data:
+        for key, amount in pending_counts.items():
+            data["counters"][key] = data["counters"].get(key, 0) + amount
+        for key, values in pending.items():
+            histogram = data["histograms"].setdefault(key, {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0})
+            for value in values:
+                histogram["buckets"][bisect_left(BUCKETS, value)] += 1
+            histogram["sum"] += sum(values)
+            histogram["count"] += len(values)
+
+def quantile(histogram:Dict[str, Any], q:float) -> float:
+    """由直方图估计分位数, 在所在桶内线性插值"""
+    if not histogram["count"]:
+        return 0.0
+    rank = q * histogram["count"]
+    seen = 0
+    for i, count in enumerate(histogram["buckets"]):
+        if count and seen + count >= rank:
+            lower = BUCKETS[i - 1] if i > 0 else 0.0
+            upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return BUCKETS[-1]
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """读取当前全部指标"""
+    with _locked(write=False) as data:
+        return {"counters": dict(data["counters"]), "gauges": dict(data["gauges"]), "histograms": dict(data["histograms"])}
+
+def _split(key:str) -> Tuple[str, Dict[str, str]]:
+    """_key的逆过程: 指标名与标签"""
+    if "{" not in key:
+        return key, {}
+    name, label_str = key.split("{", 1)
+    return name, dict(_LABEL.findall(label_str))
+
+def select(histograms:Dict[str, Any], name:str, **labels) -> Dict[str, Any]:
+    """合并指标名为name且包含给定标签的所有直方图, 例如按phase汇总各语言"""
+    merged = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+    for key, histogram in histograms.items():
+        key_name, key_labels = _split(key)
+        if key_name != name or any(key_labels.get(k) != str(v) for k, v in labels.items()):
+            continue
+        merged["buckets"] = [a + b for a, b in zip(merged["buckets"], histogram["buckets"])]
+        merged["sum"] += histogram["sum"]
+        merged["count"] += histogram["count"]
+    return merged
+
+def _series(name:str, labels:Dict[str, str], **extra) -> str:
+    return _key(name, {**labels, **extra})
+
+def render() -> str:
+    """Prometheus文本格式, 同一指标的所有序列连续输出"""
+    data = snapshot()
+    families:Dict[str, Tuple[str, List[str]]] = {}
+    for kind, type_name in (("counters", "counter"), ("gauges", "gauge")):
+        for key, value in sorted(data[kind].items()):
+            name, _ = _split(key)
+            families.setdefault(name, (type_name, []))[1].append(f"{key} {value}")
+    for key, histogram in sorted(data["histograms"].items()):
+        name, labels = _split(key)
+        lines = families.setdefault(name, ("histogram", []))[1]
+        cumulative = 0
+        for i, n in enumerate(histogram["buckets"]):
+            cumulative += n
+            le = str(BUCKETS[i]) if i < len(BUCKETS) else "+Inf"
+            lines.append(f"{_series(name + '_bucket', labels, le=le)} {cumulative}")
+        lines.append(f"{_series(name + '_sum', labels)} {histogram['sum']}")
+        lines.append(f"{_series(name + '_count', labels)} {histogram['count']}")
+
+    output = []
+    for name, (type_name, lines) in sorted(families.items()):
+        output.append(f"# TYPE {name} {type_name}")
+        output.extend(lines)
+    return "\n".join(output) + "\n"
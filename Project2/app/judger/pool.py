@@ -0,0 +1,271 @@
+import os
+import time
+import uuid
+import fcntl
+import docker
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from app.judger import metrics
+from app.judger.box import Box, BOX_BASE
+from app.judger.config import (
+    client, DOCKER_IMAGE, WORKDIR_BASE,
+    POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_MAX_RUNS, POOL_LEASE_TIMEOUT,
+)
+
+"""预热容器池: 每种语言维护若干常驻沙箱容器, 测例通过exec在租用的容器中运行
+每个容器只读挂载自己的box目录, 租用者放入本次运行所需的文件, 归还时清空"""
+POOL_LABEL = "oj.pool"
+BOX_LABEL = "oj.box"
+# 容器挂载布局的版本, 布局变化后旧容器在租用时回收
+LAYOUT_LABEL = "oj.pool.layout"
+POOL_LAYOUT = "5"
+# 容器保留的capability: runner降权用SETUID/SETGID, 看门狗与interrupt杀死已降权的测例用KILL;
+# 输出目录属于评测端用户, runner(容器内root)写入需要DAC_OVERRIDE
+# 容器以no-new-privileges运行, 降权后的测例无法经setuid程序重新获得这些capability
+CAPABILITIES = ["SETUID", "SETGID", "KILL", "DAC_OVERRIDE"]
+LOCK_DIR = os.path.join(WORKDIR_BASE, "_pool")
+os.makedirs(LOCK_DIR, exist_ok=True)
+
+# 以nobody身份清理: kill -1 不会杀死自身与1号进程, 之后清空/tmp
+RESET_CMD = "sh -c 'kill -9 -1 2>/dev/null; rm -rf /tmp/* /tmp/.[!.]* 2>/dev/null; true'"
+
+class PoolExhausted(RuntimeError):
+    """等待超时仍未租到空闲容器"""
+
+def _box(container) -> Optional[Box]:
+    name = (container.labels or {}).get(BOX_LABEL)
+    return Box(os.path.join(BOX_BASE, name)) if name else None
+
+class Lease:
+    """一次容器租用, 持有容器对应锁文件的flock"""
+    def __init__(self, container, lock_file):
+        self.container = container
+        self.lock_file = lock_file
+        self.contaminated = False
+        self.box = _box(container)
+
+    @property
+    def runs(self) -> int:
+        self.lock_file.seek(0)
+        content = self.lock_file.read().strip()
+        return int(content) if content else 0
+
+    @runs.setter
+    def runs(self, value:int):
+        self.lock_file.seek(0)
+        self.lock_file.truncate()
+        self.lock_file.write(str(value))
+        self.lock_file.flush()
+
+    def exec_run(self, cmd:str, workdir:str, user:str="nobody"):
+        """在租用容器中执行命令, 返回(exit_code, stdout, stderr)"""
+        exit_code, (stdout, stderr) = self.container.exec_run(cmd, workdir=workdir, user=user, demux=True)
+        return exit_code, stdout or b"", stderr or b""
+
+    def exec_stream(self, cmd:str, workdir:str, user:str="nobody"):
+        """在租用容器中执行命令, 逐块返回stdout"""
+        _, stream = self.container.exec_run(cmd, workdir=workdir, user=user, stream=True, demux=True)
+        for stdout, _ in stream:
+            if stdout:
+                yield stdout
+
+    def interrupt(self):
+        """以root杀死容器内除1号进程外的所有进程, 用于提前终止评测"""
+        self.container.exec_run("kill -9 -1", user="root")
+
+    def release(self):
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
+
+class ContainerPool:
+    """单个语言的容器池, 跨进程共享: 容器以label发现, 以锁文件互斥租用"""
+    def __init__(self, language_name:str, min_size:int=POOL_MIN_SIZE, max_size:int=POOL_MAX_SIZE, max_runs:int=POOL_MAX_RUNS):
+        self.language_name = language_name
+        self.image = DOCKER_IMAGE[language_name]
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_runs = max_runs
+
+    def _lock_path(self, container_id:str) -> str:
+        return os.path.join(LOCK_DIR, f"{container_id}.lock")
+
+    def _list(self) -> List:
+        return client.containers.list(all=True, filters={"label": f"{POOL_LABEL}={self.language_name}"})
+
+    @contextmanager
+    def _pool_lock(self):
+        """创建/销毁容器时持有的池锁, 避免多个进程同时扩容超过上限"""
+        with open(os.path.join(LOCK_DIR, f"{self.language_name}.lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _create(self):
+        """启动一个空闲容器, 只读挂载自己的box与runner, 仅/tmp与仅root可访问的输出目录可写; 只保留CAPABILITIES"""
+        start = time.perf_counter()
+        name = uuid.uuid4().hex
+        box = Box(os.path.join(BOX_BASE, name))
+        try:
+            container = client.containers.run(
+                image=self.image,
+                command="sleep infinity",
+                labels={POOL_LABEL: self.language_name, BOX_LABEL: name, LAYOUT_LABEL: POOL_LAYOUT},
+                volumes=box.volumes(),
+                tmpfs={'/tmp': 'size=64m,mode=1777'},
+                read_only=True,
+                network_disabled=True,
+                cap_drop=["ALL"],
+                cap_add=CAPABILITIES,
+                security_opt=["no-new-privileges"],
+                pids_limit=64,
+                user='nobody',
+                detach=True,
+            )
+        except BaseException:
+            box.destroy()
+            raise
+        metrics.inc("pool_created_total", language=self.language_name)
+        metrics.observe("docker_op_seconds", time.perf_counter() - start, op="pool_create", language=self.language_name)
+        return container
+
+    def _destroy(self, container, reason:str):
+        try:
+            with metrics.timed("docker_op_seconds", op="remove", language=self.language_name):
+                container.remove(force=True)
+        except docker.errors.NotFound:
+            pass
+        lock_path = self._lock_path(container.id)
+        if os.path.exists(lock_path):
+            os.remove(lock_path)
+        box = _box(container)
+        if box is not None:
+            box.destroy()
+        metrics.inc("pool_recycled_total", language=self.language_name, reason=reason)
+
+    def _try_lock(self, container) -> Optional[Lease]:
+        lock_file = open(self._lock_path(container.id), "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return Lease(container, lock_file)
+
+    def _healthy(self, container) -> bool:
+        """健康检查: 容器在运行且能正常exec"""
+        try:
+            container.reload()
+            if container.status != "running":
+                return False
+            return container.exec_run("true", user="nobody").exit_code == 0
+        except docker.errors.APIError:
+            return False
+
+    def _acquire(self) -> Optional[Lease]:
+        containers = self._list()
+        for container in containers:
+            lease = self._try_lock(container)
+            if lease is None:
+                continue
+            if lease.box is None or container.labels.get(LAYOUT_LABEL) != POOL_LAYOUT:
+                self._destroy(container, reason="outdated")
+                lease.release()
+                continue
+            if self._healthy(container):
+                return lease
+            metrics.inc("pool_health_failures_total", language=self.language_name)
+            self._destroy(container, reason="unhealthy")
+            lease.release()
+
+        # 无空闲容器, 未达上限时扩容
+        with self._pool_lock():
+            if len(self._list()) < self.max_size:
+                return self._try_lock(self._create())
+        return None
+
+    def ensure_min(self):
+        """补足最小容器数"""
+        with self._pool_lock():
+            for _ in range(self.min_size - len(self._list())):
+                self._create()
+
+    @contextmanager
+    def lease(self, memory_limit:int):
+        """租用一个容器, 按题目设置内存上限; 归还时清理, 达到次数上限或被污染则回收"""
+        start = time.time()
+        lease = self._acquire()
+        while lease is None:
+            if time.time() - start > POOL_LEASE_TIMEOUT:
+                raise PoolExhausted(f"No idle {self.language_name} container in {POOL_LEASE_TIMEOUT}s")
+            time.sleep(0.05)
+            lease = self._acquire()
+        metrics.count("pool_leases_total", language=self.language_name)
+        metrics.count("pool_lease_wait_seconds_total", time.time() - start, language=self.language_name)
+        metrics.observe("pool_lease_wait_seconds", time.time() - start, language=self.language_name)
+
+        try:
+            lease.container.update(mem_limit=f"{memory_limit}m", memswap_limit=f"{memory_limit}m")
+            lease.box.clear()
+            yield lease
+        except Exception:
+            lease.contaminated = True
+            raise
+        finally:
+            self._giveback(lease)
+
+    def _giveback(self, lease:Lease):
+        container = lease.container
+        runs = lease.runs + 1
+        reason = None
+        if lease.contaminated:
+            reason = "contaminated"
+        elif runs >= self.max_runs:
+            reason = "max_runs"
+        else:
+            try:
+                with metrics.timed("docker_op_seconds", op="reset", language=self.language_name):
+                    exit_code = container.exec_run(RESET_CMD, user="nobody").exit_code
+                if exit_code != 0:
+                    reason = "reset_failed"
+            except docker.errors.APIError:
+                reason = "reset_failed"
+
+        if reason is None:
+            # 进程已被杀死, 清空box后才可交给下一个租用者
+            lease.box.clear()
+            lease.runs = runs
+        else:
+            self._destroy(container, reason=reason)
+        lease.release()
+
+    def stats(self) -> Dict[str, int]:
+        """容器池状态: 总数, 空闲数, 租用数"""
+        total, idle = 0, 0
+        for container in self._list():
+            total += 1
+            lease = self._try_lock(container)
+            if lease is not None:
+                idle += 1
+                lease.release()
+        return {"total": total, "idle": idle, "busy": total - idle}
+
+_POOLS:Dict[str, ContainerPool] = {}
+
+def get_pool(language_name:str) -> ContainerPool:
+    """获取语言对应的容器池, 每个进程一个实例, 容器本身跨进程共享"""
+    if language_name not in _POOLS:
+        _POOLS[language_name] = ContainerPool(language_name)
+        _POOLS[language_name].ensure_min()
+    return _POOLS[language_name]
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """所有语言容器池的状态, 同时写入指标"""
+    result = {}
+    for language_name in DOCKER_IMAGE:
+        result[language_name] = get_pool(language_name).stats()
+        for key, value in result[language_name].items():
+            metrics.set_gauge(f"pool_containers_{key}", value, language=language_name)
+    return result
@@ -0,0 +1,315 @@
+"""
+容器内批量评测脚本: 只依赖标准库, 挂载进评测容器后以root运行
+用法: python3 runner.py <manifest文件> 或 python3 runner.py --json '<manifest>'
+manifest为json, 形如 {"cmd": "./main", "time_limit": 1.0, "memory_limit": 256, "stop_on_failure": false, "cases": [{"id": 1, "input": "1.in"}]}
+可选 wall_limit(秒), 默认为 time_limit * WALL_FACTOR; output_limit, output_preview, stderr_limit(字节)
+每个测例在独立进程中以nobody身份运行, 运行结束立即向stdout输出一行json结果
+看门狗在CPU时间超过time_limit或墙钟时间超过wall_limit时立即杀死整个进程组, 记录中limit标明触发的限制
+输出写入大小受限的文件, stdout超过output_limit时记录output_exceeded, 只返回前output_preview字节;
+记录中带有完整stdout的sha256与大小, stderr最多返回stderr_limit字节
+stop_on_failure时, 测例异常退出或超时后不再运行其余测例(答案比对在容器外进行, 由评测端终止)
+manifest可指定 output_dir(输出文件目录), keep_output: 为true时保留未超限的完整stdout文件, 记录中output_file为其路径, stdout只含预览
+在容器外运行(本地后端)时, manifest另可指定 tmp_dir(测例的TMPDIR与HOME), isolate_network, address_space(MB)
+manifest含 "zygote": {"script": "main.py", "preload": ["numpy"]} 时, runner先导入preload中的模块,
+每个测例由runner fork后直接运行脚本, 不再启动解释器; 子进程的CPU时间从fork开始计算, 内存扣除fork时已驻留的部分
+"""
+import gc
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import shlex
+import types
+import signal
+import builtins
+import resource
+import importlib
+import threading
+import traceback
+import subprocess
+
+NOBODY = 65534
+OUTPUT_DIR = "/tmp/out"
+OUTPUT_LIMIT = 64 * 1024 * 1024
+OUTPUT_PREVIEW = 1024
+STDERR_LIMIT = 64 * 1024
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+WALL_FACTOR = 2.0
+WATCHDOG_MIN_INTERVAL = 0.002
+WATCHDOG_MAX_INTERVAL = 0.05
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+# 正在运行的测例进程号, 收到SIGTERM时一并杀死
+_current = None
+
+def _unshare_network():
+    """进入只有回环设备的新网络命名空间; 非root时同时新建用户命名空间, 不支持时跳过"""
+    flags = CLONE_NEWNET if os.getuid() == 0 else CLONE_NEWUSER | CLONE_NEWNET
+    try:
+        if hasattr(os, "unshare"):
+            os.unshare(flags)
+        else:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            if libc.unshare(flags) != 0:
+                raise OSError(ctypes.get_errno(), "unshare")
+    except OSError:
+        pass
+
+def _limits(time_limit:float, memory_limit:int, isolate_network:bool=False, address_space:int=0, output_limit:int=OUTPUT_LIMIT):
+    """子进程在exec前设置资源限制并降权; 文件大小上限比output_limit多1字节, 以区分恰好写满与超出"""
+    def preexec():
+        if isolate_network:
+            _unshare_network()
+        if address_space:
+            resource.setrlimit(resource.RLIMIT_AS, (address_space * 1024 * 1024, address_space * 1024 * 1024))
+        cpu = int(time_limit) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (output_limit + 1, output_limit + 1))
+        resource.setrlimit(resource.RLIMIT_STACK, (memory_limit * 1024 * 1024, memory_limit * 1024 * 1024))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        if os.getuid() == 0:
+            os.setgroups([])
+            os.setgid(NOBODY)
+            os.setuid(NOBODY)
+    return preexec
+
+def preload(modules:list):
+    """导入白名单中的模块(不存在的跳过), 之后冻结gc, 减少fork后的写时复制"""
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+def _memory() -> tuple:
+    """当前进程的驻留内存与虚拟内存(MB)"""
+    with open("/proc/self/statm") as f:
+        size, resident = f.read().split()[:2]
+    page = os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    return int(resident) * page, int(size) * page
+
+def _fork_script(script:str, fin, fout, ferr, cwd:str, env:dict, preexec) -> int:
+    """fork子进程, 在其中以__main__运行Python脚本, 返回子进程号"""
+    pid = os.fork()
+    if pid:
+        return pid
+
+    code = 1
+    try:
+        os.setsid()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        for fd, f in ((0, fin), (1, fout), (2, ferr)):
+            os.dup2(f.fileno(), fd)
+        for fd in os.listdir("/proc/self/fd"):
+            if int(fd) > 2:
+                try:
+                    os.close(int(fd))
+                except OSError:
+                    pass
+        if cwd:
+            os.chdir(cwd)
+        if env:
+            os.environ.clear()
+            os.environ.update(env)
+        preexec()
+        sys.stdin = io.TextIOWrapper(io.FileIO(0, "r", closefd=False))
+        sys.stdout = io.TextIOWrapper(io.FileIO(1, "w", closefd=False))
+        sys.stderr = io.TextIOWrapper(io.FileIO(2, "w", closefd=False), line_buffering=True)
+        sys.argv = [script]
+        sys.path[0] = os.path.dirname(os.path.abspath(script))
+        with open(script, "rb") as f:
+            program = compile(f.read(), script, "exec")
+        main = types.ModuleType("__main__")
+        main.__file__ = script
+        main.__builtins__ = builtins
+        sys.modules["__main__"] = main
+        exec(program, main.__dict__)
+        code = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            code = e.code or 0
+        else:
+            sys.stderr.write(f"{e.code}\n")
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(code)
+
+def _cpu_time(pid:int) -> float:
+    """进程及其已回收子进程的CPU时间(秒)"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return sum(int(tick) for tick in fields[11:15]) / CLOCK_TICKS
+
+def _watchdog(pid:int, time_limit:float, wall_limit:float, start:float, done:threading.Event, verdict:list):
+    """轮询CPU时间与墙钟时间, 超限时杀死进程组并在verdict中记下 cpu 或 wall
+    轮询间隔为剩余额度的一半, 接近上限时更密, 平时开销很小"""
+    while True:
+        elapsed = time.monotonic() - start
+        try:
+            cpu = _cpu_time(pid)
+        except (OSError, ValueError):
+            return
+        if cpu > time_limit:
+            verdict.append("cpu")
+        elif elapsed > wall_limit:
+            verdict.append("wall")
+        if verdict:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            return
+        interval = min(time_limit - cpu, wall_limit - elapsed) / 2
+        if done.wait(min(WATCHDOG_MAX_INTERVAL, max(WATCHDOG_MIN_INTERVAL, interval))):
+            return
+
+def _read_output(path:str, limit:int, preview:int, keep:bool=False) -> tuple:
+    """流式计算输出文件的sha256与大小, 不超过limit且不保留文件时返回全部内容, 否则只返回前preview字节"""
+    h = hashlib.sha256()
+    capacity = preview if keep else limit + 1
+    head = b""
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            if len(head) < capacity:
+                head += chunk[:capacity - len(head)]
+            size += len(chunk)
+            h.update(chunk)
+    exceeded = size > limit
+    return (head[:preview] if exceeded else head).decode("utf-8", errors="ignore"), size, h.hexdigest(), exceeded
+
+def run_case(
+    cmd:list, case:dict, time_limit:float, memory_limit:int,
+    output_dir:str=OUTPUT_DIR, cwd:str=None, isolate_network:bool=False, address_space:int=0,
+    script:str=None, baseline:float=0.0, wall_limit:float=None,
+    output_limit:int=OUTPUT_LIMIT, output_preview:int=OUTPUT_PREVIEW, stderr_limit:int=STDERR_LIMIT,
+    tmp_dir:str=None, keep_output:bool=False,
+) -> dict:
+    """运行单个测例, 用wait4获取CPU时间和内存峰值, 看门狗在CPU或墙钟超限时杀死整个进程组
+    script不为None时由当前进程fork运行该脚本(预加载模式), 内存峰值扣除baseline(MB)
+    keep_output时保留未超限的stdout文件, 由调用方读取并删除"""
+    global _current
+    out_path = os.path.join(output_dir, f"{case['id']}.out")
+    err_path = os.path.join(output_dir, f"{case['id']}.err")
+    env = dict(os.environ, TMPDIR=tmp_dir, HOME=tmp_dir) if tmp_dir else None
+    preexec = _limits(time_limit, memory_limit, isolate_network, address_space, output_limit)
+    with open(case["input"], "rb") as fin, open(out_path, "wb") as fout, open(err_path, "wb") as ferr:
+        start = time.monotonic()
+        proc = None
+        if script is None:
+            # 持有Popen对象直到wait4返回: 对象被回收时会用waitpid回收已退出的子进程, wait4随之失败
+            proc = subprocess.Popen(
+                cmd, stdin=fin, stdout=fout, stderr=ferr, cwd=cwd, env=env,
+                preexec_fn=preexec, start_new_session=True,
+            )
+            pid = proc.pid
+        else:
+            pid = _fork_script(script, fin, fout, ferr, cwd, env, preexec)
+        _current = pid
+
+    done = threading.Event()
+    verdict = []
+    watchdog = threading.Thread(
+        target=_watchdog, args=(pid, time_limit, wall_limit or time_limit * WALL_FACTOR, start, done, verdict), daemon=True,
+    )
+    watchdog.start()
+    _, status, usage = os.wait4(pid, 0)
+    wall = time.monotonic() - start
+    done.set()
+    watchdog.join()
+    _current = None
+
+    if os.WIFSIGNALED(status):
+        status_code = 128 + os.WTERMSIG(status)
+        # RLIMIT_CPU兜底(看门狗来不及时)同样是CPU超时
+        if not verdict and os.WTERMSIG(status) == signal.SIGXCPU:
+            verdict.append("cpu")
+    else:
+        status_code = os.WEXITSTATUS(status)
+    if proc is not None:
+        proc.returncode = status_code
+
+    stdout, output_size, output_hash, output_exceeded = _read_output(out_path, output_limit, output_preview, keep_output)
+    # 写入超过文件大小上限时进程收到SIGXFSZ
+    output_exceeded = output_exceeded or (os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGXFSZ)
+    with open(err_path, "rb") as f:
+        stderr = f.read(stderr_limit).decode("utf-8", errors="ignore")
+    os.remove(err_path)
+    record = {
+        "id": case["id"], "status_code": status_code,
+        "time": usage.ru_utime + usage.ru_stime, "wall": wall,
+        "memory": max(0.0, usage.ru_maxrss / 1024 - baseline),
+        "timed_out": bool(verdict), "limit": verdict[0] if verdict else None,
+        "output_exceeded": output_exceeded, "output_size": output_size, "output_hash": output_hash,
+        "stdout": stdout, "stderr": stderr,
+    }
+    if keep_output and not output_exceeded:
+        record["output_file"] = out_path
+    else:
+        os.remove(out_path)
+    return record
+
+def _terminate(signum, frame):
+    """被评测端终止时先杀死正在运行的测例"""
+    if _current is not None:
+        try:
+            os.killpg(_current, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    sys.exit(1)
+
+def main():
+    if sys.argv[1] == "--json":
+        manifest = json.loads(sys.argv[2])
+    else:
+        with open(sys.argv[1]) as f:
+            manifest = json.load(f)
+    output_dir = manifest.get("output_dir", OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    signal.signal(signal.SIGTERM, _terminate)
+
+    cmd = shlex.split(manifest["cmd"])
+    address_space = manifest.get("address_space", 0)
+    script, baseline = None, 0.0
+    if manifest.get("zygote"):
+        # 导入在测例之外完成, 不计入用时; 子进程继承的已驻留内存不计入内存, 地址空间上限相应放宽
+        preload(manifest["zygote"].get("preload", []))
+        script = manifest["zygote"]["script"]
+        baseline, size = _memory()
+        if address_space:
+            address_space += int(size) + 1
+    for case in manifest["cases"]:
+        try:
+            record = run_case(
+                cmd, case, manifest["time_limit"], manifest["memory_limit"], output_dir=output_dir,
+                isolate_network=manifest.get("isolate_network", False), address_space=address_space,
+                script=script, baseline=baseline, wall_limit=manifest.get("wall_limit"),
+                output_limit=manifest.get("output_limit", OUTPUT_LIMIT),
+                output_preview=manifest.get("output_preview", OUTPUT_PREVIEW),
+                stderr_limit=manifest.get("stderr_limit", STDERR_LIMIT),
+                tmp_dir=manifest.get("tmp_dir"), keep_output=manifest.get("keep_output", False),
+            )
+        except Exception as e:
+            record = {"id": case["id"], "error": str(e)}
+        sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+        if manifest.get("stop_on_failure") and (
+            "error" in record or record["status_code"] != 0 or record["timed_out"] or record["output_exceeded"]
+        ):
+            break
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,653 @@
+import os
+import sys
+import json
+import time
+import shlex
+import select
+import socket
+import asyncio
+import shutil
+import tempfile
+import threading
+import subprocess
+import docker
+from contextlib import ExitStack
+from functools import partial
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from requests.exceptions import ReadTimeout
+
+from app.judger import runner, metrics, compile_service
+from app.judger.pool import get_pool
+from app.judger.box import Box, BOX_MOUNT, RUNNER_MOUNT, OUTPUT_MOUNT
+from app.judger.cache import image_digest
+from app.judger.config import (
+    client, DOCKER_IMAGE, POOL_ENABLED, RUNNER_DIR, RUNNER_MEMORY, PYTHON_ZYGOTE_MEMORY,
+    SANDBOX_BACKEND, LOCAL_ISOLATE_NETWORK, LOCAL_COMPILE_TIMEOUT, WALL_LIMIT_FACTOR,
+    OUTPUT_LIMIT, OUTPUT_PREVIEW, STDERR_LIMIT, SPJ_MEMORY, COMPILE_SERVER_ENABLED, COMPILE_SERVER_LANGUAGES,
+)
+
+"""
+执行后端: 编译, 运行单个测例, 通过runner批量运行测例, 运行checker
+docker: 预热容器池或单独创建的容器, 只读挂载放入了本次运行所需文件的box
+local: 本机子进程, setrlimit限制资源, 私有临时目录, 支持时以unshare断网; 开销为毫秒级, 仅用于可信部署与CI
+每种语言使用的后端由SANDBOX_BACKEND指定
+"""
+
+# 安装容器内runner脚本, 容器内只读挂载于RUNNER_MOUNT
+os.makedirs(RUNNER_DIR, exist_ok=True)
+shutil.copy(runner.__file__, os.path.join(RUNNER_DIR, "runner.py"))
+
+# 单独创建的容器中runner启动与退出的余量, 超过后视为runner失控
+CONTAINER_GRACE = 5.0
+
+# 容器内runner把完整输出保留在box的输出目录中
+DOCKER_OUTPUT = {"output_dir": OUTPUT_MOUNT, "keep_output": True}
+
+# runner捕获输出的上限, 合并进每个manifest
+OUTPUT_OPTIONS = {"output_limit": OUTPUT_LIMIT, "output_preview": OUTPUT_PREVIEW, "stderr_limit": STDERR_LIMIT}
+# 完整输出移入评测目录下的该子目录, 由评测端流式比对后删除
+OUTPUT_SUBDIR = "out"
+
+def _op(op:str, language_name:str):
+    """docker操作耗时"""
+    return metrics.timed("docker_op_seconds", op=op, language=language_name)
+
+class CompileError(Exception):
+    """编译失败, 消息为编译器输出"""
+
+def _fill(box:Box, files:List[str]) -> List[str]:
+    """把checker的参数文件(本机路径)依次放入box, 返回沙箱内路径"""
+    return [box.add(path, f"arg{i}") for i, path in enumerate(files)]
+
+def _keep_output(record:Dict[str, Any], output_dir:str, work_dir:str) -> Dict[str, Any]:
+    """把runner在output_dir(本机路径)中保留的输出文件移入评测目录, 记录中的output_file改为本机路径"""
+    name = record.pop("output_file", None)
+    if name is not None:
+        target_dir = os.path.join(work_dir, OUTPUT_SUBDIR)
+        os.makedirs(target_dir, exist_ok=True)
+        fd, target = tempfile.mkstemp(dir=target_dir, suffix=".out")
+        os.close(fd)
+        shutil.move(os.path.join(output_dir, os.path.basename(name)), target)
+        record["output_file"] = target
+    return record
+
+def iter_records(chunks:Iterator[bytes]) -> Iterator[Dict[str, Any]]:
+    """将runner的输出流切分为逐行的json记录"""
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if buffer.strip():
+        yield json.loads(buffer)
+
+class Checker:
+    """常驻spj进程(spj_protocol为stream): 每个测例写入一行 "<输入> <用户输出> <答案>" 三个沙箱内路径,
+    读回一行 "<得分0-10> [说明]"; 首次评测时启动, 超时或退出后下次评测重新启动; 可被多个线程共用"""
+    def __init__(self, timeout:float):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.running = False
+        self.buffer = b""
+
+    def _start(self):
+        raise NotImplementedError
+
+    def _send(self, data:bytes):
+        raise NotImplementedError
+
+    def _receive(self, timeout:float) -> bytes:
+        """读取一块输出, 超时抛出TimeoutError, 进程退出返回b"""""
+        raise NotImplementedError
+
+    def _stop(self):
+        raise NotImplementedError
+
+    def _place(self, files:List[str]) -> List[str]:
+        """本机路径转为checker可见的路径"""
+        return files
+
+    def _readline(self) -> Optional[bytes]:
+        deadline = time.monotonic() + self.timeout
+        while b"\n" not in self.buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                chunk = self._receive(remaining)
+            except (TimeoutError, socket.timeout):
+                return None
+            if not chunk:
+                return None
+            self.buffer += chunk
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return line
+
+    def check(self, input_file:str, user_output_file:str, answer_file:str) -> Tuple[Optional[int], str]:
+        """评测一个测例, 三个文件均为本机路径; 返回得分与说明, 无法得到合法结果时得分为None"""
+        with self.lock:
+            try:
+                if not self.running:
+                    self._start()
+                    self.running = True
+                paths = self._place([input_file, user_output_file, answer_file])
+                self._send(f"{' '.join(paths)}\n".encode())
+                line = self._readline()
+            except (OSError, docker.errors.DockerException):
+                line = None
+            if line is None:
+                self.close()
+                return None, "Checker timed out or exited."
+            score, _, message = line.decode("utf-8", errors="replace").strip().partition(" ")
+            try:
+                score = int(score)
+            except ValueError:
+                return None, f"Invalid checker response: {line[:64]!r}"
+            return (score, message) if 0 <= score <= 10 else (None, f"Invalid checker score: {score}")
+
+    def close(self):
+        if self.running:
+            self.running = False
+            self.buffer = b""
+            try:
+                self._stop()
+            except (OSError, docker.errors.DockerException):
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Sandbox:
+    """执行后端接口"""
+    name = ""
+
+    def environment(self, language_name:str, compile_cmd:str) -> str:
+        """编译环境标识, 参与编译缓存的键"""
+        raise NotImplementedError
+
+    def compile(self, work_dir:str, language_name:str, compile_cmd:str, memory_limit:int):
+        """在评测目录中编译, 失败抛出CompileError"""
+        raise NotImplementedError
+
+    def run_case(
+        self, work_dir:str, run_cmd:str, language_name:str,
+        input_file:str, time_limit:float, memory_limit:int,
+    ) -> Dict[str, Any]:
+        """运行单个测例, input_file为本机路径; 返回与runner相同的记录: status_code, time, memory, timed_out, limit,
+        output_exceeded, output_size, output_hash, stdout(预览), stderr; 未超限时output_file为完整输出, 由调用方删除"""
+        raise NotImplementedError
+
+    def run_batch(self, work_dir:str, language_name:str, manifest:Dict[str, Any], memory_limit:int) -> Iterator[Dict[str, Any]]:
+        """写入manifest(测例输入为本机路径)并启动runner, 流式返回每个测例的记录(同run_case); 提前关闭时终止runner"""
+        raise NotImplementedError
+
+    def run_checker(self, spj_dir:str, command:str, files:List[str], language_name:str, timeout:float) -> Optional[int]:
+        """在只含spj_dir中文件的目录下运行checker, files(本机路径)依次作为参数; 返回退出码, 超时或出错返回None"""
+        raise NotImplementedError
+
+    def open_checker(self, spj_dir:str, command:str, language_name:str, timeout:float) -> Checker:
+        """常驻checker, 工作目录与run_checker相同"""
+        raise NotImplementedError
+
+class DockerSandbox(Sandbox):
+    """docker后端: POOL_ENABLED时在预热容器中exec, 否则为每次运行单独创建容器"""
+    name = "docker"
+
+    def environment(self, language_name:str, compile_cmd:str) -> str:
+        return image_digest(DOCKER_IMAGE[language_name])
+
+    def compile(self, work_dir:str, language_name:str, compile_cmd:str, memory_limit:int):
+        """COMPILE_SERVER_LANGUAGES中的语言优先交给常驻编译服务, 不可用时单独创建容器编译"""
+        if COMPILE_SERVER_ENABLED and language_name in COMPILE_SERVER_LANGUAGES:
+            try:
+                with metrics.timed("compile_seconds", language=language_name, backend="server"):
+                    status, diagnostics = compile_service.compile(work_dir, language_name, compile_cmd, memory_limit * 2)
+            except compile_service.CompileServerError:
+                metrics.count("compile_server_fallbacks_total", language=language_name)
+            else:
+                if status is None:
+                    raise CompileError("Compilation timed out.")
+                if status != 0:
+                    raise CompileError(diagnostics)
+                return
+
+        with metrics.timed("compile_seconds", language=language_name, backend="container"):
+            self._compile_in_container(work_dir, language_name, compile_cmd, memory_limit)
+
+    def _compile_in_container(self, work_dir:str, language_name:str, compile_cmd:str, memory_limit:int):
+        try:
+            client.containers.run(
+                image=DOCKER_IMAGE[language_name],
+                command=compile_cmd,
+                volumes={work_dir: {'bind': '/app', 'mode': 'rw'}},
+                working_dir='/app',
+                network_disabled=True,
+                user='root',
+                mem_limit=f"{memory_limit * 2}m",
+                auto_remove=True,
+            )
+        except docker.errors.ContainerError as e:
+            raise CompileError(e.stderr.decode('utf-8', errors='ignore') if e.stderr else str(e))
+
+    def run_case(
+        self, work_dir:str, run_cmd:str, language_name:str,
+        input_file:str, time_limit:float, memory_limit:int,
+    ) -> Dict[str, Any]:
+        run = self._exec_in_pool if POOL_ENABLED else self._run_in_container
+        try:
+            return run(work_dir, run_cmd, language_name, input_file, time_limit, memory_limit)
+        except ReadTimeout:
+            # runner本身未能按时结束, 看门狗之外的兜底
+            return {
+                "status_code": 137, "time": time_limit, "memory": 0,
+                "timed_out": True, "limit": "wall", "stdout": "", "stderr": "",
+            }
+
+    def _single(self, run_cmd:str, input_file:str, time_limit:float, memory_limit:int) -> str:
+        """以单个测例的manifest启动runner的命令, 由runner的看门狗限制CPU与墙钟时间; input_file为容器内路径"""
+        manifest = {
+            "cmd": run_cmd, "time_limit": time_limit, "memory_limit": memory_limit,
+            "wall_limit": time_limit * WALL_LIMIT_FACTOR, "stop_on_failure": False,
+            "cases": [{"id": 0, "input": input_file}], **OUTPUT_OPTIONS, **DOCKER_OUTPUT,
+        }
+        return f"python3 {RUNNER_MOUNT}/runner.py --json {shlex.quote(json.dumps(manifest))}"
+
+    def _container_config(
+        self, box:Box, run_cmd:str, language_name:str,
+        input_file:str, time_limit:float, memory_limit:int,
+    ) -> Dict[str, Any]:
+        """与_run_in_container相同的容器配置, Engine API格式"""
+        memory = (memory_limit + RUNNER_MEMORY) * 1024 * 1024
+        return {
+            "Image": DOCKER_IMAGE[language_name],
+            "Cmd": shlex.split(self._single(run_cmd, input_file, time_limit, memory_limit)),
+            "WorkingDir": BOX_MOUNT,
+            "User": "root",
+            "NetworkDisabled": True,
+            "HostConfig": {
+                "Binds": [f"{host}:{volume['bind']}:{volume['mode']}" for host, volume in box.volumes().items()],
+                "Tmpfs": {"/tmp": "size=64m,mode=1777"},
+                "Memory": memory,
+                "MemorySwap": memory,
+            },
+        }
+
+    async def run_case_async(
+        self, engine, work_dir:str, run_cmd:str, language_name:str,
+        input_file:str, time_limit:float, memory_limit:int,
+    ) -> Dict[str, Any]:
+        """run_case的协程版本, 经Engine API为测例单独创建容器运行runner, engine为app.judger.engine.Engine"""
+        container_id = None
+        box = Box.temporary()
+        try:
+            box.add_dir(work_dir)
+            config = self._container_config(box, run_cmd, language_name, box.add(input_file), time_limit, memory_limit)
+            with _op("create", language_name):
+                container_id = await engine.create(config)
+            with _op("start", language_name):
+                await engine.start(container_id)
+            try:
+                with _op("wait", language_name):
+                    await engine.wait(container_id, timeout=time_limit * WALL_LIMIT_FACTOR + CONTAINER_GRACE)
+            except asyncio.TimeoutError:
+                return {
+                    "status_code": 137, "time": time_limit, "memory": 0,
+                    "timed_out": True, "limit": "wall", "stdout": "", "stderr": "",
+                }
+            with _op("logs", language_name):
+                return _keep_output(self._record(await engine.logs(container_id)), box.out, work_dir)
+        finally:
+            if container_id:
+                with _op("remove", language_name):
+                    await engine.remove(container_id)
+            box.destroy()
+
+    def _record(self, stdout:bytes) -> Dict[str, Any]:
+        records = list(iter_records([stdout]))
+        return records[0] if records else {"error": "Runner exited without a result."}
+
+    def _exec_in_pool(
+        self, work_dir:str, run_cmd:str, language_name:str,
+        input_file:str, time_limit:float, memory_limit:int,
+    ) -> Dict[str, Any]:
+        """在预热容器中通过exec以root启动runner运行测例, 测例本身降权为nobody"""
+        with get_pool(language_name).lease(memory_limit + RUNNER_MEMORY) as lease:
+            lease.box.add_dir(work_dir)
+            command = self._single(run_cmd, lease.box.add(input_file), time_limit, memory_limit)
+            with _op("exec", language_name):
+                _, stdout, _ = lease.exec_run(command, workdir=BOX_MOUNT, user="root")
+            return _keep_output(self._record(stdout), lease.box.out, work_dir)
+
+    def _run_in_container(
+        self, work_dir:str, run_cmd:str, language_name:str,
+        input_file:str, time_limit:float, memory_limit:int,
+    ) -> Dict[str, Any]:
+        """为测例单独创建docker, 同样由runner运行; wait的超时只是runner失控时的兜底"""
+        container = None
+        box = Box.temporary()
+        try:
+            box.add_dir(work_dir)
+            # 创建docker, 进行评测; 创建与启动分开以分别计时
+            with _op("create", language_name):
+                container = client.containers.create(
+                    image=DOCKER_IMAGE.get(language_name),
+                    command=self._single(run_cmd, box.add(input_file), time_limit, memory_limit),
+                    volumes=box.volumes(),
+                    working_dir=BOX_MOUNT,
+                    tmpfs={'/tmp': 'size=64m,mode=1777'},
+                    mem_limit=f"{memory_limit + RUNNER_MEMORY}m",
+                    memswap_limit=f"{memory_limit + RUNNER_MEMORY}m",
+                    network_disabled=True,
+                    user='root',
+                )
+            with _op("start", language_name):
+                container.start()
+
+            with _op("wait", language_name):
+                container.wait(timeout=time_limit * WALL_LIMIT_FACTOR + CONTAINER_GRACE)
+            with _op("logs", language_name):
+                return _keep_output(self._record(container.logs(stdout=True, stderr=False)), box.out, work_dir)
+        finally:
+            if container:
+                try:
+                    with _op("remove", language_name):
+                        container.remove(force=True)
+                except docker.errors.NotFound:
+                    pass
+            box.destroy()
+
+    def _fill_batch(self, box:Box, work_dir:str, manifest:Dict[str, Any]):
+        """放入程序文件与各测例的输入, 写入以容器内路径表示的manifest"""
+        box.add_dir(work_dir)
+        cases = [dict(case, input=box.add(case["input"])) for case in manifest["cases"]]
+        box.write("manifest.json", json.dumps(dict(manifest, cases=cases, **DOCKER_OUTPUT)).encode())
+
+    def run_batch(self, work_dir:str, language_name:str, manifest:Dict[str, Any], memory_limit:int) -> Iterator[Dict[str, Any]]:
+        # runner本身与预加载模块的内存
+        memory_limit += RUNNER_MEMORY + (PYTHON_ZYGOTE_MEMORY if manifest.get("zygote") else 0)
+
+        if POOL_ENABLED:
+            with get_pool(language_name).lease(memory_limit) as lease:
+                self._fill_batch(lease.box, work_dir, manifest)
+                chunks = lease.exec_stream(f"python3 {RUNNER_MOUNT}/runner.py manifest.json", workdir=BOX_MOUNT, user="root")
+                try:
+                    for record in iter_records(chunks):
+                        yield _keep_output(record, lease.box.out, work_dir)
+                except GeneratorExit:
+                    # 评测端提前终止(stop_on_first_failure), 杀死仍在运行的runner后再归还容器
+                    lease.interrupt()
+                    raise
+            return
+
+        container = None
+        box = Box.temporary()
+        try:
+            self._fill_batch(box, work_dir, manifest)
+            with _op("create", language_name):
+                container = client.containers.create(
+                    image=DOCKER_IMAGE.get(language_name),
+                    command=f"python3 {RUNNER_MOUNT}/runner.py manifest.json",
+                    volumes=box.volumes(),
+                    working_dir=BOX_MOUNT,
+                    tmpfs={'/tmp': 'size=64m,mode=1777'},
+                    mem_limit=f"{memory_limit}m",
+                    memswap_limit=f"{memory_limit}m",
+                    network_disabled=True,
+                    user='root',
+                )
+            with _op("start", language_name):
+                container.start()
+            for record in iter_records(container.logs(stdout=True, stderr=False, stream=True, follow=True)):
+                yield _keep_output(record, box.out, work_dir)
+        finally:
+            if container:
+                try:
+                    with _op("remove", language_name):
+                        container.remove(force=True)
+                except docker.errors.NotFound:
+                    pass
+            box.destroy()
+
+    def run_checker(self, spj_dir:str, command:str, files:List[str], language_name:str, timeout:float) -> Optional[int]:
+        if POOL_ENABLED:
+            # 在预热容器中执行checker
+            try:
+                with get_pool(language_name).lease(memory_limit=SPJ_MEMORY) as lease:
+                    lease.box.add_dir(spj_dir)
+                    args = " ".join(_fill(lease.box, files))
+                    status_code, _, _ = lease.exec_run(f"timeout -s KILL {timeout} {command} {args}", workdir=BOX_MOUNT)
+                return status_code
+            except Exception as e:
+                return None
+
+        container = None
+        box = Box.temporary()
+        try:
+            box.add_dir(spj_dir)
+            args = " ".join(_fill(box, files))
+            # 创建docker评测
+            container = client.containers.run(
+                image=DOCKER_IMAGE[language_name],
+                command=f"{command} {args}",
+                volumes=box.volumes(),
+                working_dir=BOX_MOUNT,
+                mem_limit=f"{SPJ_MEMORY}m",
+                network_disabled=True,
+                user='nobody',
+                detach=True
+            )
+            result_info = container.wait(timeout=timeout)
+            return result_info.get('StatusCode', -1)
+        except Exception as e:
+            return None
+        finally:
+            if container:
+                try:
+                    container.remove(force=True)
+                except:
+                    pass
+            box.destroy()
+
+    def open_checker(self, spj_dir:str, command:str, language_name:str, timeout:float) -> Checker:
+        return _DockerChecker(spj_dir, command, language_name, timeout)
+
+class _DockerChecker(Checker):
+    """在预热容器(或单独创建的常驻容器)中exec checker, 通过attach的socket读写; 每个测例的文件放入容器的box"""
+    def __init__(self, spj_dir:str, command:str, language_name:str, timeout:float):
+        super().__init__(timeout)
+        self.spj_dir = spj_dir
+        self.command = command
+        self.language_name = language_name
+        self.stack = None
+        self.lease = None
+        self.box = None
+        self.sock = None
+        self.frame = b""
+
+    def _container(self):
+        if POOL_ENABLED:
+            self.lease = self.stack.enter_context(get_pool(self.language_name).lease(memory_limit=SPJ_MEMORY))
+            self.box = self.lease.box
+            return self.lease.container
+        self.box = Box.temporary()
+        self.stack.callback(self.box.destroy)
+        with _op("create", self.language_name):
+            container = client.containers.run(
+                image=DOCKER_IMAGE[self.language_name],
+                command="sleep infinity",
+                volumes=self.box.volumes(),
+                mem_limit=f"{SPJ_MEMORY}m",
+                network_disabled=True,
+                user='nobody',
+                detach=True,
+            )
+        self.stack.callback(container.remove, force=True)
+        return container
+
+    def _start(self):
+        self.stack = ExitStack()
+        try:
+            container = self._container()
+            self.box.add_dir(self.spj_dir)
+            exec_id = client.api.exec_create(
+                container.id, self.command, stdin=True, stdout=True, stderr=False,
+                user="nobody", workdir=BOX_MOUNT,
+            )["Id"]
+            sock = client.api.exec_start(exec_id, socket=True)
+            self.sock = getattr(sock, "_sock", sock)
+        except BaseException:
+            self.stack.close()
+            raise
+
+    def _place(self, files:List[str]) -> List[str]:
+        return _fill(self.box, files)
+
+    def _send(self, data:bytes):
+        self.sock.sendall(data)
+
+    def _receive(self, timeout:float) -> bytes:
+        """解析多路复用帧(8字节头), 返回一帧stdout"""
+        self.sock.settimeout(timeout)
+        while True:
+            while len(self.frame) < 8 or len(self.frame) < 8 + int.from_bytes(self.frame[4:8], "big"):
+                chunk = self.sock.recv(65536)
+                if not chunk:
+                    return b""
+                self.frame += chunk
+            size = int.from_bytes(self.frame[4:8], "big")
+            stream, payload, self.frame = self.frame[0], self.frame[8:8 + size], self.frame[8 + size:]
+            if stream == 1:
+                return payload
+
+    def _stop(self):
+        try:
+            self.sock.close()
+            if self.lease is not None:
+                # 杀死仍在运行的checker后再归还容器
+                self.lease.interrupt()
+        finally:
+            self.frame = b""
+            self.lease = None
+            self.box = None
+            self.stack.close()
+
+class LocalSandbox(Sandbox):
+    """本地后端: 直接在本机以子进程运行, 复用runner的资源限制与计时; 没有cgroup, 内存以RLIMIT_AS兜底"""
+    name = "local"
+
+    def environment(self, language_name:str, compile_cmd:str) -> str:
+        """编译器的路径与修改时间, 编译器升级后编译缓存自然失效"""
+        compiler = shutil.which(shlex.split(compile_cmd)[0]) or compile_cmd
+        mtime = os.stat(compiler).st_mtime_ns if os.path.exists(compiler) else 0
+        return f"local:{compiler}:{mtime}"
+
+    def _private_dir(self) -> str:
+        """测例私有的临时目录, runner降权到nobody后仍可写"""
+        tmp_dir = tempfile.mkdtemp(prefix="oj-")
+        os.chmod(tmp_dir, 0o777)
+        return tmp_dir
+
+    def compile(self, work_dir:str, language_name:str, compile_cmd:str, memory_limit:int):
+        try:
+            with metrics.timed("compile_seconds", language=language_name, backend="local"):
+                result = subprocess.run(
+                    shlex.split(compile_cmd), cwd=work_dir, capture_output=True, timeout=LOCAL_COMPILE_TIMEOUT,
+                )
+        except subprocess.TimeoutExpired:
+            raise CompileError("Compilation timed out.")
+        if result.returncode != 0:
+            raise CompileError((result.stderr or result.stdout).decode('utf-8', errors='ignore'))
+
+    def run_case(
+        self, work_dir:str, run_cmd:str, language_name:str,
+        input_file:str, time_limit:float, memory_limit:int,
+    ) -> Dict[str, Any]:
+        tmp_dir = self._private_dir()
+        try:
+            record = runner.run_case(
+                shlex.split(run_cmd), {"id": 0, "input": input_file}, time_limit, memory_limit,
+                output_dir=tmp_dir, tmp_dir=tmp_dir, keep_output=True, cwd=work_dir,
+                isolate_network=LOCAL_ISOLATE_NETWORK, address_space=memory_limit * 2,
+                wall_limit=time_limit * WALL_LIMIT_FACTOR, **OUTPUT_OPTIONS,
+            )
+            return _keep_output(record, tmp_dir, work_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def run_batch(self, work_dir:str, language_name:str, manifest:Dict[str, Any], memory_limit:int) -> Iterator[Dict[str, Any]]:
+        tmp_dir = self._private_dir()
+        manifest = dict(
+            manifest, output_dir=tmp_dir, tmp_dir=tmp_dir, keep_output=True,
+            isolate_network=LOCAL_ISOLATE_NETWORK, address_space=memory_limit * 2,
+        )
+        with open(os.path.join(work_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+
+        proc = subprocess.Popen([sys.executable, runner.__file__, "manifest.json"], cwd=work_dir, stdout=subprocess.PIPE)
+        try:
+            for record in iter_records(iter(partial(proc.stdout.read1, 65536), b"")):
+                yield _keep_output(record, tmp_dir, work_dir)
+        finally:
+            if proc.poll() is None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+            proc.stdout.close()
+            proc.wait()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def run_checker(self, spj_dir:str, command:str, files:List[str], language_name:str, timeout:float) -> Optional[int]:
+        try:
+            return subprocess.run(
+                shlex.split(command) + files, cwd=spj_dir, timeout=timeout,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ).returncode
+        except (subprocess.TimeoutExpired, OSError):
+            return None
+
+    def open_checker(self, spj_dir:str, command:str, language_name:str, timeout:float) -> Checker:
+        return _LocalChecker(spj_dir, command, timeout)
+
+class _LocalChecker(Checker):
+    """本机子进程checker, 通过管道读写"""
+    def __init__(self, spj_dir:str, command:str, timeout:float):
+        super().__init__(timeout)
+        self.spj_dir = spj_dir
+        self.command = command
+        self.proc = None
+
+    def _start(self):
+        self.proc = subprocess.Popen(
+            shlex.split(self.command), cwd=self.spj_dir,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+
+    def _send(self, data:bytes):
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def _receive(self, timeout:float) -> bytes:
+        fd = self.proc.stdout.fileno()
+        if not select.select([fd], [], [], timeout)[0]:
+            raise TimeoutError()
+        return os.read(fd, 65536)
+
+    def _stop(self):
+        self.proc.kill()
+        self.proc.wait()
+        self.proc.stdin.close()
+        self.proc.stdout.close()
+        self.proc = None
+
+_SANDBOXES:Dict[str, Sandbox] = {"docker": DockerSandbox(), "local": LocalSandbox()}
+
+def get_sandbox(language_name:str) -> Sandbox:
+    """语言对应的执行后端, 未配置时使用docker"""
+    return _SANDBOXES[SANDBOX_BACKEND.get(language_name, "docker")]
@@ -0,0 +1,25 @@
+import ast
+import traceback
+from typing import Optional, Tuple
+
+from app.judger.config import PYTHON_FEATURE_VERSION, SYNTAX_CHECK_MAX_BYTES
+
+"""
+提交时的语法检查: Python代码在本进程中解析并编译为字节码(不执行), 语法错误可直接判为CE, 不必进入评测队列
+按评测镜像中的Python版本解析; 解析得到的语法树可交给PDGBuilder复用
+"""
+
+def check_python(code:str) -> Tuple[Optional[ast.AST], Optional[str]]:
+    """返回 (语法树, None), 语法错误时返回 (None, 与解释器一致的错误信息)
+    代码超过SYNTAX_CHECK_MAX_BYTES, 或递归过深等解析器自身的失败不作结论, 返回 (None, None) 交给评测"""
+    if len(code.encode("utf-8", errors="surrogatepass")) > SYNTAX_CHECK_MAX_BYTES:
+        return None, None
+    try:
+        tree = ast.parse(code, filename="main.py", feature_version=PYTHON_FEATURE_VERSION)
+        # 符号表阶段的错误(如函数外的return)只在编译时报告
+        compile(tree, "main.py", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        return None, "".join(traceback.format_exception_only(type(e), e))
+    except (ValueError, RecursionError, MemoryError):
+        return None, None
+    return tree, None
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+from typing import Tuple
+
+from app.db import blob
+from app.db.models import ProblemModel
+from app.db.db_problem import compute_data_version
+from app.judger.config import DATA_BASE, ANSWER_BASE
+
+"""
+测试数据存储: 内容来自blob存储, 每个数据版本落盘一次, 所有提交共用
+输入与答案分开存放: _data/<version>/01.in 与 _answers/<version>/01.ans
+评测时只把本次运行的输入放入沙箱, 答案只在本机比对(spj的box除外), 答案目录仅本机评测进程可读
+"""
+os.makedirs(DATA_BASE, exist_ok=True)
+os.chmod(DATA_BASE, 0o711)
+os.makedirs(ANSWER_BASE, exist_ok=True)
+os.chmod(ANSWER_BASE, 0o700)
+
+def case_files(index:int) -> Tuple[str, str]:
+    """第index个测例(从1开始)的输入, 答案文件名"""
+    return f"{index:02d}.in", f"{index:02d}.ans"
+
+def ensure_version(db, problem:ProblemModel) -> str:
+    """获取题目的数据版本, 旧数据没有版本时补算并保存"""
+    if not problem.data_version:
+        problem.data_version = compute_data_version(
+            [{"input": case.input, "output": case.output} for case in problem.testcases]
+        )
+        db.commit()
+    return problem.data_version
+
+def materialize(db, problem:ProblemModel) -> Tuple[str, str]:
+    """将题目测试数据写入版本目录, 已存在则直接复用, 返回 (输入目录, 答案目录)"""
+    data_version = ensure_version(db, problem)
+    input_dir = os.path.join(DATA_BASE, data_version)
+    answer_dir = os.path.join(ANSWER_BASE, data_version)
+    if os.path.isdir(answer_dir) and os.path.isdir(input_dir):
+        return input_dir, answer_dir
+    if os.path.isdir(input_dir):
+        # 答案总是先于输入就位, 只有输入目录的是答案与输入同目录的旧版本, 重新生成
+        shutil.rmtree(input_dir, ignore_errors=True)
+
+    tmp_input = tempfile.mkdtemp(dir=DATA_BASE, prefix=".tmp-")
+    tmp_answer = tempfile.mkdtemp(dir=ANSWER_BASE, prefix=".tmp-")
+    for i, case in enumerate(problem.testcases):
+        input_filename, answer_filename = case_files(i + 1)
+        # 直接由blob存储解压到文件, 不经过ORM属性读入内存
+        blob.copy_to(case.input_hash, os.path.join(tmp_input, input_filename))
+        blob.copy_to(case.output_hash, os.path.join(tmp_answer, answer_filename))
+    os.chmod(tmp_input, 0o755)
+    for tmp_dir, target in ((tmp_answer, answer_dir), (tmp_input, input_dir)):
+        try:
+            os.rename(tmp_dir, target)
+        except OSError:
+            # 其他进程已写入同一版本
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return input_dir, answer_dir
+
+def remove_version(data_version:str):
+    """删除不再使用的数据版本"""
+    shutil.rmtree(os.path.join(DATA_BASE, data_version), ignore_errors=True)
+    shutil.rmtree(os.path.join(ANSWER_BASE, data_version), ignore_errors=True)
@@ -0,0 +1,117 @@
+import os
+import time
+import socket
+import signal
+import argparse
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from app.db import db_judge_job
+from app.db.database import SessionLocal, Base, engine
+from app.db.models import StatusCategory, JudgeJobStatusCategory
+from app.judger.config import (
+    WORKDIR_BASE, WORKER_CONCURRENCY, WORKER_MAX_JOBS_PER_PROCESS, WORKER_POLL_INTERVAL, JOB_LEASE_SECONDS, REJUDGE_CONCURRENCY,
+)
+from app.judger import metrics
+from app.judger.judge import _collect, _error
+
+"""评测守护进程: python -m app.judger.worker, 从评测任务表中领取任务, 在常驻的评测进程中有界并发地执行
+评测进程以spawn启动, 不继承守护进程的数据库连接; 依次评测多个提交, 免去每个提交启动进程与导入模块的开销"""
+
+class Worker:
+    def __init__(self, concurrency:int=WORKER_CONCURRENCY, lease_seconds:float=JOB_LEASE_SECONDS):
+        self.name = f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.running:Dict[int, Tuple[int, Future]] = {}
+        self.stopping = False
+        self.executor:Optional[ProcessPoolExecutor] = None
+
+    def _submit(self, submission_id:int) -> Future:
+        """在评测进程池中评测提交; 有评测进程异常退出后整个池不可用, 重新创建"""
+        if self.executor is not None:
+            try:
+                return self.executor.submit(_collect, submission_id)
+            except BrokenProcessPool:
+                self.executor.shutdown(wait=False)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.concurrency, mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=WORKER_MAX_JOBS_PER_PROCESS,
+        )
+        return self.executor.submit(_collect, submission_id)
+
+    def _fail(self, submission_id:int, err_msg:str):
+        """任务彻底失败, 将提交标记为系统错误"""
+        work_dir = os.path.join(WORKDIR_BASE, str(submission_id))
+        _error(submission_id, StatusCategory.UNK, work_dir, err_msg=err_msg)
+
+    def _reap(self, db):
+        """回收结束的评测, 提交任务结果; 评测进程异常退出时池中其他进程也被终止, 这些任务一并重新排队"""
+        for job_id, (submission_id, future) in list(self.running.items()):
+            if not future.done():
+                continue
+            error = future.exception()
+            success = error is None
+            err_msg = "" if success else f"Judge process failed: {error!r}"
+            db_job = db_judge_job.finish(db=db, job_id=job_id, success=success, err_msg=err_msg)
+            if db_job is not None and db_job.state == JudgeJobStatusCategory.FAILED:
+                self._fail(submission_id, err_msg)
+            del self.running[job_id]
+
+    def _heartbeat(self, db):
+        for job_id in self.running:
+            db_judge_job.heartbeat(db=db, job_id=job_id, lease_seconds=self.lease_seconds)
+
+    def _dispatch(self, db):
+        """在并发上限内领取新任务"""
+        while not self.stopping and len(self.running) < self.concurrency:
+            db_job = db_judge_job.claim(
+                db=db, worker=self.name, lease_seconds=self.lease_seconds, background_limit=REJUDGE_CONCURRENCY
+            )
+            if db_job is None:
+                return
+            if db_job.attempts == 1:
+                # heartbeat_at即领取时间; 重试的任务不计入排队等待
+                language = db_job.submission.language
+                metrics.observe(
+                    "judge_queue_wait_seconds", max(0.0, (db_job.heartbeat_at - db_job.created_at).total_seconds()),
+                    language=language.name if language else "",
+                )
+            self.running[db_job.id] = (db_job.submission_id, self._submit(db_job.submission_id))
+
+    def run_forever(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        Base.metadata.create_all(bind=engine)
+
+        try:
+            while not self.stopping or self.running:
+                db = SessionLocal()
+                try:
+                    for db_job in db_judge_job.reclaim_expired(db=db):
+                        self._fail(db_job.submission_id, db_job.err_msg)
+                    self._reap(db)
+                    self._heartbeat(db)
+                    self._dispatch(db)
+                finally:
+                    db.close()
+                    metrics.flush()
+                time.sleep(WORKER_POLL_INTERVAL)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+
+    def stop(self, *args):
+        """停止领取新任务, 等待已领取的任务完成后退出"""
+        self.stopping = True
+
+def main():
+    parser = argparse.ArgumentParser(description="OJ judge worker")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="同时评测的提交数")
+    args = parser.parse_args()
+    Worker(concurrency=args.concurrency).run_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import ast
+from typing import Optional
 from collections import defaultdict
 
 from app.plagiarism.build_cfg import CFGBuilder, BasicBlock
@@ -6,14 +7,15 @@ from app.plagiarism.get_cano_hash import get_cano_hash
 
 class PDGBuilder:
     """PDG构建器基类"""
-    def __init__(self, code: str):
+    def __init__(self, code: str, tree: Optional[ast.AST] = None):
         self.code = code
+        self.tree = tree
         self.pdg = {"nodes": [], "edges": [], "hashed_nodes": {}}
         # self.cfg = None
 
     def build(self):
         # 1. Code -> AST
-        ast_tree = ast.parse(self.code)
+        ast_tree = self.tree if self.tree is not None else ast.parse(self.code)
 
         # 2. AST -> CFG
         cfg_builder = CFGBuilder()
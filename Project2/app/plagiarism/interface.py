@@ -1,17 +1,19 @@
 import multiprocessing
 from concurrent.futures import ProcessPoolExecutor, as_completed
 import json
+import ast
+from typing import Optional
 
 from app.plagiarism.get_report import get_report
 from app.plagiarism.build_pdg import PDGBuilder
 from app.db.database import SessionLocal
 from app.db.models import SubmissionModel, PlagiarismTaskModel
 
-def build(submission_id:int):
-    """构建PDG"""
+def build(submission_id:int, tree:Optional[ast.AST]=None):
+    """构建PDG, 已解析过代码时可传入语法树"""
     db = SessionLocal()
     db_submission = db.get(SubmissionModel, submission_id)
-    builder = PDGBuilder(db_submission.code)
+    builder = PDGBuilder(db_submission.code, tree=tree)
     pdg = builder.build()
     db_submission.pdg = pdg
     db.commit()
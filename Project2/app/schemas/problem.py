@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel, Field, ConfigDict, computed_field
 
@@ -31,8 +32,10 @@ class ProblemBase(BaseModel):
     
     # 特殊评测
     judge_mode:str = Field("standard", description="评测策略")
+    judge_policy:str = Field("full", description="评测方式: full运行全部测例, stop_on_first_failure首个失败后跳过其余测例")
     spj_code:Optional[str] = Field(None, description="SPJ脚本代码")
     spj_language_name:Optional[str] = Field(None, description="SPJ脚本语言")
+    spj_protocol:str = Field("exec", description="SPJ调用方式: exec每个测例运行一次并以退出码判定, stream常驻进程逐行读入测例路径并输出得分")
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -59,6 +62,23 @@ class ProblemLogVisibilityResponse(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class ProblemJudgePolicyResponse(BaseModel):
+    problem_id:str = Field(..., description="题目唯一标识")
+    judge_policy:str = Field(..., description="评测方式")
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ProblemRejudgeResponse(BaseModel):
+    problem_id:str = Field(..., description="题目唯一标识")
+    batch_id:str = Field(..., description="批量重测任务标识")
+    total:int = Field(..., description="重测的提交数")
+
+class ProblemRejudgeProgressResponse(ProblemRejudgeResponse):
+    queued:int = Field(0, description="排队中")
+    running:int = Field(0, description="评测中")
+    done:int = Field(0, description="已完成")
+    failed:int = Field(0, description="失败")
+
 """Payload"""
 class ProblemAddPayload(ProblemBase):
     problem_id:str = Field(..., validation_alias="id", description="题目唯一标识")
@@ -67,4 +87,13 @@ class ProblemSetLogVisibilityPayload(BaseModel):
     public_cases:bool = Field(..., description="是否允许所有用户查看测例详情")
 
 class ProblemSetJudgeModePayload(BaseModel):
-    judge_mode:str = Field("standard", description="评测策略")
\ No newline at end of file
+    judge_mode:str = Field("standard", description="评测策略")
+
+class ProblemSetJudgePolicyPayload(BaseModel):
+    judge_policy:str = Field("full", description="评测方式")
+
+class ProblemRejudgePayload(BaseModel):
+    status:Optional[str] = Field(None, description="按评测状态筛选: pending, success, error")
+    language_name:Optional[str] = Field(None, description="按语言筛选")
+    submitted_after:Optional[datetime] = Field(None, description="提交时间不早于")
+    submitted_before:Optional[datetime] = Field(None, description="提交时间早于")
@@ -47,6 +47,8 @@ class SubmissionResultResponse(BaseModel):
     status:str = Field(..., description="评测状态")
     score:int = Field(..., description="得分")
     counts:int = Field(..., description="总分数")
+    cases_done:int = Field(0, description="已完成测例数")
+    cases_total:int = Field(0, description="测例总数")
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -55,6 +57,8 @@ class SubmissionResultWithIDResponse(BaseModel):
     status:str = Field(..., description="评测状态")
     score:int = Field(..., description="得分")
     counts:int = Field(..., description="总分数")
+    cases_done:int = Field(0, description="已完成测例数")
+    cases_total:int = Field(0, description="测例总数")
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -0,0 +1,81 @@
+"""
+单个测例的固定开销微基准: 运行一个空程序, 比较
+  legacy: 单独创建容器, 运行结束后用 container.stats(stream=False) 查询内存(旧实现)
+  cold:   单独创建容器, 由容器内runner运行并给出时间和内存
+  pool:   在预热容器中exec runner运行
+  local:  本地后端, 本机子进程
+用法(在Project2目录下, 需要docker与评测镜像): python -m bench.case_overhead --runs 20
+"""
+import os
+import time
+import shutil
+import argparse
+import statistics
+from typing import Callable, List
+
+from app.judger.config import client, DOCKER_IMAGE, WORKDIR_BASE
+from app.judger.sandbox import DockerSandbox, LocalSandbox
+
+docker_sandbox = DockerSandbox()
+local_sandbox = LocalSandbox()
+
+def _legacy_run(work_dir:str, run_cmd:str, language_name:str, input_file:str, time_limit:float, memory_limit:int):
+    """旧实现: 运行结束后阻塞查询docker stats"""
+    container = client.containers.run(
+        image=DOCKER_IMAGE.get(language_name),
+        command=f"sh -c \"/usr/bin/time -f 'TIME:%U %S' {run_cmd} < {input_file}\"",
+        volumes={work_dir: {'bind': '/app', 'mode': 'ro'}},
+        working_dir='/app',
+        mem_limit=f"{memory_limit}m",
+        memswap_limit=f"{memory_limit}m",
+        network_disabled=True,
+        user='nobody',
+        detach=True
+    )
+    try:
+        container.wait(timeout=time_limit*1.2)
+        container.logs(stdout=True, stderr=False)
+        container.logs(stdout=False, stderr=True)
+        container.stats(stream=False).get("memory_stats", {}).get("max_usage", 0)
+    finally:
+        container.remove(force=True)
+
+def _measure(run:Callable, runs:int, work_dir:str, input_file:str) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run(work_dir, "python3 main.py", "python", input_file, 1.0, 128)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def _report(name:str, samples:List[float]):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{name:<8} mean {statistics.mean(samples)*1000:8.1f} ms  p50 {statistics.median(samples)*1000:8.1f} ms  p95 {p95*1000:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="per-case overhead micro-benchmark")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    work_dir = os.path.join(WORKDIR_BASE, "_bench_case_overhead")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        with open(os.path.join(work_dir, "main.py"), "w") as f:
+            f.write("pass\n")
+        with open(os.path.join(work_dir, "empty.in"), "w") as f:
+            f.write("")
+        input_file = os.path.join(work_dir, "empty.in")
+
+        # 预热: 拉起容器池, 排除首次创建的耗时
+        docker_sandbox._exec_in_pool(work_dir, "python3 main.py", "python", input_file, 1.0, 128)
+
+        _report("legacy", _measure(_legacy_run, args.runs, work_dir, "/app/empty.in"))
+        _report("cold", _measure(docker_sandbox._run_in_container, args.runs, work_dir, input_file))
+        _report("pool", _measure(docker_sandbox._exec_in_pool, args.runs, work_dir, input_file))
+        _report("local", _measure(local_sandbox.run_case, args.runs, work_dir, input_file))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+评测吞吐基准: 以 assignment/ 中的程序构造题目与提交, 并发地走完整评测流程(_collect), 报告
+  各阶段耗时分位数: compile, sandbox_start, run, case_overhead, check, db_write, total
+  每秒完成的提交数与测例数
+结果追加到 bench/judge/history.jsonl, 并与上一次记录比较
+用法(在Project2目录下, 需要docker与评测镜像): python -m bench.judge --submissions 40 --concurrency 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from app.db import db_problem
+from app.db.database import SessionLocal, Base, engine
+from app.db.models import UserModel, LanguageModel, ProblemModel, SubmissionModel
+from app.schemas.problem import ProblemAddPayload
+from app.api.utils.data import seed_ini_data
+from app.judger import metrics
+from app.judger.config import BATCH_ENABLED, POOL_ENABLED, SANDBOX_BACKEND, CASE_WORKERS
+from app.judger.judge import _collect
+from bench.judge.workload import load, Program
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), "history.jsonl")
+PROBLEM_PREFIX = "bench-"
+PHASES = ("compile", "sandbox_start", "run", "case_overhead", "check", "db_write", "total")
+QUANTILES = (0.5, 0.9, 0.99)
+
+def _setup(programs:List[Program]) -> Dict[str, int]:
+    """为每个程序建立一道题目, 返回 程序名 -> 题目内部id"""
+    with SessionLocal() as db:
+        problem_ids = {}
+        for program in programs:
+            problem_id = PROBLEM_PREFIX + program.name
+            db_problem.delete_problem(db=db, problem_id=problem_id)
+            payload = ProblemAddPayload(
+                id=problem_id, title=program.name, description="", input_description="",
+                output_description="", samples=[], constraints="",
+                testcases=[{"input": i, "output": o} for i, o in zip(program.inputs, program.outputs)],
+                time_limit=2.0, memory_limit=256,
+            )
+            problem_ids[program.name] = db_problem.add_problem(db=db, problem=payload).id
+        return problem_ids
+
+def _submit(programs:List[Program], problem_ids:Dict[str, int], count:int) -> List[int]:
+    """轮流为各题目建立提交; 不进入评测队列, 由本脚本直接评测"""
+    with SessionLocal() as db:
+        admin = db.query(UserModel).filter(UserModel.username == "admin").first()
+        python = db.query(LanguageModel).filter(LanguageModel.name == "python").first()
+        submissions = []
+        for i in range(count):
+            program = programs[i % len(programs)]
+            submissions.append(SubmissionModel(
+                code=program.code, _problem_id=problem_ids[program.name], user_id=admin.id, language_id=python.id
+            ))
+        db.add_all(submissions)
+        db.commit()
+        return [submission.id for submission in submissions]
+
+def _cleanup(problem_ids:Dict[str, int]):
+    with SessionLocal() as db:
+        db.query(SubmissionModel).filter(SubmissionModel._problem_id.in_(problem_ids.values())).delete(synchronize_session=False)
+        db.commit()
+        for problem in db.query(ProblemModel).filter(ProblemModel.id.in_(problem_ids.values())).all():
+            db_problem.delete_problem(db=db, problem_id=problem.problem_id)
+
+def _judge(submission_id:int):
+    """与评测守护进程一致, 每个提交在独立进程中评测"""
+    process = multiprocessing.Process(target=_collect, args=(submission_id,))
+    process.start()
+    process.join()
+
+def _diff(before:Dict[str, Any], after:Dict[str, Any]) -> Dict[str, Any]:
+    """两次快照之间新增的直方图计数"""
+    histograms = {}
+    for key, histogram in after["histograms"].items():
+        old = before["histograms"].get(key, {"buckets": [0] * len(histogram["buckets"]), "sum": 0.0, "count": 0})
+        histograms[key] = {
+            "buckets": [a - b for a, b in zip(histogram["buckets"], old["buckets"])],
+            "sum": histogram["sum"] - old["sum"],
+            "count": histogram["count"] - old["count"],
+        }
+    return histograms
+
+def _phases(histograms:Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    phases = {}
+    for phase in PHASES:
+        histogram = metrics.select(histograms, "judge_phase_seconds", phase=phase)
+        if not histogram["count"]:
+            continue
+        phases[phase] = {"count": histogram["count"], "mean": histogram["sum"] / histogram["count"]}
+        for q in QUANTILES:
+            phases[phase][f"p{int(q * 100)}"] = metrics.quantile(histogram, q)
+    return phases
+
+def _verdicts(submission_ids:List[int]) -> Dict[str, int]:
+    with SessionLocal() as db:
+        verdicts:Dict[str, int] = {}
+        for submission in db.query(SubmissionModel).filter(SubmissionModel.id.in_(submission_ids)).all():
+            verdicts[submission.status.value] = verdicts.get(submission.status.value, 0) + 1
+        return verdicts
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def _previous() -> Optional[Dict[str, Any]]:
+    if not os.path.exists(HISTORY_PATH):
+        return None
+    with open(HISTORY_PATH) as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+def _regressions(previous:Dict[str, Any], entry:Dict[str, Any], tolerance:float) -> List[str]:
+    """吞吐下降或阶段p50上升超过tolerance比例"""
+    found = []
+    old, new = previous["results"], entry["results"]
+    if new["submissions_per_second"] < old["submissions_per_second"] * (1 - tolerance):
+        found.append(f"submissions/s {old['submissions_per_second']:.2f} -> {new['submissions_per_second']:.2f}")
+    for phase, stats in new["phases"].items():
+        old_stats = old["phases"].get(phase)
+        if old_stats and stats["p50"] > old_stats["p50"] * (1 + tolerance):
+            found.append(f"{phase} p50 {old_stats['p50']*1000:.1f} ms -> {stats['p50']*1000:.1f} ms")
+    return found
+
+def _report(entry:Dict[str, Any]):
+    results = entry["results"]
+    print(f"{results['submissions']} submissions, {results['cases']} cases in {results['elapsed']:.2f} s")
+    print(f"throughput {results['submissions_per_second']:.2f} submissions/s, {results['cases_per_second']:.2f} cases/s")
+    for phase, stats in results["phases"].items():
+        print(
+            f"{phase:<14} n {stats['count']:6d}  mean {stats['mean']*1000:8.1f} ms  "
+            + "  ".join(f"p{int(q*100)} {stats[f'p{int(q*100)}']*1000:8.1f} ms" for q in QUANTILES)
+        )
+    print("verdicts " + ", ".join(f"{k}: {v}" for k, v in sorted(results["verdicts"].items())))
+
+def main():
+    parser = argparse.ArgumentParser(description="judge throughput benchmark")
+    parser.add_argument("--submissions", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="regression threshold, as a fraction")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--no-history", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="keep bench problems and submissions")
+    args = parser.parse_args()
+
+    programs = load()
+    if not programs:
+        sys.exit("no runnable program under assignment/")
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        seed_ini_data(db)
+    problem_ids = _setup(programs)
+    try:
+        submission_ids = _submit(programs, problem_ids, args.submissions)
+        cases = sum(len(programs[i % len(programs)].inputs) for i in range(args.submissions))
+
+        before = metrics.snapshot()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(_judge, submission_ids))
+        elapsed = time.perf_counter() - start
+        histograms = _diff(before, metrics.snapshot())
+
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "config": {
+                "submissions": args.submissions, "concurrency": args.concurrency, "programs": len(programs),
+                "batch": BATCH_ENABLED, "pool": POOL_ENABLED, "backend": SANDBOX_BACKEND.get("python"),
+                "case_workers": CASE_WORKERS,
+            },
+            "results": {
+                "submissions": args.submissions, "cases": cases, "elapsed": elapsed,
+                "submissions_per_second": args.submissions / elapsed, "cases_per_second": cases / elapsed,
+                "phases": _phases(histograms), "verdicts": _verdicts(submission_ids),
+            },
+        }
+    finally:
+        if not args.keep:
+            _cleanup(problem_ids)
+
+    _report(entry)
+    previous = _previous()
+    if not args.no_history:
+        with open(HISTORY_PATH, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    if previous is None:
+        return
+    if previous["config"] != entry["config"]:
+        print("previous run used a different config, not compared")
+        return
+    regressions = _regressions(previous, entry, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import re
+import sys
+import glob
+import subprocess
+from dataclasses import dataclass
+from typing import List
+
+"""由 assignment/hw*/T*.py 构造评测负载: 每个程序作为一道题目的标准解, 也作为对这道题的提交"""
+ASSIGNMENT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "assignment")
+RUN_TIMEOUT = 5
+
+# 没有附带 .in 文件但需要读入的程序, 使用这里的输入
+SAMPLE_INPUTS = {
+    "hw1-T2": ["1 -3 2\n", "0 0 0\n", "1 2 5\n"],
+    "hw1-T3": ["hello world\nlow\n"],
+    "hw1-T4": ["5\n1 2 3 4 5\n6\n"],
+    "hw1-T5": ["6\n3\n1\n3\n2\n3\n1\n"],
+    "hw1-T6": ["abacdfgdcaba\n", "cbbd\n"],
+    "hw2-T1": ["3 0 6 1 5\n"],
+    "hw2-T2": ["someone@example.com\n", "not-an-address\n"],
+    "hw2-T3": ["3 4\na 1\nb 2\nc 3\nQ a\nD b\nA d 4\nQ b\n"],
+    "hw3-T1": ["1\n2 3\n1 0 1\n0 1 0\n"],
+    "hw3-T2": ["1 2 3\n4 5 6\n"],
+}
+
+@dataclass
+class Program:
+    name:str
+    code:str
+    inputs:List[str]
+    outputs:List[str]
+
+def _inputs(name:str, path:str) -> List[str]:
+    """T{k}.py 的输入为 T{k}.in 与 T{k}<数字>.in, 若 T{k}<数字>.py 存在则该输入归属于它
+    没有输入文件时使用 SAMPLE_INPUTS, 仍没有则为空输入"""
+    folder, stem = os.path.dirname(path), os.path.basename(path)[:-3]
+    files = []
+    for in_path in sorted(glob.glob(os.path.join(folder, f"{stem}*.in"))):
+        in_stem = os.path.basename(in_path)[:-3]
+        if in_stem == stem:
+            files.append(in_path)
+        elif re.fullmatch(re.escape(stem) + r"\d", in_stem) and not os.path.exists(os.path.join(folder, in_stem + ".py")):
+            files.append(in_path)
+    if not files:
+        return SAMPLE_INPUTS.get(name, [""])
+    result = []
+    for in_path in files:
+        with open(in_path) as f:
+            result.append(f.read())
+    return result
+
+def load(assignment_dir:str=ASSIGNMENT_DIR) -> List[Program]:
+    """加载全部程序, 在本机运行得到标准输出; 本机无法运行的程序(如缺少依赖)被跳过"""
+    programs = []
+    for path in sorted(glob.glob(os.path.join(assignment_dir, "hw*", "T*.py"))):
+        name = f"{os.path.basename(os.path.dirname(path))}-{os.path.basename(path)[:-3]}"
+        with open(path) as f:
+            code = f.read()
+        inputs, outputs = _inputs(name, path), []
+        for data in inputs:
+            try:
+                process = subprocess.run(
+                    [sys.executable, path], input=data, capture_output=True, text=True,
+                    timeout=RUN_TIMEOUT, cwd=os.path.dirname(path),
+                )
+            except subprocess.TimeoutExpired:
+                break
+            if process.returncode != 0:
+                break
+            outputs.append(process.stdout)
+        if len(outputs) == len(inputs):
+            programs.append(Program(name=name, code=code, inputs=inputs, outputs=outputs))
+        else:
+            print(f"skip {name}: failed to run locally", file=sys.stderr)
+    return programs
@@ -0,0 +1,17 @@
+from app.judger import metrics
+
+
+def test_metrics_prometheus_format(client):
+    """Test GET /api/metrics"""
+    metrics.observe("judge_phase_seconds", 0.02, phase="check", language="python", verdict="AC")
+    metrics.count("judge_submissions_total", language="python", verdict="AC")
+    metrics.flush()
+
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert "# TYPE judge_phase_seconds histogram" in text
+    assert "# TYPE judge_submissions_total counter" in text
+    assert 'judge_phase_seconds_bucket{language="python",le="+Inf",phase="check",verdict="AC"}' in text
+    assert 'judge_phase_seconds_count{language="python",phase="check",verdict="AC"}' in text
@@ -1,6 +1,6 @@
 import uuid
 
-from test_helpers import setup_user_session, reset_system, create_test_user, setup_admin_session
+from test_helpers import setup_user_session, reset_system, create_test_user, setup_admin_session, create_test_problem
 
 
 def test_get_problems_list(client):
@@ -156,3 +156,101 @@ def test_delete_problem(client):
     # Test non-existent problem
     response = client.delete("/api/problems/nonexistent")
     assert response.status_code == 404
+
+
+def test_set_judge_policy(client):
+    """Test PUT /api/problems/{problem_id}/judge_policy"""
+    reset_system(client)
+    setup_admin_session(client)
+
+    problem_id, _ = create_test_problem(client)
+
+    response = client.put(f"/api/problems/{problem_id}/judge_policy", json={"judge_policy": "stop_on_first_failure"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["code"] == 200
+    assert data["data"]["judge_policy"] == "stop_on_first_failure"
+
+    response = client.get(f"/api/problems/{problem_id}")
+    assert response.json()["data"]["judge_policy"] == "stop_on_first_failure"
+
+    # Invalid policy
+    response = client.put(f"/api/problems/{problem_id}/judge_policy", json={"judge_policy": "sometimes"})
+    assert response.status_code == 400
+
+    # Non-existent problem
+    response = client.put("/api/problems/nonexistent/judge_policy", json={"judge_policy": "full"})
+    assert response.status_code == 404
+
+def test_set_judge_mode(client):
+    """Test PUT /api/problems/{problem_id}/judge_mode with built-in checker modes"""
+    reset_system(client)
+    setup_admin_session(client)
+
+    problem_id, problem_data = create_test_problem(client)
+
+    for judge_mode in ("float:1e-4", "unordered", "nocase", "multiset", "standard"):
+        response = client.put(f"/api/problems/{problem_id}/judge_mode", json={"judge_mode": judge_mode})
+        assert response.status_code == 200
+        response = client.get(f"/api/problems/{problem_id}")
+        assert response.json()["data"]["judge_mode"] == judge_mode
+
+    # Invalid modes
+    for judge_mode in ("float:abc", "float:-1", "unordered:2", "sometimes"):
+        response = client.put(f"/api/problems/{problem_id}/judge_mode", json={"judge_mode": judge_mode})
+        assert response.status_code == 400
+
+    # Modes are validated on creation too
+    problem_data["id"] = "test_mode_" + uuid.uuid4().hex[:4]
+    problem_data["judge_mode"] = "float:1e-9"
+    response = client.post("/api/problems/", json=problem_data)
+    assert response.status_code == 200
+
+    problem_data["id"] = "test_mode_" + uuid.uuid4().hex[:4]
+    problem_data["judge_mode"] = "fuzzy"
+    response = client.post("/api/problems/", json=problem_data)
+    assert response.status_code == 400
+
+def test_rejudge_problem(client):
+    """Test POST /api/problems/{problem_id}/rejudge and GET /api/problems/{problem_id}/rejudge/{batch_id}"""
+    reset_system(client)
+    setup_admin_session(client)
+
+    problem_id, _ = create_test_problem(client)
+    for _ in range(2):
+        response = client.post("/api/submissions/", json={
+            "problem_id": problem_id,
+            "language": "python",
+            "code": "a, b = map(int, input().split())\nprint(a + b)",
+        })
+        assert response.status_code == 200
+
+    response = client.post(f"/api/problems/{problem_id}/rejudge", json={"language_name": "python"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["code"] == 200
+    assert data["data"]["total"] == 2
+    batch_id = data["data"]["batch_id"]
+
+    response = client.get(f"/api/problems/{problem_id}/rejudge/{batch_id}")
+    assert response.status_code == 200
+    progress = response.json()["data"]
+    assert progress["total"] == 2
+    assert progress["queued"] + progress["running"] + progress["done"] + progress["failed"] == 2
+
+    # The batch belongs to one problem only
+    other_problem_id, _ = create_test_problem(client)
+    response = client.get(f"/api/problems/{other_problem_id}/rejudge/{batch_id}")
+    assert response.status_code == 404
+    response = client.get(f"/api/problems/nonexistent/rejudge/{batch_id}")
+    assert response.status_code == 404
+
+    # Filters
+    response = client.post(f"/api/problems/{problem_id}/rejudge", json={"submitted_before": "2000-01-01T00:00:00Z"})
+    assert response.json()["data"]["total"] == 0
+
+    response = client.post(f"/api/problems/{problem_id}/rejudge", json={"status": "unknown"})
+    assert response.status_code == 400
+
+    response = client.post("/api/problems/nonexistent/rejudge", json={})
+    assert response.status_code == 404
@@ -1,7 +1,13 @@
 import uuid
 import time
 import pytest
+from types import SimpleNamespace
 from test_helpers import setup_admin_session, setup_user_session
+from app.db.database import SessionLocal
+from app.db.models import (
+    SubmissionModel, SubmissionStatusCategory, TestCaseResultModel, StatusCategory, JudgeJobModel, JudgeJobStatusCategory
+)
+from app.db.db_submission import verdict_key, set_status
 
 
 def test_submit_solution(client):
@@ -46,6 +52,8 @@ def test_submit_solution(client):
     assert "data" in data
     assert "submission_id" in data["data"]
     assert data["data"]["status"] == "pending"
+    # Submitting queues a judge job for the worker
+    assert _jobs(data["data"]["submission_id"]) == 1
 
     # Test invalid problem_id
     submission_data["problem_id"] = "nonexistent"
@@ -111,6 +119,7 @@ print(a + b)
     # Problem has 1 test case, each worth 10 points, correct solution should get full score
     assert data["data"]["score"] == 10  # 1 test case × 10 points
     assert data["data"]["counts"] == 10  # Total possible points
+    assert data["data"]["cases_done"] == data["data"]["cases_total"] == 1
 
 
 def test_get_submissions_list(client):
@@ -215,4 +224,154 @@ def test_rejudge_submission(client):
 
     # Test non-existent submission
     response = client.put("/api/submissions/999999/rejudge")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_submit_syntax_error(client):
+    """Python submissions with syntax errors are judged CE at submit time"""
+    setup_admin_session(client)
+
+    problem_id = "test_syntax_" + uuid.uuid4().hex[:4]
+    problem_data = {
+        "id": problem_id,
+        "title": "语法错误",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "testcases": [{"input": "1 2\n", "output": "3\n"}, {"input": "2 3\n", "output": "5\n"}],
+        "constraints": "|a|,|b| <= 10^9",
+        "time_limit": 1.0,
+        "memory_limit": 128
+    }
+    client.post("/api/problems/", json=problem_data)
+
+    submission_data = {
+        "problem_id": problem_id,
+        "language": "python",
+        "code": "a, b = map(int, input().split()\nprint(a + b)"
+    }
+    response = client.post("/api/submissions/", json=submission_data)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["data"]["status"] == "error"
+    submission_id = data["data"]["submission_id"]
+
+    # No judging needed: the result is available immediately
+    response = client.get(f"/api/submissions/{submission_id}")
+    data = response.json()
+    assert data["data"]["score"] == 0
+    assert data["data"]["cases_done"] == data["data"]["cases_total"] == 2
+
+    response = client.get(f"/api/submissions/{submission_id}/log")
+    details = response.json()["data"]["details"]
+    assert [case["result"] for case in details] == ["CE", "CE"]
+    assert all(case["time"] == 0 and case["memory"] == 0 for case in details)
+
+
+def _jobs(submission_id):
+    db = SessionLocal()
+    try:
+        return db.query(JudgeJobModel).filter(JudgeJobModel.submission_id == submission_id).count()
+    finally:
+        db.close()
+
+
+def _finish_accepted(submission_id):
+    """Record an accepted verdict the way the judge does, without running it"""
+    db = SessionLocal()
+    try:
+        db_submission = db.get(SubmissionModel, submission_id)
+        testcases = db_submission.problem.testcases
+        db_submission.test_case_results = [
+            TestCaseResultModel(
+                test_case_result_id=i + 1, result=StatusCategory.AC, time=0.01, memory=1,
+                output="3\n", err_msg="", case_id=case.id,
+            ) for i, case in enumerate(testcases)
+        ]
+        db_submission.score = db_submission.counts = 10 * len(testcases)
+        db_submission.cases_done = db_submission.cases_total = len(testcases)
+        db_submission.verdict_key = verdict_key(db_submission.code, db_submission.language, db_submission.problem)
+        set_status(db, db_submission, SubmissionStatusCategory.SUCCESS)
+        db.query(JudgeJobModel).filter(JudgeJobModel.submission_id == submission_id).update(
+            {JudgeJobModel.state: JudgeJobStatusCategory.DONE}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_identical_submission_reuses_verdict(client):
+    """An identical resubmission is served from the verdict cache and solving counts once"""
+    setup_admin_session(client)
+    problem_id = "test_cache_" + uuid.uuid4().hex[:4]
+    client.post("/api/problems/", json={
+        "id": problem_id,
+        "title": "缓存",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "testcases": [{"input": "1 2\n", "output": "3\n"}, {"input": "2 3\n", "output": "5\n"}],
+        "constraints": "|a|,|b| <= 10^9",
+        "time_limit": 1.0,
+        "memory_limit": 128
+    })
+    user = "user_" + uuid.uuid4().hex[:8]
+    upw = "pw_" + uuid.uuid4().hex[:8]
+    user_id = client.post("/api/users/", json={"username": user, "password": upw}).json()["data"]["user_id"]
+    setup_user_session(client, user, upw)
+
+    submission_data = {"problem_id": problem_id, "language": "python", "code": "print(sum(map(int, input().split())))"}
+    first = client.post("/api/submissions/", json=submission_data).json()["data"]
+    assert first["status"] == "pending"
+    assert _jobs(first["submission_id"]) == 1
+    _finish_accepted(first["submission_id"])
+
+    second = client.post("/api/submissions/", json=submission_data).json()["data"]
+    assert second["status"] == "success"
+    assert _jobs(second["submission_id"]) == 0
+    result = client.get(f"/api/submissions/{second['submission_id']}").json()["data"]
+    assert result["score"] == 20 and result["cases_done"] == result["cases_total"] == 2
+    assert client.get(f"/api/users/{user_id}").json()["data"]["resolve_count"] == 1
+
+    setup_admin_session(client)
+    details = client.get(f"/api/submissions/{second['submission_id']}/log").json()["data"]["details"]
+    assert [case["result"] for case in details] == ["AC", "AC"]
+
+    # rejudging one of the solving submissions does not count the problem again
+    client.put(f"/api/submissions/{first['submission_id']}/rejudge")
+    _finish_accepted(first["submission_id"])
+    assert client.get(f"/api/users/{user_id}").json()["data"]["resolve_count"] == 1
+
+    # a different judge policy invalidates the cached verdict
+    client.put(f"/api/problems/{problem_id}/judge_policy", json={"judge_policy": "stop_on_first_failure"})
+    setup_user_session(client, user, upw)
+    third = client.post("/api/submissions/", json=submission_data).json()["data"]
+    assert third["status"] == "pending"
+    assert _jobs(third["submission_id"]) == 1
+
+
+def test_verdict_key_covers_judging_conditions():
+    """Data version, limits, judge mode/policy and spj all change the verdict cache key"""
+    language = SimpleNamespace(compile_cmd=None, run_cmd="python3 main.py", time_limit=1.0, memory_limit=128)
+    base = dict(
+        id=1, data_version="v1", testcases=[], time_limit=1.0, memory_limit=128, judge_mode="standard",
+        judge_policy="full", spj_code=None, spj_protocol=None, spj_language=None,
+    )
+    spj_language = SimpleNamespace(compile_cmd="g++ spj.cpp -o spj", run_cmd="./spj")
+    key = verdict_key("print(1)", language, SimpleNamespace(**base))
+    assert key == verdict_key("print(1)", language, SimpleNamespace(**base))
+    assert key != verdict_key("print(2)", language, SimpleNamespace(**base))
+    for change in (
+        {"data_version": "v2"}, {"id": 2}, {"time_limit": 2.0}, {"memory_limit": 256},
+        {"judge_mode": "float:1e-4"}, {"judge_policy": "stop_on_first_failure"},
+        {"judge_mode": "spj", "spj_code": "int main(){}", "spj_language": spj_language},
+    ):
+        assert key != verdict_key("print(1)", language, SimpleNamespace(**dict(base, **change))), change
+    spj = dict(base, judge_mode="spj", spj_code="int main(){}", spj_language=spj_language)
+    assert verdict_key("print(1)", language, SimpleNamespace(**spj)) != verdict_key(
+        "print(1)", language, SimpleNamespace(**dict(spj, spj_code="int main(){return 0;}"))
+    )
+    assert verdict_key("print(1)", language, SimpleNamespace(**spj)) != verdict_key(
+        "print(1)", language, SimpleNamespace(**dict(spj, spj_protocol="stream"))
+    )
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import blob
+from app.db.database import Base
+from app.db.models import SampleModel
+
+
+@pytest.fixture(autouse=True)
+def blob_dir(tmp_path, monkeypatch):
+    """Keep blobs written by these tests out of the shared store"""
+    monkeypatch.setattr(blob, "BLOB_DIR", str(tmp_path / "blobs"))
+    return tmp_path / "blobs"
+
+
+@pytest.mark.parametrize("chunk_size", [blob.CHUNK_SIZE, 7])
+def test_put_get_copy_to_round_trip(tmp_path, blob_dir, monkeypatch, chunk_size):
+    monkeypatch.setattr(blob, "CHUNK_SIZE", chunk_size)
+    data = os.urandom(1000) + b"1 2 3\n" * 5000
+    key = blob.put(data)
+    assert key == blob.digest(data)
+    assert blob.path(key) == os.path.join(str(blob_dir), key[:2], key[2:])
+    assert os.path.getsize(blob.path(key)) < len(data)
+
+    assert blob.get(key) == data
+    target = tmp_path / "copy.in"
+    blob.copy_to(key, str(target))
+    assert target.read_bytes() == data
+
+
+def test_put_stores_identical_content_once(blob_dir):
+    key = blob.put(b"same")
+    mtime = os.stat(blob.path(key)).st_mtime_ns
+    assert blob.put_text("same") == key
+    assert os.stat(blob.path(key)).st_mtime_ns == mtime
+    assert [name for name in os.listdir(blob_dir / key[:2]) if name.startswith(".tmp-")] == []
+
+
+def test_empty_blob(tmp_path):
+    key = blob.put(b"")
+    assert blob.get(key) == b""
+    blob.copy_to(key, str(tmp_path / "empty"))
+    assert (tmp_path / "empty").read_bytes() == b""
+
+
+def test_sample_columns_are_stored_as_blobs(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'samples.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    text = "3\n1 2 3\né\n"
+
+    with factory() as db:
+        db_sample = SampleModel(input=text, output=None, _problem_id=1)
+        db.add(db_sample)
+        db.commit()
+        sample_id = db_sample.id
+
+    with factory() as db:
+        db_sample = db.get(SampleModel, sample_id)
+        assert db_sample.input_hash == blob.digest(text.encode("utf-8"))
+        assert db_sample.input_size == len(text.encode("utf-8"))
+        assert db_sample.input == text
+        assert db_sample.output == "" and db_sample.output_size == 0
+
+        db_sample.input = "changed"
+        db.commit()
+    with factory() as db:
+        db_sample = db.get(SampleModel, sample_id)
+        assert db_sample.input == "changed"
+        assert blob.get_text(db_sample.input_hash) == "changed"
+    engine.dispose()
@@ -0,0 +1,117 @@
+import pytest
+from sqlalchemy import create_engine, Update
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.db.models import JudgeJobStatusCategory
+from app.db.db_judge_job import (
+    MAX_ATTEMPTS, enqueue, enqueue_many, claim, reclaim_expired, finish, batch_progress,
+)
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    """Sessions on a private database, so jobs queued by other tests are not claimed"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    opened = []
+
+    def session():
+        opened.append(factory())
+        return opened[-1]
+    yield session
+    for db in opened:
+        db.close()
+    engine.dispose()
+
+
+def _claim_all(db, **kwargs):
+    claimed = []
+    while (db_job := claim(db=db, worker="w", lease_seconds=60, **kwargs)) is not None:
+        claimed.append(db_job.submission_id)
+    return claimed
+
+
+def test_claim_by_priority_then_age(sessions):
+    db = sessions()
+    enqueue(db=db, submission_id=1)
+    enqueue(db=db, submission_id=2)
+    enqueue(db=db, submission_id=3, priority=5)
+    enqueue_many(db=db, submission_ids=[4], priority=-1, batch_id="b")
+    db.commit()
+    # queueing a submission again only raises its priority
+    enqueue(db=db, submission_id=2, priority=1)
+    assert _claim_all(db) == [3, 2, 1, 4]
+
+
+def test_lease_expiry_requeues_then_fails(sessions):
+    db = sessions()
+    enqueue(db=db, submission_id=1)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        db_job = claim(db=db, worker="w", lease_seconds=-1)
+        assert db_job.attempts == attempt
+        failed = reclaim_expired(db=db)
+        db.refresh(db_job)
+        if attempt < MAX_ATTEMPTS:
+            assert failed == [] and db_job.state == JudgeJobStatusCategory.QUEUED and db_job.worker is None
+    assert [job.submission_id for job in failed] == [1]
+    assert db_job.state == JudgeJobStatusCategory.FAILED
+    assert claim(db=db, worker="w", lease_seconds=60) is None
+
+
+def test_live_lease_is_not_reclaimed(sessions):
+    db = sessions()
+    enqueue(db=db, submission_id=1)
+    db_job = claim(db=db, worker="w", lease_seconds=60)
+    assert reclaim_expired(db=db) == []
+    db.refresh(db_job)
+    assert db_job.state == JudgeJobStatusCategory.RUNNING
+
+
+def test_finish_retries_until_max_attempts(sessions):
+    db = sessions()
+    enqueue(db=db, submission_id=1)
+    enqueue(db=db, submission_id=2)
+    db_job = claim(db=db, worker="w", lease_seconds=60)
+    assert finish(db=db, job_id=db_job.id, success=True).state == JudgeJobStatusCategory.DONE
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        db_job = claim(db=db, worker="w", lease_seconds=60)
+        assert db_job.submission_id == 2
+        state = finish(db=db, job_id=db_job.id, success=False, err_msg="crashed").state
+        assert state == (JudgeJobStatusCategory.QUEUED if attempt < MAX_ATTEMPTS else JudgeJobStatusCategory.FAILED)
+    assert db_job.err_msg == "crashed" and db_job.finished_at is not None
+
+
+def test_background_limit(sessions):
+    db = sessions()
+    enqueue_many(db=db, submission_ids=[1, 2, 3], priority=-1, batch_id="b")
+    db.commit()
+    assert _claim_all(db, background_limit=2) == [1, 2]
+    # normal jobs are still claimed while the background limit is reached
+    enqueue(db=db, submission_id=4)
+    assert _claim_all(db, background_limit=2) == [4]
+    finish(db=db, job_id=1, success=True)
+    assert _claim_all(db, background_limit=2) == [3]
+    assert batch_progress(db=db, batch_id="b") == {"queued": 0, "running": 2, "done": 1, "failed": 0}
+
+
+def test_background_limit_holds_under_concurrent_claims(sessions, monkeypatch):
+    """Another worker claims a background job between this worker's limit check and its update"""
+    db, other = sessions(), sessions()
+    enqueue_many(db=db, submission_ids=[1, 2], priority=-1, batch_id="b")
+    db.commit()
+
+    raced = []
+    execute = db.execute
+
+    def racing_execute(statement, *args, **kwargs):
+        if isinstance(statement, Update) and not raced:
+            raced.append(claim(db=other, worker="other", lease_seconds=60, background_limit=1))
+        return execute(statement, *args, **kwargs)
+    monkeypatch.setattr(db, "execute", racing_execute)
+
+    assert claim(db=db, worker="w", lease_seconds=60, background_limit=1) is None
+    assert raced[0].submission_id == 1
+    assert batch_progress(db=other, batch_id="b")["running"] == 1
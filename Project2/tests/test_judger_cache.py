@@ -0,0 +1,59 @@
+import os
+import time
+
+import pytest
+
+from app.judger import cache
+from app.judger.cache import ArtifactCache, spj_key, invalidate_spj
+
+
+@pytest.fixture(autouse=True)
+def cache_base(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_BASE", str(tmp_path))
+
+
+def _age(artifacts, key, seconds):
+    """Pretend the entry was last used the given number of seconds ago"""
+    mtime = time.time() - seconds
+    os.utime(artifacts._entry(key), (mtime, mtime))
+
+
+def test_put_get_and_keep_existing_entry():
+    artifacts = ArtifactCache("compile", 1024)
+    assert artifacts.get("k") is None
+    entry = artifacts.put("k", {"main": b"\x7fELF"}, executable=True)
+    assert artifacts.get("k") == entry
+    assert os.access(os.path.join(entry, "main"), os.X_OK)
+
+    assert artifacts.put("k", {"main": b"other"}) == entry
+    with open(os.path.join(entry, "main"), "rb") as f:
+        assert f.read() == b"\x7fELF"
+    assert [name for name in os.listdir(artifacts.root) if name.startswith(".tmp-")] == []
+
+
+def test_evicts_least_recently_used():
+    artifacts = ArtifactCache("compile", 10)
+    artifacts.put("a", {"main": b"aaaa"})
+    artifacts.put("b", {"main": b"bbbb"})
+    _age(artifacts, "a", 200)
+    _age(artifacts, "b", 100)
+    # a hit makes "a" the most recently used entry, so "b" goes first
+    assert artifacts.get("a") is not None
+    artifacts.put("c", {"main": b"cccc"})
+    assert artifacts.get("b") is None
+    assert artifacts.get("a") is not None and artifacts.get("c") is not None
+    assert artifacts.stats() == {"entries": 2, "bytes": 8}
+
+    artifacts.put("d", {"main": b"d" * 11})
+    assert artifacts.stats() == {"entries": 0, "bytes": 0}
+
+
+def test_invalidate_spj_only_drops_that_problem(monkeypatch):
+    monkeypatch.setattr(cache, "spj_cache", ArtifactCache("spj", 1024))
+    keys = [spj_key(1, "int main(){}", "cpp"), spj_key(1, b"print(1)", "python"), spj_key(12, "int main(){}", "cpp")]
+    for key in keys:
+        cache.spj_cache.put(key, {"spj": b"x"})
+    assert keys[0] != keys[1] and keys[0].split("-", 1)[1] == keys[2].split("-", 1)[1]
+
+    invalidate_spj(1)
+    assert [cache.spj_cache.get(key) is not None for key in keys] == [False, False, True]
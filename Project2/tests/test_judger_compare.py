@@ -0,0 +1,109 @@
+from io import BytesIO
+
+import pytest
+
+from app.judger import compare as compare_module
+from app.judger.compare import compare, describe, parse_mode, valid_mode
+
+
+def run(got, expected, mode="standard"):
+    return compare(BytesIO(got), BytesIO(expected), mode)
+
+
+def first_difference(diff):
+    """Reported position and the first byte of each side; the byte modes preview the rest of the current chunk"""
+    return diff["line"], diff["column"], diff["expected"][:1], diff["got"][:1]
+
+
+@pytest.fixture(params=[compare_module.CHUNK_SIZE, 3], ids=["default_chunks", "tiny_chunks"])
+def chunked(request, monkeypatch):
+    """Run a test with the default chunk size and with chunks that split lines and tokens"""
+    monkeypatch.setattr(compare_module, "CHUNK_SIZE", request.param)
+
+
+def test_standard_ignores_trailing_whitespace_only(chunked):
+    assert run(b"1 2\n3\n", b"1 2\n3") is None
+    assert run(b"1 2\n3  \n\n \t", b"1 2\n3\n") is None
+    assert run(b"", b"\n") is None
+    assert first_difference(run(b"1  2\n3\n", b"1 2\n3\n")) == (1, 3, "2", " ")
+    assert first_difference(run(b"1 2\n3\n4\n", b"1 2\n3\n")) == (3, 1, "", "4")
+
+
+def test_strict_is_byte_exact(chunked):
+    assert run(b"abc\n", b"abc\n", "strict") is None
+    assert first_difference(run(b"abc", b"abc\n", "strict")) == (1, 4, "\n", "")
+    assert first_difference(run(b"abc\nxyz", b"abc\nxzz", "strict")) == (2, 2, "z", "y")
+
+
+def test_whitespace_compares_tokens(chunked):
+    assert run(b"1   2\r\n\n3\t", b"1 2 3", "whitespace") is None
+    diff = run(b"1 2\n3 5\n", b"1 2\n3 4\n", "whitespace")
+    assert diff == {"line": 2, "column": 3, "expected": "4", "got": "5"}
+    assert run(b"1 2", b"1 2 3", "whitespace") == {"line": 1, "column": 4, "expected": "3", "got": "<EOF>"}
+    assert run(b"1 2 3", b"1 2", "whitespace")["expected"] == "<EOF>"
+
+
+def test_float_default_and_given_tolerance(chunked):
+    assert run(b"1.0000005", b"1", "float") is None
+    assert run(b"1.000002", b"1", "float") is not None
+    # absolute error below 1, relative error above; both boundaries are inclusive
+    assert run(b"1.5 150", b"1 100", "float:0.5") is None
+    assert run(b"1.5000001", b"1", "float:0.5") is not None
+    assert run(b"150.5", b"100", "float:0.5") is not None
+    assert run(b"-1E-3 .5 5.", b"-0.001 0.5 5", "float:0") is None
+    assert run(b"2 x 3", b"2 x 4", "float:0.1") == {"line": 1, "column": 5, "expected": "4", "got": "3"}
+
+
+@pytest.mark.parametrize("got, expected", [
+    (b"1_000", b"1000"),
+    (b"0x10", b"16"),
+    (b"infinity", b"inf"),
+    (b"nan", b"NaN"),
+    (b"1e999", b"9e999"),
+    (b"1e999", b"1e998"),
+    (b"1.0.0", b"1.0"),
+    (b"abc", b"1"),
+])
+def test_float_rejects_malformed_and_non_finite_numbers(got, expected):
+    assert run(got, expected, "float:1") is not None
+
+
+def test_float_accepts_byte_equal_non_numbers():
+    assert run(b"nan inf YES", b"nan inf YES", "float") is None
+
+
+def test_nocase(chunked):
+    assert run(b"yes\nNo", b"YES no\n", "nocase") is None
+    assert run(b"yes\nyes", b"YES no", "nocase") == {"line": 2, "column": 1, "expected": "no", "got": "yes"}
+
+
+def test_unordered_lines(chunked):
+    assert run(b"b  \na\n\n\na\n", b"a\na\nb\n", "unordered") is None
+    assert run(b"a b\n", b"a  b\n", "unordered") == {"message": "Missing line 'a  b' (0 of 1)."}
+    assert run(b"a\na\nb\n", b"a\nb\n", "unordered") == {"message": "Unexpected line 'a' (2 given, 1 expected)."}
+
+
+def test_multiset_tokens(chunked):
+    assert run(b"3 1\n2 1", b"1 1 2 3\n", "multiset") is None
+    assert run(b"1 2", b"1 2 2", "multiset") == {"message": "Missing token '2' (1 of 2)."}
+    assert run(b"1 2 4", b"1 2", "multiset") == {"message": "Unexpected token '4' (1 given, 0 expected)."}
+
+
+def test_long_line_and_token_across_chunks():
+    line = b"x" * (3 * compare_module.CHUNK_SIZE + 7)
+    assert run(line + b"\n", line, "unordered") is None
+    assert run(line, line + b"y", "whitespace") == {"line": 1, "column": 1, "expected": line[:32].decode(), "got": line[:32].decode()}
+
+
+def test_parse_mode():
+    assert parse_mode("standard") == ("standard", None)
+    assert parse_mode("float:1e-4") == ("float", 1e-4)
+    for mode in ("exact", "nocase:1", "float:-1", "float:nan", "float:inf", "float:x"):
+        assert not valid_mode(mode)
+        with pytest.raises(ValueError):
+            parse_mode(mode)
+
+
+def test_describe():
+    assert describe({"line": 2, "column": 3, "expected": "4", "got": "5"}) == "Wrong answer at line 2, column 3: expected '4', got '5'."
+    assert describe({"message": "Missing token '2' (1 of 2)."}) == "Wrong answer: Missing token '2' (1 of 2)."
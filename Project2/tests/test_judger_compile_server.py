@@ -0,0 +1,63 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+import pytest
+
+from app.judger import compile_server
+
+REQUEST = {"cmd": "g++ -O2 main.cpp -o main", "files": {"main.cpp": 4}, "timeout": 0.5}
+FILES = {"main.cpp": b"code"}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Job dirs under /tmp reachable by the job uids, a stand-in g++ that copies the source, and no ccache"""
+    base = tempfile.mkdtemp(prefix="compile-server-")
+    os.chmod(base, 0o755)
+    compiler = os.path.join(base, "g++")
+    with open(compiler, "w") as f:
+        f.write("#!/bin/sh\ncp main.cpp main\n")
+    os.chmod(compiler, 0o755)
+    os.makedirs(os.path.join(base, "jobs"), mode=0o711)
+
+    monkeypatch.setattr(compile_server, "JOB_DIR", os.path.join(base, "jobs"))
+    monkeypatch.setattr(compile_server, "_pch_dirs", {})
+    monkeypatch.setattr(compile_server, "_pch_locks", {})
+    monkeypatch.setattr(compile_server.shutil, "which", lambda name: None)
+    yield dict(REQUEST, cmd=REQUEST["cmd"].replace("g++", compiler, 1))
+    shutil.rmtree(base, ignore_errors=True)
+
+
+def test_pch_build_time_is_not_charged_to_the_compile(server, monkeypatch):
+    def slow_build(compiler, flags, directory):
+        time.sleep(1)
+        return directory
+    monkeypatch.setattr(compile_server, "_build_pch", slow_build)
+
+    response, artifact = compile_server.compile_job(server, FILES)
+    assert response["status"] == 0 and not response["timed_out"]
+    assert response["pch"] and artifact == b"code"
+
+
+def test_compiles_without_pch_while_it_is_being_built(server, monkeypatch):
+    building, finish = threading.Event(), threading.Event()
+
+    def blocked_build(compiler, flags, directory):
+        building.set()
+        finish.wait(5)
+        return directory
+    monkeypatch.setattr(compile_server, "_build_pch", blocked_build)
+
+    builder = threading.Thread(target=compile_server.compile_job, args=(server, FILES))
+    builder.start()
+    assert building.wait(5)
+    response, artifact = compile_server.compile_job(server, FILES)
+    assert response["status"] == 0 and not response["pch"] and artifact == b"code"
+
+    finish.set()
+    builder.join(5)
+    response, _ = compile_server.compile_job(server, FILES)
+    assert response["pch"]
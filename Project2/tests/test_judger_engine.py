@@ -0,0 +1,49 @@
+import json
+import asyncio
+
+from app.judger.engine import Engine
+
+
+async def _fake_daemon(socket_path, exited):
+    """Minimal Engine API: /wait answers once `exited` is set, other requests answer immediately"""
+    async def handle(reader, writer):
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = line.decode().partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            path = request_line.split()[1].decode()
+            if path.endswith("/wait"):
+                await exited.wait()
+                body = {"StatusCode": 0}
+            else:
+                body = {"Id": "c1"}
+            payload = json.dumps(body).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(payload) + payload)
+            await writer.drain()
+        writer.close()
+    return await asyncio.start_unix_server(handle, socket_path)
+
+
+def test_wait_does_not_hold_a_pooled_connection(tmp_path):
+    """A long-polling wait must not block create/start of other containers when the pool has one connection"""
+    socket_path = str(tmp_path / "docker.sock")
+
+    async def scenario():
+        exited = asyncio.Event()
+        server = await _fake_daemon(socket_path, exited)
+        async with server, Engine(socket_path, size=1, timeout=5) as engine:
+            wait = asyncio.ensure_future(engine.wait("c0", timeout=5))
+            await asyncio.sleep(0.05)
+            assert await asyncio.wait_for(engine.create({}), 1) == "c1"
+            await asyncio.wait_for(engine.start("c1"), 1)
+            assert not wait.done()
+            exited.set()
+            assert await wait == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,96 @@
+import os
+import fcntl
+import asyncio
+from contextlib import ExitStack
+
+import pytest
+
+from app.judger import governor
+from app.judger.governor import slot, aslot, usage, GovernorTimeout
+
+
+@pytest.fixture(autouse=True)
+def slots(tmp_path, monkeypatch):
+    """Four container slots in a private lock dir: a user may hold 2 of them and a problem 3"""
+    monkeypatch.setattr(governor, "LOCK_DIR", str(tmp_path))
+    monkeypatch.setattr(governor, "SLOTS", {"container": 4})
+    monkeypatch.setattr(governor, "GOVERNOR_USER_SHARE", 0.5)
+    monkeypatch.setattr(governor, "GOVERNOR_PROBLEM_SHARE", 0.75)
+    monkeypatch.setattr(governor, "GOVERNOR_TIMEOUT", 0.05)
+
+
+def _acquired(user_id=None, problem_id=None):
+    held = governor._try_acquire("container", user_id, problem_id)
+    if held is not None:
+        governor._release(held)
+    return held is not None
+
+
+def _busy(prefix, count):
+    """Number of locks under prefix held by someone"""
+    busy = 0
+    for i in range(count):
+        with open(os.path.join(governor.LOCK_DIR, f"{prefix}-{i}.lock"), "w") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                busy += 1
+    return busy
+
+
+def test_user_share():
+    with ExitStack() as stack:
+        stack.enter_context(slot("container", user_id=1))
+        stack.enter_context(slot("container", user_id=1))
+        assert not _acquired(user_id=1)
+        assert _acquired(user_id=2)
+        assert _acquired()
+    assert _acquired(user_id=1)
+
+
+def test_problem_share():
+    with ExitStack() as stack:
+        for user_id in (1, 2, 3):
+            stack.enter_context(slot("container", user_id=user_id, problem_id=7))
+        assert not _acquired(user_id=4, problem_id=7)
+        assert _acquired(user_id=4, problem_id=8)
+
+
+def test_global_share_and_partial_release():
+    with ExitStack() as stack:
+        for user_id in (1, 2, 3, 4):
+            stack.enter_context(slot("container", user_id=user_id))
+        assert usage() == {"container": {"total": 4, "busy": 4}}
+        assert not _acquired()
+        # a user and problem lock taken before the global one fails are released again
+        assert not _acquired(user_id=5, problem_id=7)
+        assert _busy("container-user-5", 2) == 0 and _busy("container-problem-7", 3) == 0
+        with pytest.raises(GovernorTimeout):
+            with slot("container", user_id=5):
+                pass
+    assert usage() == {"container": {"total": 4, "busy": 0}}
+
+
+def test_aslot_waits_for_a_released_slot(monkeypatch):
+    monkeypatch.setattr(governor, "GOVERNOR_TIMEOUT", 5.0)
+
+    async def scenario():
+        order = []
+
+        async def holder():
+            async with aslot("container", user_id=1):
+                order.append("held")
+                await asyncio.sleep(0.1)
+            order.append("released")
+
+        async def waiter():
+            await asyncio.sleep(0.02)
+            async with aslot("container", user_id=1):
+                order.append("acquired")
+
+        with ExitStack() as stack:
+            stack.enter_context(slot("container", user_id=1))
+            await asyncio.gather(holder(), waiter())
+        return order
+
+    assert asyncio.run(scenario()) == ["held", "released", "acquired"]
@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import ctypes
+import subprocess
+
+import pytest
+
+from app.judger import runner
+from app.judger.box import Box
+from app.judger.pool import CAPABILITIES
+from app.judger.sandbox import LocalSandbox, CompileError, OUTPUT_OPTIONS
+
+# capability numbers from linux/capability.h
+CAP_NUMBERS = {"CHOWN": 0, "DAC_OVERRIDE": 1, "DAC_READ_SEARCH": 2, "FOWNER": 3, "FSETID": 4, "KILL": 5, "SETGID": 6, "SETUID": 7}
+PR_CAPBSET_DROP = 24
+PR_SET_NO_NEW_PRIVS = 38
+WORKER_UID = 4242
+
+needs_root = pytest.mark.skipif(not hasattr(os, "getuid") or os.getuid() != 0, reason="requires root")
+
+
+def _as_container_root(capabilities):
+    """preexec_fn keeping only the given capabilities across exec, like a pool container's root"""
+    keep = {CAP_NUMBERS[name] for name in capabilities}
+
+    def preexec():
+        libc = ctypes.CDLL(None, use_errno=True)
+        with open("/proc/sys/kernel/cap_last_cap") as f:
+            last = int(f.read())
+        for cap in range(last + 1):
+            if cap not in keep and libc.prctl(PR_CAPBSET_DROP, cap, 0, 0, 0) != 0:
+                raise OSError(ctypes.get_errno(), "prctl")
+        libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0)
+    return preexec
+
+
+def _case(tmp_path, cmd, data=b"", time_limit=1.0, memory_limit=64, **kwargs):
+    """Run one case through runner.run_case; programs are shell commands so they still run after dropping to nobody"""
+    (tmp_path / "1.in").write_bytes(data)
+    return runner.run_case(
+        ["sh", "-c", cmd], {"id": 1, "input": str(tmp_path / "1.in")}, time_limit, memory_limit,
+        output_dir=str(tmp_path), cwd=str(tmp_path), **kwargs,
+    )
+
+
+def _run_runner(manifest, cwd, preexec_fn=None):
+    result = subprocess.run(
+        [sys.executable, runner.__file__, "--json", json.dumps(manifest)],
+        cwd=cwd, capture_output=True, timeout=30, preexec_fn=preexec_fn,
+    )
+    return [json.loads(line) for line in result.stdout.splitlines() if line.strip()]
+
+
+@needs_root
+def test_runner_writes_box_output_owned_by_worker(tmp_path):
+    """The runner, as container root with the pool's capabilities, writes into the output dir of a box owned by a non-root worker"""
+    box = Box(str(tmp_path / "box"))
+    box.write("1.in", b"hello\n")
+    manifest = {
+        "cmd": "cat", "time_limit": 1.0, "memory_limit": 64,
+        "cases": [{"id": 1, "input": os.path.join(box.root, "1.in")}],
+        "output_dir": box.out, "keep_output": True,
+    }
+    os.chown(box.root, WORKER_UID, WORKER_UID)
+    os.chown(box.out, WORKER_UID, WORKER_UID)
+
+    [record] = _run_runner(manifest, box.root, _as_container_root(CAPABILITIES))
+    assert record["status_code"] == 0
+    assert record["output_file"] == os.path.join(box.out, "1.out")
+    with open(record["output_file"], "rb") as f:
+        assert f.read() == b"hello\n"
+
+    os.remove(record["output_file"])
+    capabilities = [name for name in CAPABILITIES if name != "DAC_OVERRIDE"]
+    [record] = _run_runner(manifest, box.root, _as_container_root(capabilities))
+    assert "Permission denied" in record["error"]
+
+
+@needs_root
+def test_runner_watchdog_kills_case_with_pool_capabilities(tmp_path):
+    """The watchdog, as container root with the pool's capabilities, kills a case that has dropped to nobody"""
+    (tmp_path / "1.in").write_bytes(b"")
+    manifest = {
+        "cmd": "sleep 5", "time_limit": 0.2, "memory_limit": 64,
+        "cases": [{"id": 1, "input": str(tmp_path / "1.in")}], "output_dir": str(tmp_path),
+    }
+    [record] = _run_runner(manifest, str(tmp_path), _as_container_root(CAPABILITIES))
+    assert record["timed_out"] and record["limit"] == "wall"
+    assert record["status_code"] == 137
+    assert record["wall"] < 2
+
+
+def test_run_case_accepted(tmp_path):
+    record = _case(tmp_path, "cat; echo oops >&2", b"1 2\n")
+    assert record["status_code"] == 0 and not record["timed_out"] and not record["output_exceeded"]
+    assert record["stdout"] == "1 2\n" and record["stderr"] == "oops\n"
+    assert record["output_size"] == 4 and record["output_hash"] == runner.hashlib.sha256(b"1 2\n").hexdigest()
+    assert os.listdir(tmp_path) == ["1.in"]
+
+
+def test_run_case_cpu_limit_kills_busy_loop(tmp_path):
+    record = _case(tmp_path, "while :; do :; done", time_limit=0.2, wall_limit=5)
+    assert record["timed_out"] and record["limit"] == "cpu"
+    assert record["status_code"] == 137
+    assert 0.2 < record["time"] < 1 and record["wall"] < 2
+
+
+def test_run_case_wall_limit_kills_sleeper(tmp_path):
+    record = _case(tmp_path, "sleep 5", time_limit=0.2)
+    assert record["timed_out"] and record["limit"] == "wall"
+    assert record["time"] < 0.2 and record["wall"] < 2
+
+
+def test_run_case_reports_peak_memory(tmp_path):
+    """The judge turns memory above memory_limit into MLE; the shell holds 48 MB in a variable"""
+    record = _case(tmp_path, "x=$(head -c 50331648 /dev/zero | tr '\\0' a); echo ${#x}", memory_limit=16)
+    assert record["status_code"] == 0 and record["stdout"] == "50331648\n"
+    assert record["memory"] > 48
+
+
+def test_run_case_address_space_limit_fails_allocation(tmp_path):
+    record = _case(tmp_path, "x=$(head -c 50331648 /dev/zero | tr '\\0' a); echo ${#x}", memory_limit=16, address_space=24)
+    assert record["status_code"] != 0 and record["stdout"] == ""
+
+
+def test_run_case_output_limit(tmp_path):
+    """RLIMIT_FSIZE stops the writer one byte past output_limit; only the preview is returned"""
+    record = _case(tmp_path, "head -c 5000 /dev/zero | tr '\\0' a", output_limit=1000, output_preview=10)
+    assert record["output_exceeded"]
+    assert record["output_size"] == 1001 and record["stdout"] == "a" * 10
+    assert "1.out" not in os.listdir(tmp_path)
+
+
+@pytest.mark.parametrize("cmd, status_code", [("exit 3", 3), ("kill -SEGV $$", 128 + 11)])
+def test_run_case_runtime_error(tmp_path, cmd, status_code):
+    record = _case(tmp_path, cmd)
+    assert record["status_code"] == status_code and not record["timed_out"]
+
+
+@pytest.mark.parametrize("stop_on_failure, ids", [(True, [1, 2]), (False, [1, 2, 3])])
+def test_main_stops_after_first_failure(tmp_path, stop_on_failure, ids):
+    cases = []
+    for case_id, code in ((1, 0), (2, 3), (3, 0)):
+        (tmp_path / f"{case_id}.in").write_text(f"{code}\n")
+        cases.append({"id": case_id, "input": str(tmp_path / f"{case_id}.in")})
+    manifest = {
+        "cmd": "sh -c 'read code; exit $code'", "time_limit": 1.0, "memory_limit": 64,
+        "stop_on_failure": stop_on_failure, "cases": cases, "output_dir": str(tmp_path / "out"),
+    }
+    records = _run_runner(manifest, str(tmp_path))
+    assert [record["id"] for record in records] == ids
+    assert [record["status_code"] for record in records] == [0, 3, 0][:len(ids)]
+
+
+def test_main_reports_case_errors(tmp_path):
+    manifest = {
+        "cmd": "cat", "time_limit": 1.0, "memory_limit": 64, "stop_on_failure": True,
+        "cases": [{"id": 1, "input": str(tmp_path / "missing.in")}, {"id": 2, "input": str(tmp_path / "missing.in")}],
+        "output_dir": str(tmp_path),
+    }
+    [record] = _run_runner(manifest, str(tmp_path))
+    assert record["id"] == 1 and "No such file" in record["error"]
+
+
+def test_local_sandbox_run_case_keeps_output_in_work_dir(tmp_path):
+    (tmp_path / "1.in").write_bytes(b"hello\n")
+    record = LocalSandbox().run_case(str(tmp_path), "cat", "cpp", str(tmp_path / "1.in"), 1.0, 64)
+    assert record["status_code"] == 0 and not record["timed_out"]
+    assert os.path.dirname(record["output_file"]) == str(tmp_path / "out")
+    with open(record["output_file"], "rb") as f:
+        assert f.read() == b"hello\n"
+
+
+def test_local_sandbox_run_batch(tmp_path):
+    cases = []
+    for case_id in (1, 2):
+        (tmp_path / f"{case_id}.in").write_text(f"{case_id}\n")
+        cases.append({"id": case_id, "input": str(tmp_path / f"{case_id}.in")})
+    manifest = {"cmd": "sh -c 'read x; echo $((x * 2))'", "time_limit": 1.0, "memory_limit": 64, "cases": cases, **OUTPUT_OPTIONS}
+    records = list(LocalSandbox().run_batch(str(tmp_path), "cpp", manifest, 64))
+    assert [record["stdout"] for record in records] == ["2\n", "4\n"]
+    for record in records:
+        with open(record["output_file"]) as f:
+            assert f.read() == record["stdout"]
+
+
+def test_local_sandbox_compile_error(tmp_path):
+    LocalSandbox().compile(str(tmp_path), "cpp", "true", 64)
+    with pytest.raises(CompileError, match="broken"):
+        LocalSandbox().compile(str(tmp_path), "cpp", "sh -c 'echo broken >&2; exit 1'", 64)